@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Backup Archive - streaming compressed tar output
+Builds the tar stream in order while reader threads prefetch small files and
+a pool of compressor threads compresses fixed-size blocks in parallel; a
+single writer appends the compressed blocks to the archive as they finish
+"""
+
+import os
+import json
+import zlib
+import hashlib
+import queue
+import shutil
+import tarfile
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from backup_metrics import SlowestFiles
+from backup_progress import check_cancelled
+from backup_throttle import set_io_priority
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ARCHIVE_FORMATS = ('tar.gz', 'tar.zst')
+DEFAULT_LEVELS = {'tar.gz': 6, 'tar.zst': 3}
+
+# Uncompressed bytes per independently compressed block
+BLOCK_SIZE = 4 * 1024 * 1024
+# Files up to this size are read ahead by the reader threads
+PREFETCH_MAX_FILE = 1024 * 1024
+READ_SIZE = 1024 * 1024
+
+# Written next to each archive: where every block and member starts, so a
+# restore can seek to a member instead of decompressing the whole archive
+MEMBER_INDEX_SUFFIX = '.index.json'
+
+def member_index_path(archive_path):
+    return archive_path + MEMBER_INDEX_SUFFIX
+
+class ArchiveStats:
+    """Counters for an archive backup"""
+    def __init__(self):
+        self.files = 0
+        self.dirs = 0
+        self.bytes = 0
+        self.compressed_bytes = 0
+        self.slowest = SlowestFiles()
+
+    def summary(self):
+        """One-line description of the run"""
+        ratio = self.compressed_bytes / self.bytes if self.bytes else 1.0
+        return (f"Archived {self.files} files ({self.bytes / (1024 * 1024):.1f} MB) into "
+                f"{self.compressed_bytes / (1024 * 1024):.1f} MB ({ratio:.0%})")
+
+def make_compressor(archive_format, level=None):
+    """Return a function compressing one block into a self-contained gzip member / zstd frame
+
+    Concatenated gzip members and zstd frames are valid streams, so blocks
+    can be compressed independently and in parallel (like pigz).
+    """
+    if level is None:
+        level = DEFAULT_LEVELS[archive_format]
+    if archive_format == 'tar.gz':
+        def compress(block):
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+            return compressor.compress(block) + compressor.flush()
+        return compress
+    if archive_format == 'tar.zst':
+        if zstandard is None:
+            raise RuntimeError("The tar.zst format requires the zstandard package (pip install zstandard)")
+        local = threading.local()
+        def compress(block):
+            # ZstdCompressor objects are not thread-safe, keep one per thread
+            if not hasattr(local, 'compressor'):
+                local.compressor = zstandard.ZstdCompressor(level=level)
+            return local.compressor.compress(block)
+        return compress
+    raise ValueError(f"Unknown archive format: {archive_format}")
+
+def _read_file(path, size):
+    """Read exactly size bytes of a file, padding with NULs if it shrank meanwhile"""
+    with open(path, 'rb') as f:
+        data = f.read(size)
+    return data + tarfile.NUL * (size - len(data))
+
+class ArchiveWriter:
+    """Write a directory tree as a compressed tar stream
+
+    Alongside the archive a member index is written recording the compressed
+    offset of every block and the uncompressed offset of every member's
+    data. Blocks are independent gzip members / zstd frames, so reading can
+    start at any block boundary.
+
+    Pipeline stages:
+      readers     - prefetch the contents of small files ahead of the tar stream
+      assembler   - the calling thread, emits tar headers and data in order
+                    and cuts the stream into BLOCK_SIZE blocks
+      compressors - compress blocks in parallel
+      writer      - a single thread appending compressed blocks in order
+    Memory stays bounded by the prefetch window and the writer queue length.
+
+    A Throttle limits the files and bytes the assembler takes per second
+    (which in turn holds back the readers), and io_nice lowers the I/O
+    priority of the reader and writer threads.
+    """
+    def __init__(self, archive_format, level=None, workers=4, throttle=None, io_nice=None):
+        self.archive_format = archive_format
+        self.compress = make_compressor(archive_format, level)
+        self.workers = max(1, int(workers))
+        self.throttle = throttle
+        self.io_nice = io_nice
+
+    def write_tree(self, source_folder, archive_path, progress=None, checksums=None, cancel=None,
+                   path_filter=None):
+        """Archive source_folder into archive_path and return the stats
+
+        If checksums (a ManifestWriter) is given, each file's data is hashed
+        as it is added to the stream and recorded there. Setting the cancel
+        event stops at the next block with BackupCancelled and removes the
+        partial archive. Paths a PathFilter excludes are left out. Symlinked
+        folders are followed, as in folder backups. A file or folder that
+        cannot be read is left out and the archive is still completed;
+        shutil.Error lists them at the end.
+        """
+        stats = ArchiveStats()
+        partial_path = archive_path + '.partial'
+        out = open(partial_path, 'wb')
+        write_queue = queue.Queue(maxsize=self.workers * 2)
+        write_errors = []
+        # Source files and folders that could not be read
+        errors = []
+        # Compressed offset of each BLOCK_SIZE block, and one row per member
+        block_offsets = []
+        members = []
+
+        def writer():
+            if self.io_nice:
+                set_io_priority(self.io_nice)
+            while True:
+                future = write_queue.get()
+                if future is None:
+                    return
+                try:
+                    data = future.result()
+                    block_offsets.append(stats.compressed_bytes)
+                    out.write(data)
+                    stats.compressed_bytes += len(data)
+                except Exception as e:
+                    write_errors.append(e)
+
+        writer_thread = threading.Thread(target=writer, daemon=True)
+        writer_thread.start()
+        buffer = bytearray()
+        emitted = [0]
+        completed = False
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as compressors, \
+                    ThreadPoolExecutor(max_workers=self.workers,
+                                       initializer=set_io_priority if self.io_nice else None,
+                                       initargs=(self.io_nice,) if self.io_nice else ()) as readers:
+
+                def emit(data):
+                    buffer.extend(data)
+                    emitted[0] += len(data)
+                    while len(buffer) >= BLOCK_SIZE:
+                        check_cancelled(cancel)
+                        block = bytes(buffer[:BLOCK_SIZE])
+                        del buffer[:BLOCK_SIZE]
+                        write_queue.put(compressors.submit(self.compress, block))
+                    if write_errors:
+                        raise write_errors[0]
+
+                for tarinfo, path, prefetched in self._iter_members(source_folder, readers, progress,
+                                                                    path_filter, errors):
+                    check_cancelled(cancel)
+                    source = None
+                    if not tarinfo.isdir():
+                        # Open the file before its header goes out, so an unreadable one is left out
+                        try:
+                            source = prefetched.result() if prefetched is not None else open(path, 'rb')
+                        except OSError as why:
+                            errors.append((path, tarinfo.name, str(why)))
+                            continue
+                    emit(tarinfo.tobuf(tarfile.PAX_FORMAT, tarfile.ENCODING, 'surrogateescape'))
+                    members.append([tarinfo.name, 'dir' if tarinfo.isdir() else 'file', emitted[0],
+                                    tarinfo.size, tarinfo.mode, tarinfo.mtime])
+                    if tarinfo.isdir():
+                        stats.dirs += 1
+                        continue
+                    if self.throttle is not None:
+                        self.throttle.consume_file()
+                    started = time.monotonic()
+                    digest = hashlib.blake2b() if checksums is not None else None
+                    if prefetched is not None:
+                        data = source
+                        if self.throttle is not None:
+                            self.throttle.consume_bytes(len(data))
+                        if digest is not None:
+                            digest.update(data)
+                        emit(data)
+                    else:
+                        with source:
+                            why = self._stream_file(source, tarinfo.size, emit, digest)
+                        if why is not None:
+                            errors.append((path, tarinfo.name, str(why)))
+                            digest = None
+                    if digest is not None:
+                        checksums.add(tarinfo.name, digest.hexdigest())
+                    padding = -tarinfo.size % tarfile.BLOCKSIZE
+                    if padding:
+                        emit(tarfile.NUL * padding)
+                    stats.files += 1
+                    stats.bytes += tarinfo.size
+                    stats.slowest.add(time.monotonic() - started, tarinfo.name, tarinfo.size)
+                    if progress is not None:
+                        progress.advance(tarinfo.size)
+
+                # End-of-archive marker, padded to a full tar record
+                emit(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+                emit(tarfile.NUL * (-emitted[0] % tarfile.RECORDSIZE))
+                if buffer:
+                    write_queue.put(compressors.submit(self.compress, bytes(buffer)))
+                    buffer.clear()
+            completed = True
+        finally:
+            write_queue.put(None)
+            writer_thread.join()
+            out.close()
+            if not completed or write_errors:
+                os.remove(partial_path)
+
+        if write_errors:
+            raise write_errors[0]
+        os.replace(partial_path, archive_path)
+        index_path = member_index_path(archive_path)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump({'format': self.archive_format, 'block_size': BLOCK_SIZE,
+                       'blocks': block_offsets, 'members': members}, f)
+        os.replace(index_path + '.tmp', index_path)
+        if errors:
+            raise shutil.Error(errors)
+        return stats
+
+    def _stream_file(self, f, size, emit, digest=None):
+        """Feed a large file into the tar stream in READ_SIZE pieces
+
+        The member's header is already written, so a file that shrank or
+        fails part-way is padded with NULs. Returns the read error, if any.
+        """
+        remaining = size
+        error = None
+        while remaining > 0:
+            data = None
+            if error is None:
+                try:
+                    data = f.read(min(READ_SIZE, remaining))
+                except OSError as e:
+                    error = e
+            if not data:
+                data = tarfile.NUL * min(READ_SIZE, remaining)
+            if self.throttle is not None:
+                self.throttle.consume_bytes(len(data))
+            if digest is not None:
+                digest.update(data)
+            emit(data)
+            remaining -= len(data)
+        return error
+
+    def _iter_members(self, source_folder, readers, progress=None, path_filter=None, errors=None):
+        """Yield (tarinfo, path, prefetch future) in archive order
+
+        Small files are submitted to the reader pool a window ahead of the
+        assembler so their contents are usually ready when needed. Entries
+        that cannot be read are appended to errors as (path, name, why).
+        """
+        if errors is None:
+            errors = []
+        window = deque()
+        window_size = self.workers * 8
+
+        def walk_error(e):
+            errors.append((e.filename, os.path.relpath(e.filename, source_folder), str(e)))
+
+        for dirpath, dirnames, filenames in os.walk(source_folder, followlinks=True, onerror=walk_error):
+            dirnames.sort()
+            rel_dir = os.path.relpath(dirpath, source_folder)
+            if path_filter is not None:
+                prefix = '' if rel_dir == '.' else rel_dir
+                dirnames[:] = [name for name in dirnames
+                               if not path_filter.excluded(os.path.join(prefix, name), True)]
+                filenames = [name for name in filenames
+                             if not path_filter.excluded(os.path.join(prefix, name))]
+            try:
+                dir_stat = os.stat(dirpath)
+            except OSError as why:
+                errors.append((dirpath, rel_dir, str(why)))
+                dirnames[:] = []
+                continue
+            window.append((self._tarinfo(rel_dir, dir_stat, tarfile.DIRTYPE), dirpath, None))
+            for name in sorted(filenames):
+                path = os.path.join(dirpath, name)
+                try:
+                    file_stat = os.stat(path)
+                except OSError as why:
+                    errors.append((path, os.path.normpath(os.path.join(rel_dir, name)), str(why)))
+                    continue
+                tarinfo = self._tarinfo(os.path.join(rel_dir, name), file_stat, tarfile.REGTYPE)
+                if progress is not None:
+                    progress.add_total(file_stat.st_size)
+                prefetched = None
+                if file_stat.st_size <= PREFETCH_MAX_FILE:
+                    prefetched = readers.submit(_read_file, path, file_stat.st_size)
+                window.append((tarinfo, path, prefetched))
+                while len(window) > window_size:
+                    yield window.popleft()
+        while window:
+            yield window.popleft()
+
+    def _tarinfo(self, rel_path, st, member_type):
+        tarinfo = tarfile.TarInfo(os.path.normpath(rel_path))
+        tarinfo.type = member_type
+        tarinfo.mode = st.st_mode & 0o7777
+        tarinfo.mtime = st.st_mtime
+        tarinfo.uid = st.st_uid
+        tarinfo.gid = st.st_gid
+        tarinfo.size = st.st_size if member_type == tarfile.REGTYPE else 0
+        return tarinfo
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Backup Clean - safe parallel removal of backed-up files from the source
+Only deletes files the verification confirmed in the backup and that have not
+changed since the backup started, and logs every deleted path
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CLEAN_WORKERS = 16
+
+# Files whose inode changed less than this long before the backup started are
+# kept too, to allow for the coarse clock the kernel stamps ctime with
+CHANGE_MARGIN_NS = 1000 * 1000 * 1000
+
+CLEANED_LOG_NAME = ".backup_cleaned.txt"
+
+def cleaned_log_path_for(backup_path, is_folder=None):
+    """Return the path of the list of source files removed after backup_path was taken"""
+    if is_folder is None:
+        is_folder = os.path.isdir(backup_path)
+    if is_folder:
+        return os.path.join(backup_path, CLEANED_LOG_NAME)
+    return backup_path + '.cleaned.txt'
+
+def _walk_source(source_folder):
+    """Return (files, directories) under source_folder as relative paths, not following symlinks"""
+    files = []
+    dirs = []
+    pending = ['']
+    while pending:
+        rel_dir = pending.pop()
+        try:
+            with os.scandir(os.path.join(source_folder, rel_dir)) as entries:
+                for entry in entries:
+                    rel_path = os.path.join(rel_dir, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        dirs.append(rel_path)
+                        pending.append(rel_path)
+                    elif not entry.is_symlink() or not entry.is_dir():
+                        # Symlinks to directories are left alone; their targets live elsewhere
+                        files.append(rel_path)
+        except OSError:
+            continue
+    return files, dirs
+
+class CleanResult:
+    """Outcome of cleaning a source folder"""
+    def __init__(self):
+        self.deleted = []
+        self.kept = []
+        self.errors = []
+        self.log_path = None
+        self.seconds = 0.0
+
+    def summary(self):
+        summary = f"Removed {len(self.deleted)} backed-up files from the source in {self.seconds:.1f}s"
+        if self.kept:
+            summary += f", kept {len(self.kept)} not confirmed in the backup or changed since"
+        if self.errors:
+            summary += f", {len(self.errors)} could not be removed"
+        return summary
+
+class SourceCleaner:
+    """Delete source files that are safely in a verified backup
+
+    A file is removed only if its relative path is among the confirmed
+    paths and its ctime is older than the backup's start, so files created
+    or modified while the backup ran stay where they are. Unlinks run on a
+    thread pool; emptied directories are then removed deepest first. The
+    deleted paths are written to log_path.
+    """
+    def __init__(self, workers=DEFAULT_CLEAN_WORKERS):
+        self.workers = max(1, int(workers))
+
+    def clean(self, source_folder, confirmed, started_ns, log_path=None):
+        start = time.monotonic()
+        result = CleanResult()
+        files, dirs = _walk_source(source_folder)
+        cutoff = started_ns - CHANGE_MARGIN_NS
+
+        def remove(rel_path):
+            path = os.path.join(source_folder, rel_path)
+            try:
+                if rel_path not in confirmed or os.lstat(path).st_ctime_ns >= cutoff:
+                    return rel_path, False, None
+                os.remove(path)
+                return rel_path, True, None
+            except OSError as e:
+                return rel_path, False, e
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for rel_path, deleted, error in pool.map(remove, files):
+                if deleted:
+                    result.deleted.append(rel_path)
+                elif error is not None:
+                    result.errors.append((rel_path, str(error)))
+                else:
+                    result.kept.append(rel_path)
+
+        # Deepest first, so parents are empty by the time they are reached
+        for rel_dir in sorted(dirs, key=lambda d: d.count(os.sep), reverse=True):
+            try:
+                os.rmdir(os.path.join(source_folder, rel_dir))
+            except OSError:
+                pass
+
+        if log_path:
+            result.log_path = log_path
+            with open(log_path, 'w', encoding='utf-8') as f:
+                for rel_path in sorted(result.deleted):
+                    f.write(rel_path + '\n')
+        result.seconds = time.monotonic() - start
+        return result
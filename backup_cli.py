@@ -7,38 +7,29 @@ A scheduled backup application without GUI dependencies
 import os
 import shutil
 import json
-import threading
+import re
 import time
 from datetime import datetime
 import argparse
 
-# Simple scheduler replacement for when the schedule library isn't available
-class SimpleScheduler:
-    def __init__(self):
-        self.jobs = []
-    
-    def add_job(self, days, time_str, func):
-        """Add a scheduled job"""
-        self.jobs.append({
-            'days': days,
-            'time': time_str,
-            'func': func
-        })
-    
-    def run_pending(self):
-        """Check and run any pending jobs"""
-        now = datetime.now()
-        current_day = now.strftime('%a').lower()
-        current_time = now.strftime('%H:%M')
-        
-        for job in self.jobs:
-            if current_day in job['days'] and current_time == job['time']:
-                print(f"Running scheduled backup at {current_time}")
-                job['func']()
-    
-    def clear(self):
-        """Clear all scheduled jobs"""
-        self.jobs = []
+from backup_engine import BackupRun, BACKUP_FORMATS, ENGINE_DEFAULTS, load_engine_options, latest_snapshot
+from backup_index import FileIndex, index_path_for
+from backup_scan import check_free_space, estimate
+from backup_scheduler import BackupScheduler
+from backup_jobs import DEFAULT_MAX_JOBS, DEFAULT_PER_DESTINATION, load_status
+from backup_orchestrator import BackupOrchestrator
+from backup_progress import BackupCancelled
+from backup_retention import RETENTION_KEYS, Pruner, list_backups, retention_enabled
+from backup_restore import Restorer, find_backup
+from backup_verify import BackupVerifier
+from backup_metrics import RunMetrics, metrics_paths, read_runs
+from backup_daemon import BackupDaemon, DaemonClient, DaemonError, socket_path_for
+from backup_throttle import Throttle, parse_io_nice
+from backup_filter import PathFilter, filter_from_options
+from backup_watch import ChangeWatcher, inotify_available
+
+# Name of the job described by the top-level source/destination settings
+DEFAULT_JOB = "default"
 
 class BackupToolkitCLI:
     def __init__(self):
@@ -51,131 +42,692 @@ class BackupToolkitCLI:
         self.selected_days = []
         self.daily_backup_enabled = False
         self.clean_after_backup = False
+        self.engine_options = dict(ENGINE_DEFAULTS)
+        
+        # Additional named backup jobs and how many may run at once
+        self.jobs = []
+        self.max_concurrent_jobs = DEFAULT_MAX_JOBS
+        self.per_destination_jobs = DEFAULT_PER_DESTINATION
         
         # Load existing configuration
         self.load_config()
         
-        # Simple scheduler
-        self.scheduler = SimpleScheduler()
-        self.scheduler_running = False
-        self.scheduler_thread = None
+        # Event-driven scheduler feeding the asyncio job orchestrator
+        self.scheduler = BackupScheduler()
+        self.queue_status_file = os.path.join(os.path.dirname(os.path.abspath(self.config_file)),
+                                              "backup_queue_status.json")
+        self.orchestrator = BackupOrchestrator(self.max_concurrent_jobs, self.per_destination_jobs,
+                                               status_file=self.queue_status_file)
         
-    def set_source_folder(self, folder):
+        # Rate limits shared by every backup of this process; follows config changes mid-run
+        self.throttle = Throttle.from_options(self.engine_options, config_file=self.config_file)
+        
+        # inotify change journals of the jobs with watch_changes or continuous
+        # backups, and the continuous triggers they feed, while the scheduler runs
+        self.watchers = {}
+        self.triggers = {}
+    
+    def get_job(self, name=None):
+        """Return the settings of a named job, or of the default job"""
+        if name is None or name == DEFAULT_JOB:
+            return {
+                'name': DEFAULT_JOB,
+                'source_folder': self.source_folder,
+                'backup_location': self.backup_location,
+                'backup_time': self.backup_time,
+                'selected_days': self.selected_days,
+                'clean_after_backup': self.clean_after_backup,
+            }
+        for job in self.jobs:
+            if job['name'] == name:
+                return job
+        return None
+    
+    def all_jobs(self):
+        """Return every configured job, the default one first if it is set up"""
+        jobs = [self.get_job()] if self.source_folder else []
+        return jobs + self.jobs
+    
+    def _update_job(self, name, **settings):
+        """Change settings of a named job (creating it) or of the default job"""
+        if name is None or name == DEFAULT_JOB:
+            for key, value in settings.items():
+                setattr(self, key, value)
+            return
+        job = self.get_job(name)
+        if job is None:
+            job = {
+                'name': name,
+                'source_folder': '',
+                'backup_location': '',
+                'backup_time': '00:00',
+                'selected_days': [],
+                'clean_after_backup': False,
+            }
+            self.jobs.append(job)
+            print(f"Created job '{name}'")
+        job.update(settings)
+    
+    def remove_job(self, name):
+        """Delete a named job"""
+        job = self.get_job(name)
+        if job is None or name == DEFAULT_JOB:
+            print(f"Error: No job named '{name}'")
+            return False
+        self.jobs.remove(job)
+        self.save_config()
+        self.update_schedule()
+        print(f"Removed job '{name}'")
+        return True
+    
+    def _job_label(self, name):
+        return f" for job '{name}'" if name and name != DEFAULT_JOB else ""
+        
+    def set_source_folder(self, folder, job=None):
         """Set the source folder to backup"""
         if os.path.exists(folder):
-            self.source_folder = folder
+            self._update_job(job, source_folder=folder)
             self.save_config()
-            print(f"Source folder set to: {folder}")
+            print(f"Source folder{self._job_label(job)} set to: {folder}")
             return True
         else:
             print(f"Error: Folder '{folder}' does not exist")
             return False
     
-    def set_backup_location(self, folder):
+    def set_backup_location(self, folder, job=None):
         """Set the backup destination folder"""
         if os.path.exists(folder):
-            self.backup_location = folder
+            self._update_job(job, backup_location=folder)
             self.save_config()
-            print(f"Backup location set to: {folder}")
+            print(f"Backup location{self._job_label(job)} set to: {folder}")
             return True
         else:
             print(f"Error: Folder '{folder}' does not exist")
             return False
     
-    def set_schedule(self, time_str, days):
+    def set_schedule(self, time_str, days, job=None):
         """Set backup schedule"""
         try:
             # Validate time format
             datetime.strptime(time_str, '%H:%M')
-            self.backup_time = time_str
-            self.selected_days = [day.lower() for day in days]
+            self._update_job(job, backup_time=time_str,
+                             selected_days=[day.lower() for day in days])
             self.save_config()
             self.update_schedule()
-            print(f"Schedule set: {time_str} on {', '.join(days)}")
+            print(f"Schedule{self._job_label(job)} set: {time_str} on {', '.join(days)}")
             return True
         except ValueError:
             print("Error: Time must be in HH:MM format (e.g., '14:30')")
             return False
     
-    def backup_now(self):
+    def set_clean(self, enabled, job=None):
+        """Enable or disable cleaning the source after backup"""
+        self._update_job(job, clean_after_backup=enabled)
+        self.save_config()
+        print(f"Source cleaning{self._job_label(job)} {'enabled' if enabled else 'disabled'}")
+    
+    def set_job_limits(self, max_jobs=None, per_destination=None):
+        """Set how many jobs may run at once, overall and per destination disk"""
+        if max_jobs is not None:
+            self.max_concurrent_jobs = max(1, max_jobs)
+            print(f"Concurrent jobs set to: {self.max_concurrent_jobs}")
+        if per_destination is not None:
+            self.per_destination_jobs = max(1, per_destination)
+            print(f"Jobs per destination disk set to: {self.per_destination_jobs}")
+        self.save_config()
+    
+    def set_workers(self, workers):
+        """Set the number of parallel copy workers"""
+        if workers < 1:
+            print("Error: Number of workers must be at least 1")
+            return False
+        self.engine_options['copy_workers'] = workers
+        self.save_config()
+        print(f"Copy workers set to: {workers}")
+        return True
+    
+    def set_incremental(self, enabled):
+        """Enable or disable incremental (hard-linked) backups"""
+        self.engine_options['incremental'] = enabled
+        self.save_config()
+        print(f"Incremental backup {'enabled' if enabled else 'disabled'}")
+    
+    def set_verify(self, enabled):
+        """Enable or disable verifying every backup against the source"""
+        self.engine_options['verify'] = enabled
+        self.save_config()
+        print(f"Backup verification {'enabled' if enabled else 'disabled'}")
+    
+    def set_move_on_clean(self, enabled):
+        """Enable or disable moving the source into the backup when cleaning on the same filesystem"""
+        self.engine_options['move_on_clean'] = enabled
+        self.save_config()
+        print(f"Move instead of copy when cleaning {'enabled' if enabled else 'disabled'}")
+    
+    def set_retention(self, **limits):
+        """Set how many backups to keep (keep_last, keep_daily, keep_weekly, keep_monthly; 0 = no limit)"""
+        for key, value in limits.items():
+            if value < 0:
+                print("Error: Retention limits must be 0 or more")
+                return False
+            self.engine_options[key] = value
+        self.save_config()
+        print(f"Retention set: {self._retention_label(self.engine_options)}")
+        return True
+    
+    def set_throttle(self, mb_per_s=None, files_per_s=None, io_nice=None):
+        """Set the bandwidth, file rate and I/O priority limits (0 / 'off' = unlimited)"""
+        if (mb_per_s is not None and mb_per_s < 0) or (files_per_s is not None and files_per_s < 0):
+            print("Error: Rate limits must be 0 or more")
+            return False
+        if io_nice is not None:
+            try:
+                parse_io_nice(io_nice)
+            except ValueError:
+                print("Error: I/O priority must be 'idle', 'off' or a level from 0 to 7")
+                return False
+            io_nice = '' if io_nice in ('off', 'none') else io_nice
+            self.engine_options['io_nice'] = int(io_nice) if str(io_nice).isdigit() else io_nice
+        if mb_per_s is not None:
+            self.engine_options['max_mb_per_s'] = mb_per_s
+        if files_per_s is not None:
+            self.engine_options['max_files_per_s'] = files_per_s
+        self.throttle.set_limits(mb_per_s, files_per_s)
+        self.save_config()
+        print(f"Throttle set: {self._throttle_label(self.engine_options)}")
+        return True
+    
+    def set_filters(self, exclude=None, include=None, clear=False):
+        """Add gitignore-style exclude / include patterns, or clear them all first"""
+        if clear:
+            self.engine_options['exclude'] = []
+            self.engine_options['include'] = []
+        if exclude:
+            self.engine_options['exclude'] = list(self.engine_options['exclude']) + exclude
+        if include:
+            self.engine_options['include'] = list(self.engine_options['include']) + include
+        try:
+            PathFilter(self.engine_options['exclude'], self.engine_options['include'])
+        except re.error as e:
+            print(f"Error: Invalid pattern: {e}")
+            return False
+        self.save_config()
+        print(f"Filters set: {self._filter_label(self.engine_options)}")
+        return True
+    
+    def _filter_label(self, options):
+        rules = [f"exclude {pattern}" for pattern in options.get('exclude') or []]
+        rules += [f"include {pattern}" for pattern in options.get('include') or []]
+        return ', '.join(rules) or "back up everything"
+    
+    def set_watch(self, enabled=None, full_rescan_hours=None):
+        """Enable or disable the inotify change journal and set the full rescan interval"""
+        if full_rescan_hours is not None:
+            if full_rescan_hours < 0:
+                print("Error: Full rescan interval must be 0 or more hours")
+                return False
+            self.engine_options['full_rescan_hours'] = full_rescan_hours
+        if enabled is not None:
+            self.engine_options['watch_changes'] = enabled
+        self.save_config()
+        print(f"Change journal {'enabled' if self.engine_options['watch_changes'] else 'disabled'} "
+              f"(full rescan every {self.engine_options['full_rescan_hours']} hours)")
+        if self.engine_options['watch_changes'] and not (self.engine_options['incremental']
+                                                         and self.engine_options['use_index']):
+            print("Note: The change journal is only used by incremental backups with the file index")
+        return True
+    
+    def set_delta(self, enabled=None, min_mb=None, block_kb=None):
+        """Enable or disable block-level delta copies of large files and set their sizes"""
+        if (min_mb is not None and min_mb < 0) or (block_kb is not None and block_kb < 4):
+            print("Error: Delta minimum size must be 0 or more MB and block size at least 4 KB")
+            return False
+        if min_mb is not None:
+            self.engine_options['delta_min_mb'] = min_mb
+        if block_kb is not None:
+            self.engine_options['delta_block_kb'] = block_kb
+        if enabled is not None:
+            self.engine_options['delta_copy'] = enabled
+        self.save_config()
+        print(f"Delta copies {self._delta_label(self.engine_options)}")
+        if self.engine_options['delta_copy'] and not (self.engine_options['incremental']
+                                                      and self.engine_options['use_index']):
+            print("Note: Delta copies are only used by incremental backups with the file index")
+        return True
+    
+    def _delta_label(self, options):
+        if not options['delta_copy']:
+            return "disabled"
+        return (f"enabled for files of {options['delta_min_mb']} MB or more "
+                f"({options['delta_block_kb']} KB blocks)")
+    
+    def set_continuous(self, interval, debounce=None, job=None):
+        """Back up a job (all jobs if None) at most every interval seconds after its source changes; 0 turns it off"""
+        if interval < 0 or (debounce is not None and debounce < 0):
+            print("Error: Continuous interval and debounce must be 0 or more seconds")
+            return False
+        if job is None or job == DEFAULT_JOB:
+            options = self.engine_options
+        else:
+            named = self.get_job(job)
+            if named is None:
+                print(f"Error: No job named '{job}'")
+                return False
+            options = named.setdefault('options', {})
+        options['continuous_interval'] = interval
+        if debounce is not None:
+            options['continuous_debounce'] = debounce
+        self.save_config()
+        self.update_schedule()
+        if interval:
+            print(f"Continuous backup{self._job_label(job)} set: at most every {interval}s after changes")
+            effective = self.job_options(self.get_job(job))
+            if not (effective['incremental'] and effective['use_index']
+                    and effective['backup_format'] == 'folder'):
+                print("Note: Continuous backups are only small when they are incremental folder backups")
+        else:
+            print(f"Continuous backup{self._job_label(job)} disabled")
+        return True
+    
+    def _source_changed(self, name):
+        """Called by a job's watcher when its source changed"""
+        trigger = self.triggers.get(name)
+        if trigger is not None:
+            trigger.changed()
+    
+    def start_watchers(self):
+        """Start a change watcher for every job with watch_changes or continuous backups"""
+        for job in self.all_jobs():
+            options = self.job_options(job)
+            if (not (options['watch_changes'] or options['continuous_interval'])
+                    or job['name'] in self.watchers
+                    or not job['source_folder'] or not os.path.isdir(job['source_folder'])):
+                continue
+            if not inotify_available():
+                print("Warning: inotify is not available, backups will scan the whole source "
+                      "and continuous backups cannot run")
+                return
+            watcher = ChangeWatcher(job['source_folder'], filter_from_options(options),
+                                    options['full_rescan_hours'],
+                                    on_change=lambda name=job['name']: self._source_changed(name))
+            try:
+                watcher.start()
+            except OSError as e:
+                print(f"Warning: Cannot watch {job['source_folder']}: {e}")
+                continue
+            self.watchers[job['name']] = watcher
+            print(f"Watching {job['source_folder']} for changes{self._job_label(job['name'])}")
+    
+    def stop_watchers(self):
+        """Stop every change watcher"""
+        for watcher in self.watchers.values():
+            watcher.stop()
+        self.watchers = {}
+    
+    def _throttle_label(self, options):
+        limits = []
+        if options.get('max_mb_per_s'):
+            limits.append(f"{options['max_mb_per_s']} MB/s")
+        if options.get('max_files_per_s'):
+            limits.append(f"{options['max_files_per_s']} files/s")
+        if options.get('io_nice') not in (None, ''):
+            limits.append(f"I/O priority {options['io_nice']}")
+        return ', '.join(limits) or "unlimited"
+    
+    def _retention_label(self, options):
+        if not retention_enabled(options):
+            return "keep everything"
+        return ', '.join(f"{key.replace('_', ' ')} {options[key]}" for key in RETENTION_KEYS if options.get(key))
+    
+    def prune(self, job_name=None, dry_run=False):
+        """Delete the backups the retention settings no longer keep"""
+        job = self.get_job(job_name)
+        if job is None or not job['source_folder'] or not job['backup_location']:
+            print("Error: Please set both source folder and backup location first!")
+            return False
+        options = self.job_options(job)
+        if not retention_enabled(options):
+            print("No retention limits set - nothing to prune (see --keep-last/--keep-daily/...)")
+            return False
+        tag = f"[{job['name']}] " if job['name'] != DEFAULT_JOB else ""
+        try:
+            result = Pruner().prune(job['backup_location'], job['source_folder'], options, dry_run=dry_run)
+        except Exception as e:
+            print(f"{tag}Pruning failed: {str(e)}")
+            return False
+        if dry_run:
+            for backup in result.kept:
+                print(f"{tag}  keep   {backup.path}")
+            for backup in result.pruned:
+                print(f"{tag}  prune  {backup.path}")
+        print(f"{tag}{result.summary()}")
+        for path, error in result.errors[:10]:
+            print(f"{tag}  {path}: {error}")
+        return not result.errors
+    
+    def list_backups(self, job_name=None):
+        """Print every backup of a job's source, oldest first"""
+        job = self.get_job(job_name)
+        if job is None or not job['source_folder'] or not job['backup_location']:
+            print("Error: Please set both source folder and backup location first!")
+            return False
+        backups = list_backups(job['backup_location'], job['source_folder'])
+        if not backups:
+            print("No backups found")
+        for backup in backups:
+            print(f"  {backup.time.strftime('%Y-%m-%d %H:%M:%S')}  {backup.kind:<7}  {backup.path}")
+        return True
+    
+    def restore(self, paths, snapshot=None, target='.', job_name=None, overwrite=False):
+        """Restore files, globs or subtrees from a backup (the newest one unless snapshot is given)"""
+        job = self.get_job(job_name)
+        if job is None or not job['source_folder'] or not job['backup_location']:
+            print("Error: Please set both source folder and backup location first!")
+            return False
+        backup = find_backup(job['backup_location'], job['source_folder'], snapshot)
+        if backup is None:
+            print(f"Error: No backup found{f' named {snapshot}' if snapshot else ''}")
+            return False
+        try:
+            print(f"Restoring {', '.join(paths) if paths else 'everything'} from {backup.path} to {target}")
+            result = Restorer(overwrite=overwrite).restore(backup, paths, target)
+        except Exception as e:
+            print(f"Restore failed: {str(e)}")
+            return False
+        print(result.summary())
+        return True
+    
+    def verify_backup(self, snapshot=None, job_name=None):
+        """Check an existing backup (the newest one unless snapshot is given) against its checksums"""
+        job = self.get_job(job_name)
+        if job is None or not job['source_folder'] or not job['backup_location']:
+            print("Error: Please set both source folder and backup location first!")
+            return False
+        backup = find_backup(job['backup_location'], job['source_folder'], snapshot)
+        if backup is None:
+            print(f"Error: No backup found{f' named {snapshot}' if snapshot else ''}")
+            return False
+        try:
+            print(f"Verifying {backup.path}...")
+            verified = BackupVerifier().verify(job['source_folder'], backup.path, backup.kind,
+                                               path_filter=filter_from_options(self.job_options(job)))
+        except Exception as e:
+            print(f"Verification failed: {str(e)}")
+            return False
+        print(verified.summary())
+        for rel_path in (verified.mismatched + verified.missing)[:10]:
+            print(f"  {rel_path}")
+        return verified.ok
+    
+    def set_checksums(self, enabled):
+        """Enable or disable writing a checksum manifest while copying"""
+        self.engine_options['checksums'] = enabled
+        self.save_config()
+        print(f"Checksum manifest {'enabled' if enabled else 'disabled'}")
+    
+    def set_backup_format(self, backup_format):
+        """Set the backup output format"""
+        if backup_format not in BACKUP_FORMATS:
+            print(f"Error: Format must be one of: {', '.join(BACKUP_FORMATS)}")
+            return False
+        self.engine_options['backup_format'] = backup_format
+        self.save_config()
+        print(f"Backup format set to: {backup_format}")
+        return True
+    
+    def set_compression_level(self, level):
+        """Set the compression level used by the archive formats"""
+        self.engine_options['compression_level'] = level
+        self.save_config()
+        print(f"Compression level set to: {level}")
+        return True
+    
+    def job_options(self, job):
+        """Engine options for a job: the global ones plus its own overrides"""
+        return dict(self.engine_options, **job.get('options', {}))
+    
+    def backup_now(self, job_name=None):
         """Perform an immediate backup"""
-        if not self.source_folder or not self.backup_location:
+        job = self.get_job(job_name)
+        if job is None:
+            print(f"Error: No job named '{job_name}'")
+            return False
+        
+        if not job['source_folder'] or not job['backup_location']:
             print("Error: Please set both source folder and backup location first!")
             return False
         
-        if not os.path.exists(self.source_folder):
+        if not os.path.exists(job['source_folder']):
             print("Error: Source folder does not exist!")
             return False
         
-        if not os.path.exists(self.backup_location):
+        if not os.path.exists(job['backup_location']):
             print("Error: Backup location does not exist!")
             return False
         
-        return self._perform_backup()
+        # Size the backup before copying anything
+        options = self.job_options(job)
+        scan = estimate(job['source_folder'], workers=options['copy_workers'],
+                        path_filter=filter_from_options(options))
+        print(f"Source contains {scan.files} files ({scan.bytes / (1024 * 1024):.1f} MB), "
+              f"scanned in {scan.seconds:.2f}s")
+        status, message = check_free_space(scan, job['backup_location'], options)
+        if status == 'refuse':
+            print(f"Error: {message}")
+            return False
+        if status == 'warn':
+            print(f"Warning: {message}")
+        
+        return self._perform_backup(scan, job)
     
-    def _perform_backup(self):
+    def _perform_backup(self, scan=None, job=None, cancel=None):
         """Internal backup function"""
+        job = job or self.get_job()
+        source_folder = job['source_folder']
+        # Prefix output of named jobs, which may run concurrently
+        tag = f"[{job['name']}] " if job['name'] != DEFAULT_JOB else ""
+        options = self.job_options(job)
+        metrics = RunMetrics(job['name'], source_folder, job['backup_location'], options['backup_format'])
+        if scan is not None:
+            metrics.add_phase('scan', scan.seconds)
+        watcher = self.watchers.get(job['name'])
+        backup_path = None
         try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            source_name = os.path.basename(self.source_folder)
-            backup_folder_name = f"{source_name}_backup_{timestamp}"
-            backup_path = os.path.join(self.backup_location, backup_folder_name)
+            backup_run = BackupRun(source_folder, job['backup_location'], options,
+                                   index_path=index_path_for(self.config_file, source_folder, job['backup_location']),
+                                   scan=scan, move=job['clean_after_backup'], cancel=cancel,
+                                   throttle=self.throttle,
+                                   changes=watcher.take() if watcher is not None else None)
+            backup_path = backup_run.backup_path
             
-            print(f"Starting backup from {self.source_folder} to {backup_path}")
+            if backup_run.resuming:
+                print(f"{tag}Resuming interrupted backup from {source_folder} in {backup_path}")
+            else:
+                print(f"{tag}Starting backup from {source_folder} to {backup_path}")
             
             # Perform the backup
-            shutil.copytree(self.source_folder, backup_path)
+            with metrics.phase('copy'):
+                stats = backup_run.run()
+            metrics.add_stats(stats)
+            if backup_run.previous_snapshot:
+                print(f"{tag}Incremental against {backup_run.previous_snapshot}")
+            if backup_run.used_changes:
+                print(f"{tag}Change journal: only {len(backup_run.changes.dirs)} changed folders scanned")
+            elif watcher is not None:
+                print(f"{tag}Change journal: {watcher.failed or 'full rescan of the source'}")
+            print(f"{tag}{stats.summary()}")
+            if backup_run.checksums is not None:
+                print(f"{tag}Checksums written to {backup_run.checksums.path}")
+            
+            # A moved source is already empty and there is no copy to verify
+            clean = job['clean_after_backup'] and not backup_run.moved
+            
+            # Verify the copy; cleaning the source is only allowed once it checks out
+            verified = None
+            if (options['verify'] and not backup_run.moved) or clean:
+                print(f"{tag}Verifying backup...")
+                with metrics.phase('verify'):
+                    verified = backup_run.verify()
+                print(f"{tag}{verified.summary()}")
+                for rel_path in (verified.mismatched + verified.missing)[:10]:
+                    print(f"{tag}  {rel_path}")
+                if not verified.ok:
+                    if clean:
+                        print(f"{tag}Source folder NOT cleaned")
+                    print(f"{tag}Backup saved to {backup_path} but failed verification")
+                    metrics.add_errors(len(verified.mismatched) + len(verified.missing))
+                    metrics.finish(False, verified.summary())
+                    return False
             
             # Clean source if option is enabled
-            if self.clean_after_backup:
-                print("Cleaning source folder...")
-                for item in os.listdir(self.source_folder):
-                    item_path = os.path.join(self.source_folder, item)
-                    if os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                    else:
-                        os.remove(item_path)
-                print("Source folder cleaned")
+            if clean:
+                print(f"{tag}Cleaning source folder...")
+                with metrics.phase('clean'):
+                    cleaned = backup_run.clean_source(verified)
+                metrics.add_errors(len(cleaned.errors))
+                print(f"{tag}{cleaned.summary()}")
+                for rel_path, error in cleaned.errors[:10]:
+                    print(f"{tag}  {rel_path}: {error}")
+                print(f"{tag}Removed files listed in {cleaned.log_path}")
             
-            print(f"Backup completed successfully!\nSaved to: {backup_path}")
+            print(f"{tag}Backup completed successfully!\nSaved to: {backup_path}")
+            
+            # Apply retention now that the new backup is safely in place
+            if retention_enabled(options):
+                with metrics.phase('prune'):
+                    self.prune(job['name'])
+            metrics.finish(True)
             return True
             
+        except BackupCancelled:
+            print(f"{tag}Backup cancelled")
+            metrics.finish(False, "cancelled")
+            return False
         except Exception as e:
-            print(f"Backup failed: {str(e)}")
+            print(f"{tag}Backup failed: {str(e)}")
+            if isinstance(e, shutil.Error):
+                metrics.add_errors(len(e.args[0]))
+            metrics.finish(False, str(e))
+            return False
+        finally:
+            if watcher is not None:
+                watcher.finish(metrics.record['ok'] is True, backup_path)
+            metrics.write(self.config_file, options)
+    
+    def rebuild_index(self, job_name=None):
+        """Recreate the file index from the source and its latest snapshot"""
+        job = self.get_job(job_name)
+        if job is None or not job['source_folder'] or not job['backup_location']:
+            print("Error: Please set both source folder and backup location first!")
+            return False
+        
+        snapshot = latest_snapshot(job['backup_location'], job['source_folder'])
+        if not snapshot:
+            print("Error: No existing backup to index - the next backup will build the index")
+            return False
+        
+        index_path = index_path_for(self.config_file, job['source_folder'], job['backup_location'])
+        try:
+            print(f"Rebuilding index {index_path} from {snapshot}...")
+            with FileIndex(index_path) as index:
+                count = index.rebuild(job['source_folder'], snapshot,
+                                      workers=self.engine_options['copy_workers'])
+            print(f"Index rebuilt: {count} unchanged files indexed")
+            return True
+        except Exception as e:
+            print(f"Index rebuild failed: {str(e)}")
             return False
     
     def update_schedule(self):
         """Update the backup schedule"""
         self.scheduler.clear()
         
-        if self.selected_days and self.backup_time:
-            self.scheduler.add_job(self.selected_days, self.backup_time, self._perform_backup)
-            print(f"Scheduler updated: {self.backup_time} on {', '.join(self.selected_days)}")
+        for job in self.all_jobs():
+            if job['selected_days'] and job['backup_time'] and job['source_folder']:
+                self.scheduler.add_job(job['selected_days'], job['backup_time'],
+                                       lambda job=job: self.queue_job(job))
+                print(f"Scheduler updated{self._job_label(job['name'])}: "
+                      f"{job['backup_time']} on {', '.join(job['selected_days'])}")
+        
+        # Continuous jobs run on the same scheduler thread, woken by their watchers
+        self.triggers = {}
+        for job in self.all_jobs():
+            options = self.job_options(job)
+            if options['continuous_interval'] and job['source_folder'] and job['backup_location']:
+                self.triggers[job['name']] = self.scheduler.add_continuous(
+                    lambda job=job: self.queue_job(job), options['continuous_interval'],
+                    options['continuous_debounce'])
+                print(f"Continuous backup{self._job_label(job['name'])}: "
+                      f"at most every {options['continuous_interval']}s after changes")
+    
+    def queue_job(self, job):
+        """Hand a job to the orchestrator instead of running it in the scheduler thread"""
+        if not self.orchestrator.submit(job['name'],
+                                        lambda cancel: self._perform_backup(job=job, cancel=cancel),
+                                        job['backup_location']):
+            print(f"Job '{job['name']}' is already queued or running, skipping")
+            return False
+        return True
+    
+    def reload_config(self):
+        """Re-read the configuration file and apply it to the running scheduler and queue"""
+        self.load_config()
+        self.orchestrator.set_limits(self.max_concurrent_jobs, self.per_destination_jobs)
+        self.throttle.set_limits(self.engine_options['max_mb_per_s'],
+                                 self.engine_options['max_files_per_s'])
+        self.update_schedule()
+        if self.scheduler.running:
+            # Sources or filters may have changed: start over, beginning with a full rescan
+            self.stop_watchers()
+            self.start_watchers()
+    
+    def daemon_client(self):
+        """Return a client for the daemon using this configuration"""
+        return DaemonClient(socket_path_for(self.config_file))
+    
+    def daemon_request(self, command, quiet=False, **args):
+        """Send a command to the running daemon and return its reply, or None"""
+        try:
+            return self.daemon_client().request(command, **args)
+        except DaemonError as e:
+            print(f"Error: {e}")
+        except (OSError, ValueError) as e:
+            if not quiet:
+                print(f"Error: No backup daemon is running ({e})")
+        return None
+    
+    def run_daemon(self):
+        """Run the scheduler as a daemon controlled through its socket until stopped"""
+        try:
+            BackupDaemon(self).run()
+        except RuntimeError as e:
+            print(f"Error: {e}")
+            return False
+        return True
     
     def start_scheduler(self):
         """Start the backup scheduler"""
-        if self.scheduler_thread and self.scheduler_thread.is_alive():
+        if self.scheduler.running:
             print("Scheduler is already running")
             return
         
-        self.scheduler_running = True
-        self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
-        self.scheduler_thread.start()
+        # Load the saved schedule if it wasn't set in this session
+        if not self.scheduler.jobs:
+            self.update_schedule()
+        
+        self.scheduler.start()
         print("Backup scheduler started")
+        self.start_watchers()
+        next_run = self.scheduler.next_run()
+        if next_run:
+            print(f"Next backup: {next_run.strftime('%a %Y-%m-%d %H:%M')}")
     
     def stop_scheduler(self):
         """Stop the backup scheduler"""
-        self.scheduler_running = False
-        if self.scheduler_thread:
-            self.scheduler_thread.join(timeout=1)
+        self.scheduler.stop()
+        self.stop_watchers()
         print("Backup scheduler stopped")
     
-    def _run_scheduler(self):
-        """Run the scheduler loop"""
-        while self.scheduler_running:
-            self.scheduler.run_pending()
-            time.sleep(60)  # Check every minute
-    
     def load_config(self):
         """Load configuration from file"""
         try:
@@ -188,6 +740,10 @@ class BackupToolkitCLI:
                     self.selected_days = config.get('selected_days', [])
                     self.daily_backup_enabled = config.get('daily_backup_enabled', False)
                     self.clean_after_backup = config.get('clean_after_backup', False)
+                    self.engine_options = load_engine_options(config)
+                    self.jobs = config.get('jobs', [])
+                    self.max_concurrent_jobs = config.get('max_concurrent_jobs', DEFAULT_MAX_JOBS)
+                    self.per_destination_jobs = config.get('per_destination_jobs', DEFAULT_PER_DESTINATION)
                 print("Configuration loaded")
         except Exception as e:
             print(f"Error loading config: {e}")
@@ -200,8 +756,12 @@ class BackupToolkitCLI:
             'backup_time': self.backup_time,
             'selected_days': self.selected_days,
             'daily_backup_enabled': self.daily_backup_enabled,
-            'clean_after_backup': self.clean_after_backup
+            'clean_after_backup': self.clean_after_backup,
+            'jobs': self.jobs,
+            'max_concurrent_jobs': self.max_concurrent_jobs,
+            'per_destination_jobs': self.per_destination_jobs
         }
+        config.update(self.engine_options)
         
         try:
             with open(self.config_file, 'w') as f:
@@ -210,8 +770,8 @@ class BackupToolkitCLI:
         except Exception as e:
             print(f"Error saving config: {e}")
     
-    def show_status(self):
-        """Display current configuration"""
+    def show_status(self, runs=5):
+        """Display current configuration and the last few backup runs"""
         print("\n=== Backup Toolkit Status ===")
         print(f"Source folder: {self.source_folder or 'Not set'}")
         print(f"Backup location: {self.backup_location or 'Not set'}")
@@ -219,7 +779,65 @@ class BackupToolkitCLI:
         print(f"Scheduled days: {', '.join(self.selected_days) if self.selected_days else 'None'}")
         print(f"Daily backup: {'Enabled' if self.daily_backup_enabled else 'Disabled'}")
         print(f"Clean after backup: {'Enabled' if self.clean_after_backup else 'Disabled'}")
-        print(f"Scheduler: {'Running' if self.scheduler_running else 'Stopped'}")
+        print(f"Copy workers: {self.engine_options['copy_workers']}")
+        print(f"Incremental backup: {'Enabled' if self.engine_options['incremental'] else 'Disabled'}")
+        print(f"File index: {'Enabled' if self.engine_options['use_index'] else 'Disabled'}")
+        print(f"Verify backups: {'Enabled' if self.engine_options['verify'] else 'Only before cleaning'}")
+        print(f"Move when cleaning: {'Enabled' if self.engine_options['move_on_clean'] else 'Disabled'}")
+        print(f"Retention: {self._retention_label(self.engine_options)}")
+        print(f"Checksum manifest: {'Enabled' if self.engine_options['checksums'] else 'Disabled'}")
+        print(f"Backup format: {self.engine_options['backup_format']}")
+        level = self.engine_options['compression_level']
+        print(f"Compression level: {level if level is not None else 'Default'}")
+        print(f"Throttle: {self._throttle_label(self.engine_options)}")
+        print(f"Filters: {self._filter_label(self.engine_options)}")
+        print(f"Change journal: {'Enabled' if self.engine_options['watch_changes'] else 'Disabled'} "
+              f"(full rescan every {self.engine_options['full_rescan_hours']} hours)")
+        delta = self._delta_label(self.engine_options)
+        print(f"Delta copies: {delta[0].upper()}{delta[1:]}")
+        interval = self.engine_options['continuous_interval']
+        print(f"Continuous backup: {f'every {interval}s after changes' if interval else 'Disabled'}")
+        print(f"Scheduler: {'Running' if self.scheduler.running else 'Stopped'}")
+        print(f"Concurrent jobs: {self.max_concurrent_jobs} "
+              f"({self.per_destination_jobs} per destination disk)")
+        daemon = self.daemon_request('status', quiet=True)
+        if daemon:
+            state = "paused" if daemon['paused'] else "running"
+            next_run = f", next backup {daemon['next_run']}" if daemon['next_run'] else ""
+            print(f"Daemon: {state} (pid {daemon['pid']}{next_run})")
+        else:
+            print("Daemon: not running")
+        
+        if self.jobs:
+            print("\nJobs:")
+            for job in self.jobs:
+                days = ', '.join(job['selected_days']) if job['selected_days'] else 'no days'
+                print(f"  {job['name']}: {job['source_folder'] or 'Not set'} -> "
+                      f"{job['backup_location'] or 'Not set'} at {job['backup_time']} ({days})")
+        
+        # Queue state as last written by a running scheduler
+        queue_status = load_status(self.queue_status_file)
+        if queue_status:
+            print(f"\nJob queue (updated {queue_status['updated']}):")
+            for job in queue_status['running']:
+                print(f"  running  {job['name']} since {job['started']}")
+            for job in queue_status['queued']:
+                waiting = " (waiting for destination disk)" if job['waiting_for_destination'] else ""
+                print(f"  queued   {job['name']} since {job['queued']}{waiting}")
+            if not queue_status['running'] and not queue_status['queued']:
+                print("  idle")
+        
+        recent = read_runs(metrics_paths(self.config_file, self.engine_options)[0], runs) if runs else []
+        if recent:
+            print("\nRecent runs:")
+            for run in reversed(recent):
+                outcome = 'ok' if run['ok'] else 'FAILED'
+                speed = f", {run['throughput_mb_s']} MB/s" if run['throughput_mb_s'] is not None else ""
+                phases = ', '.join(f"{name} {seconds:.1f}s" for name, seconds in run['phases'].items())
+                print(f"  {run['started']}  {run['job']}  {outcome} in {run['seconds']:.1f}s: "
+                      f"{run['files']} files, {run['bytes'] / (1024 * 1024):.1f} MB{speed} ({phases})")
+                if run['error']:
+                    print(f"      {run['error']}")
         print("=" * 30)
 
 def main():
@@ -230,9 +848,65 @@ def main():
     parser.add_argument('--days', nargs='+', help='Set backup days (mon tue wed thu fri sat sun)')
     parser.add_argument('--backup-now', action='store_true', help='Perform backup immediately')
     parser.add_argument('--start-scheduler', action='store_true', help='Start the backup scheduler')
+    parser.add_argument('--daemon', action='store_true', help='Run the scheduler as a daemon controlled through a local socket')
+    parser.add_argument('--reload', action='store_true', help='Make the running daemon re-read the configuration')
+    parser.add_argument('--pause', action='store_true', help='Stop the running daemon from starting backups')
+    parser.add_argument('--resume', action='store_true', help='Let the running daemon start backups again')
+    parser.add_argument('--cancel', nargs='?', const=True, metavar='JOB', help='Cancel the queued or running backup of JOB (default: all) in the running daemon')
+    parser.add_argument('--stop-daemon', action='store_true', help='Stop the running daemon')
     parser.add_argument('--status', action='store_true', help='Show current configuration')
+    parser.add_argument('--runs', type=int, help='With --status, show this many recent backup runs (default 5)')
     parser.add_argument('--clean', action='store_true', help='Enable cleaning source after backup')
     parser.add_argument('--no-clean', action='store_true', help='Disable cleaning source after backup')
+    parser.add_argument('--workers', type=int, help='Set number of parallel copy workers')
+    parser.add_argument('--incremental', action='store_true', help='Hard-link unchanged files from the previous backup')
+    parser.add_argument('--full', action='store_true', help='Copy every file on each backup (disable incremental)')
+    parser.add_argument('--verify', action='store_true', help='Verify every backup against the source (always done before cleaning)')
+    parser.add_argument('--no-verify', action='store_true', help='Only verify backups that are followed by cleaning')
+    parser.add_argument('--keep-last', type=int, help='Keep the N most recent backups (0 = no limit)')
+    parser.add_argument('--keep-daily', type=int, help='Keep the newest backup of each of the last N days')
+    parser.add_argument('--keep-weekly', type=int, help='Keep the newest backup of each of the last N weeks')
+    parser.add_argument('--keep-monthly', type=int, help='Keep the newest backup of each of the last N months')
+    parser.add_argument('--prune', action='store_true', help='Delete old backups according to the retention settings')
+    parser.add_argument('--dry-run', action='store_true', help='With --prune, only list what would be deleted')
+    parser.add_argument('--move', action='store_true', help='When cleaning, move the source into the backup if both are on the same filesystem')
+    parser.add_argument('--no-move', action='store_true', help='When cleaning, always copy then delete')
+    parser.add_argument('--checksums', action='store_true', help='Hash files while copying and write a checksum manifest')
+    parser.add_argument('--no-checksums', action='store_true', help='Copy without writing a checksum manifest')
+    parser.add_argument('--format', choices=BACKUP_FORMATS,
+                        help='Set backup format: plain folder, deduplicated chunk store or compressed archive')
+    parser.add_argument('--compression-level', type=int, help='Set compression level for archive formats')
+    parser.add_argument('--max-mb-per-s', type=float, help='Limit backup bandwidth to this many MB/s, also for running backups (0 = unlimited)')
+    parser.add_argument('--max-files-per-s', type=float, help='Limit backups to this many files per second (0 = unlimited)')
+    parser.add_argument('--io-nice', help="Run backup I/O at a lower priority: 'idle', 0-7 (7 = lowest) or 'off'")
+    parser.add_argument('--exclude', nargs='+', metavar='PATTERN', help="Skip files and folders matching these gitignore-style patterns (e.g. 'node_modules/' '*.tmp')")
+    parser.add_argument('--include', nargs='+', metavar='PATTERN', help='Always back up paths matching these patterns, even if excluded')
+    parser.add_argument('--clear-filters', action='store_true', help='Remove all exclude and include patterns')
+    parser.add_argument('--watch', action='store_true', help='While the scheduler or daemon runs, record changed folders with inotify so incremental backups only scan those')
+    parser.add_argument('--no-watch', action='store_true', help='Scan the whole source on every backup')
+    parser.add_argument('--full-rescan-hours', type=float, help='With --watch, still scan the whole source at least this often (0 = only when needed)')
+    parser.add_argument('--continuous', type=float, metavar='SECONDS', help='While the scheduler or daemon runs, back up a job (see --job) at most every SECONDS after its source changes (0 = off)')
+    parser.add_argument('--debounce', type=float, metavar='SECONDS', help='With --continuous, wait until changes have been quiet this long (default 10)')
+    parser.add_argument('--delta', action='store_true', help='Copy changed large files as a delta: only changed blocks are rewritten, into a reflink clone of the previous copy where possible')
+    parser.add_argument('--no-delta', action='store_true', help='Always copy changed files whole')
+    parser.add_argument('--delta-min-mb', type=float, help='With --delta, only files of at least this many MB are copied as a delta (default 64)')
+    parser.add_argument('--delta-block-kb', type=int, help='With --delta, compare files in blocks of this many KB (default 1024)')
+    parser.add_argument('--rebuild-index', action='store_true', help='Rebuild the file index from the latest backup')
+    parser.add_argument('--job', help='Apply --source/--destination/--time/--days/--clean/--backup-now to this named job')
+    parser.add_argument('--remove-job', help='Delete a named job')
+    parser.add_argument('--max-jobs', type=int, help='Set how many backup jobs may run at the same time')
+    parser.add_argument('--per-destination', type=int, help='Set how many jobs may write to one destination disk at once')
+    
+    subparsers = parser.add_subparsers(dest='command')
+    restore_parser = subparsers.add_parser('restore', help='Restore files from a backup (use --job before "restore" for a named job)')
+    restore_parser.add_argument('paths', nargs='*', help='Files, folders or glob patterns relative to the source folder (default: everything)')
+    restore_parser.add_argument('--snapshot', help='Backup to restore from, by name or path (default: the newest)')
+    restore_parser.add_argument('--to', dest='restore_to', default='.', help='Folder to restore into (default: current folder)')
+    restore_parser.add_argument('--overwrite', action='store_true', help='Replace files that already exist in the target')
+    restore_parser.add_argument('--list', dest='list_backups', action='store_true', help='List the available backups instead')
+    
+    verify_parser = subparsers.add_parser('verify', help='Check an existing backup against its checksums')
+    verify_parser.add_argument('--snapshot', help='Backup to check, by name or path (default: the newest)')
     
     args = parser.parse_args()
     
@@ -241,28 +915,142 @@ def main():
     
     # Handle command line arguments
     if args.source:
-        toolkit.set_source_folder(args.source)
+        toolkit.set_source_folder(args.source, job=args.job)
     
     if args.destination:
-        toolkit.set_backup_location(args.destination)
+        toolkit.set_backup_location(args.destination, job=args.job)
     
     if args.time and args.days:
-        toolkit.set_schedule(args.time, args.days)
+        toolkit.set_schedule(args.time, args.days, job=args.job)
     
     if args.clean:
-        toolkit.clean_after_backup = True
-        toolkit.save_config()
-        print("Source cleaning enabled")
+        toolkit.set_clean(True, job=args.job)
     
     if args.no_clean:
-        toolkit.clean_after_backup = False
-        toolkit.save_config()
-        print("Source cleaning disabled")
+        toolkit.set_clean(False, job=args.job)
+    
+    if args.remove_job:
+        toolkit.remove_job(args.remove_job)
+    
+    if args.max_jobs is not None or args.per_destination is not None:
+        toolkit.set_job_limits(args.max_jobs, args.per_destination)
+    
+    if args.workers is not None:
+        toolkit.set_workers(args.workers)
+    
+    if args.incremental:
+        toolkit.set_incremental(True)
+    
+    if args.full:
+        toolkit.set_incremental(False)
+    
+    if args.verify:
+        toolkit.set_verify(True)
+    
+    if args.no_verify:
+        toolkit.set_verify(False)
+    
+    limits = {key: getattr(args, key) for key in RETENTION_KEYS if getattr(args, key) is not None}
+    if limits:
+        toolkit.set_retention(**limits)
+    
+    if args.move:
+        toolkit.set_move_on_clean(True)
+    
+    if args.no_move:
+        toolkit.set_move_on_clean(False)
+    
+    if args.checksums:
+        toolkit.set_checksums(True)
+    
+    if args.no_checksums:
+        toolkit.set_checksums(False)
+    
+    if args.format:
+        toolkit.set_backup_format(args.format)
+    
+    if args.compression_level is not None:
+        toolkit.set_compression_level(args.compression_level)
+    
+    if args.max_mb_per_s is not None or args.max_files_per_s is not None or args.io_nice is not None:
+        toolkit.set_throttle(args.max_mb_per_s, args.max_files_per_s, args.io_nice)
+    
+    if args.exclude or args.include or args.clear_filters:
+        toolkit.set_filters(args.exclude, args.include, clear=args.clear_filters)
+    
+    if args.watch or args.no_watch or args.full_rescan_hours is not None:
+        toolkit.set_watch(True if args.watch else (False if args.no_watch else None),
+                          args.full_rescan_hours)
+    
+    if args.delta or args.no_delta or args.delta_min_mb is not None or args.delta_block_kb is not None:
+        toolkit.set_delta(True if args.delta else (False if args.no_delta else None),
+                          args.delta_min_mb, args.delta_block_kb)
+    
+    if args.continuous is not None:
+        toolkit.set_continuous(args.continuous, args.debounce, job=args.job)
+    
+    if args.rebuild_index:
+        toolkit.rebuild_index(args.job)
+    
+    # A running daemon owns the schedule: hand it the new settings and the backups
+    config_changed = any(getattr(args, key) not in (None, False) for key in (
+        'source', 'destination', 'time', 'clean', 'no_clean', 'remove_job', 'max_jobs',
+        'per_destination', 'workers', 'incremental', 'full', 'verify', 'no_verify', 'move',
+        'no_move', 'checksums', 'no_checksums', 'format', 'compression_level', 'max_mb_per_s',
+        'max_files_per_s', 'io_nice', 'exclude', 'include', 'clear_filters', 'watch', 'no_watch',
+        'full_rescan_hours', 'continuous', 'delta', 'no_delta', 'delta_min_mb',
+        'delta_block_kb') + RETENTION_KEYS)
+    daemon = toolkit.daemon_request('ping', quiet=True) if config_changed or args.backup_now else None
+    if config_changed and daemon:
+        toolkit.daemon_request('reload')
+        print("Running daemon reloaded the configuration")
+    
+    if args.reload and toolkit.daemon_request('reload'):
+        print("Daemon reloaded the configuration")
+    
+    if args.pause and toolkit.daemon_request('pause'):
+        print("Daemon paused: no new backups will start until --resume")
+    
+    if args.resume and toolkit.daemon_request('resume'):
+        print("Daemon resumed")
+    
+    if args.cancel is not None:
+        reply = toolkit.daemon_request('cancel', job=None if args.cancel is True else args.cancel)
+        if reply:
+            print(f"Cancelled backups: {', '.join(reply['cancelled']) or 'none'}")
     
     if args.backup_now:
-        toolkit.backup_now()
+        if daemon:
+            reply = toolkit.daemon_request('trigger', job=args.job)
+            if reply:
+                state = "queued" if reply['queued'] else "already queued or running"
+                paused = " (daemon is paused)" if reply['paused'] else ""
+                print(f"Backup of job '{reply['job']}' {state} in the daemon{paused}")
+        else:
+            toolkit.backup_now(args.job)
+    
+    if args.prune:
+        toolkit.prune(args.job, dry_run=args.dry_run)
+    
+    if args.command == 'verify':
+        toolkit.verify_backup(args.snapshot, args.job)
+    
+    if args.command == 'restore':
+        if args.list_backups:
+            toolkit.list_backups(args.job)
+        else:
+            toolkit.restore(args.paths, args.snapshot, args.restore_to, args.job, args.overwrite)
+    
+    if args.stop_daemon and toolkit.daemon_request('stop'):
+        print("Daemon stopping (running backups will finish first)")
+    
+    if args.daemon:
+        toolkit.run_daemon()
     
     if args.start_scheduler:
+        if toolkit.daemon_request('ping', quiet=True):
+            print("Error: A backup daemon is already running the schedule (see --status)")
+            return
         toolkit.start_scheduler()
         try:
             print("Scheduler running. Press Ctrl+C to stop.")
@@ -273,15 +1061,18 @@ def main():
             toolkit.stop_scheduler()
     
     if args.status or not any(vars(args).values()):
-        toolkit.show_status()
+        toolkit.show_status(args.runs if args.runs is not None else 5)
         
         if not any(vars(args).values()):
             print("\nUsage examples:")
             print("  python3 backup_cli.py --source /path/to/source --destination /path/to/backup")
             print("  python3 backup_cli.py --time 14:30 --days mon wed fri")
             print("  python3 backup_cli.py --backup-now")
+            print("  python3 backup_cli.py --job photos --source /path/to/photos --destination /path/to/backup")
             print("  python3 backup_cli.py --start-scheduler")
+            print("  python3 backup_cli.py --daemon")
             print("  python3 backup_cli.py --status")
+            print("  python3 backup_cli.py restore 'docs/*.txt' --to /tmp/restored")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
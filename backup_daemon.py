@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Backup Daemon - long-running scheduler controlled over a Unix domain socket
+Owns the schedule and job queue of BackupToolkitCLI and answers trigger,
+status, reload, pause, resume, cancel and stop commands from any number of
+clients (the CLI and the GUIs) at the same time
+"""
+
+import os
+import json
+import signal
+import socket
+import asyncio
+
+SOCKET_NAME = "backup_toolkit.sock"
+
+# Requests and replies are single JSON objects, one per line
+MAX_REQUEST_BYTES = 64 * 1024
+CLIENT_TIMEOUT = 5
+
+def socket_path_for(config_file):
+    """Return the control socket path of the daemon using config_file"""
+    return os.path.join(os.path.dirname(os.path.abspath(config_file)), SOCKET_NAME)
+
+class DaemonError(Exception):
+    """The daemon received the command but refused or failed it"""
+
+class DaemonClient:
+    """Blocking client for the daemon's control socket
+
+    request() raises OSError if no daemon is listening and DaemonError if
+    the daemon answers with an error.
+    """
+    def __init__(self, socket_path, timeout=CLIENT_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def request(self, command, **args):
+        """Send one command and return the daemon's reply"""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(dict(args, command=command)).encode() + b'\n')
+            with sock.makefile('rb') as reader:
+                line = reader.readline(MAX_REQUEST_BYTES)
+        if not line:
+            raise OSError("The backup daemon closed the connection")
+        reply = json.loads(line)
+        if not reply.get('ok'):
+            raise DaemonError(reply.get('error', 'Unknown error'))
+        return reply
+
+def daemon_running(config_file):
+    """True if a daemon is answering on the socket next to config_file"""
+    try:
+        DaemonClient(socket_path_for(config_file), timeout=1).request('ping')
+        return True
+    except (OSError, ValueError, DaemonError):
+        return False
+
+def reload_daemon(config_file):
+    """Ask a running daemon to re-read config_file; returns False if none is running"""
+    try:
+        DaemonClient(socket_path_for(config_file)).request('reload')
+        return True
+    except (OSError, ValueError, DaemonError):
+        return False
+
+class BackupDaemon:
+    """asyncio control server around a BackupToolkitCLI
+
+    The toolkit's scheduler thread and job queue do the actual work; the
+    event loop only answers clients, so a slow backup never blocks a status
+    request. Commands that touch files (reload) run in a worker thread.
+    Pausing holds the job queue: scheduled runs still queue up (once per
+    job) and start on resume. Cancelling drops a job's queued run or stops
+    its running backup between files.
+    """
+    def __init__(self, toolkit, socket_path=None):
+        self.toolkit = toolkit
+        self.socket_path = socket_path or socket_path_for(toolkit.config_file)
+        self._clients = {}
+        self._server = None
+        self._stopping = None
+
+    def run(self):
+        """Serve until a stop command or SIGINT/SIGTERM"""
+        asyncio.run(self.serve())
+
+    async def serve(self):
+        self._claim_socket()
+        self._stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._stopping.set)
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        self.toolkit.start_scheduler()
+        print(f"Backup daemon listening on {self.socket_path}")
+        try:
+            await self._stopping.wait()
+        finally:
+            print("Stopping backup daemon...")
+            self._server.close()
+            # Hang up on idle clients so their handlers end on EOF
+            for writer in list(self._clients.values()):
+                writer.close()
+            await asyncio.gather(*self._clients, return_exceptions=True)
+            await self._server.wait_closed()
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+            self.toolkit.stop_scheduler()
+            # Let running backups finish; queued ones are dropped
+            await asyncio.to_thread(self.toolkit.orchestrator.shutdown, wait=False)
+
+    def _claim_socket(self):
+        """Remove a socket left behind by a daemon that died, refuse to start next to a live one"""
+        if not os.path.exists(self.socket_path):
+            return
+        try:
+            DaemonClient(self.socket_path, timeout=1).request('ping')
+        except (OSError, ValueError, DaemonError):
+            os.unlink(self.socket_path)
+            return
+        raise RuntimeError(f"A backup daemon is already running on {self.socket_path}")
+
+    async def _handle_client(self, reader, writer):
+        self._clients[asyncio.current_task()] = writer
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b'\n')
+                except asyncio.IncompleteReadError:
+                    return
+                except asyncio.LimitOverrunError:
+                    await self._reply(writer, {'ok': False, 'error': 'Request too long'})
+                    return
+                try:
+                    request = json.loads(line)
+                    reply = await self.handle(request)
+                except Exception as e:
+                    reply = {'ok': False, 'error': str(e)}
+                await self._reply(writer, reply)
+        except ConnectionError:
+            pass
+        finally:
+            del self._clients[asyncio.current_task()]
+            writer.close()
+
+    async def _reply(self, writer, reply):
+        writer.write(json.dumps(reply).encode() + b'\n')
+        await writer.drain()
+
+    async def handle(self, request):
+        """Run one command and return the reply dict"""
+        command = request.get('command')
+        handler = getattr(self, f'_command_{command}', None) if isinstance(command, str) else None
+        if handler is None:
+            return {'ok': False, 'error': f"Unknown command: {command}"}
+        result = await handler(request)
+        return dict(result or {}, ok=True)
+
+    async def _command_ping(self, request):
+        return {'pid': os.getpid()}
+
+    async def _command_status(self, request):
+        toolkit = self.toolkit
+        next_run = toolkit.scheduler.next_run()
+        return {
+            'pid': os.getpid(),
+            'clients': len(self._clients),
+            'paused': toolkit.orchestrator.paused,
+            'next_run': next_run.isoformat(timespec='minutes') if next_run else None,
+            'jobs': [{'name': job['name'], 'source_folder': job['source_folder'],
+                      'backup_location': job['backup_location'],
+                      'backup_time': job['backup_time'], 'selected_days': job['selected_days']}
+                     for job in toolkit.all_jobs()],
+            'queue': toolkit.orchestrator.status(),
+        }
+
+    async def _command_trigger(self, request):
+        job = self.toolkit.get_job(request.get('job'))
+        if job is None:
+            raise DaemonError(f"No job named '{request.get('job')}'")
+        if not job['source_folder'] or not job['backup_location']:
+            raise DaemonError("Please set both source folder and backup location first!")
+        queued = self.toolkit.queue_job(job)
+        return {'job': job['name'], 'queued': queued, 'paused': self.toolkit.orchestrator.paused}
+
+    async def _command_reload(self, request):
+        await asyncio.to_thread(self.toolkit.reload_config)
+        return {'jobs': [job['name'] for job in self.toolkit.all_jobs()]}
+
+    async def _command_pause(self, request):
+        self.toolkit.orchestrator.pause()
+        return {'paused': True}
+
+    async def _command_resume(self, request):
+        self.toolkit.orchestrator.resume()
+        return {'paused': False}
+
+    async def _command_cancel(self, request):
+        name = request.get('job')
+        if name is None:
+            cancelled = self.toolkit.orchestrator.cancel_all()
+        else:
+            cancelled = [name] if self.toolkit.orchestrator.cancel(name) else []
+        return {'cancelled': cancelled}
+
+    async def _command_stop(self, request):
+        self._stopping.set()
+        return {}
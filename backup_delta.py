@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Backup Delta - block-level copies of large files that changed a little
+A large file is hashed in fixed-size blocks as it is copied and the block
+hashes are kept in the file index. When it changes, the copy in the previous
+snapshot is cloned (reflink) and only the blocks whose hash differs are
+rewritten, so a multi-GB image with a few changed blocks costs a read of the
+source but only a few blocks of writes and new disk space
+"""
+
+import os
+import shutil
+import hashlib
+import threading
+
+from backup_fastcopy import FALLBACK_ERRNOS, FICLONE, fcntl
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# Files smaller than this are copied whole
+DEFAULT_MIN_SIZE = 64 * 1024 * 1024
+
+# Bytes per block hash; the hashes of a file are stored concatenated
+BLOCK_DIGEST_SIZE = 16
+
+def block_digest(data):
+    """Return the hash of one block"""
+    return hashlib.blake2b(data, digest_size=BLOCK_DIGEST_SIZE).digest()
+
+class DeltaCopier:
+    """Copy large files block by block, rewriting only the blocks that changed
+
+    copy() returns the method used and the file's block hashes as
+    (block_size, hashes), for the index. Given the file's copy in the
+    previous snapshot and that copy's block hashes, the previous copy is
+    cloned into dst_path and only differing blocks are written ('delta').
+    Without them, or where the filesystem cannot clone, the whole file is
+    written and hashed on the way ('blocks'), so the next backup can use
+    a delta. written is the number of bytes actually written.
+    """
+    def __init__(self, block_size=DEFAULT_BLOCK_SIZE, min_size=DEFAULT_MIN_SIZE, throttle=None):
+        self.block_size = max(4096, int(block_size))
+        self.min_size = max(0, int(min_size))
+        self.throttle = throttle
+        self._unsupported = set()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_options(cls, options, throttle=None):
+        """Return the DeltaCopier for the engine options, or None if delta copies are off"""
+        if not options.get('delta_copy'):
+            return None
+        return cls((options.get('delta_block_kb') or 1024) * 1024,
+                   (options.get('delta_min_mb') or 0) * 1024 * 1024, throttle)
+
+    def copy(self, src_path, dst_path, prev_path=None, old_blocks=None, digest=None):
+        """Copy src_path to dst_path like shutil.copy2, returning (method, (block_size, hashes), written)
+
+        old_blocks is the (block_size, hashes) pair stored for prev_path.
+        A hashlib object passed as digest is fed the whole file.
+        """
+        with open(src_path, 'rb') as fsrc:
+            old_hashes = self._usable(prev_path, old_blocks)
+            cloned = old_hashes is not None and self._clone(prev_path, dst_path)
+            with open(dst_path, 'r+b' if cloned else 'wb') as fdst:
+                hashes, written = self._copy_blocks(fsrc, fdst, old_hashes if cloned else None, digest)
+        shutil.copystat(src_path, dst_path)
+        return ('delta' if cloned else 'blocks'), (self.block_size, bytes(hashes)), written
+
+    def _usable(self, prev_path, old_blocks):
+        """Return the old block hashes if they can drive a delta against prev_path"""
+        if not prev_path or old_blocks is None or fcntl is None:
+            return None
+        block_size, hashes = old_blocks
+        if block_size != self.block_size:
+            return None
+        try:
+            size = os.stat(prev_path).st_size
+        except OSError:
+            return None
+        # The hashes must describe a file of prev_path's size
+        blocks = -(-size // self.block_size)
+        return hashes if len(hashes) == blocks * BLOCK_DIGEST_SIZE else None
+
+    def _clone(self, prev_path, dst_path):
+        """Reflink prev_path to dst_path; False if the filesystem cannot"""
+        try:
+            devices = (os.stat(prev_path).st_dev, os.stat(os.path.dirname(dst_path)).st_dev)
+        except OSError:
+            return False
+        if devices in self._unsupported:
+            return False
+        try:
+            with open(prev_path, 'rb') as fprev, open(dst_path, 'wb') as fdst:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fprev.fileno())
+        except OSError as e:
+            if e.errno in FALLBACK_ERRNOS:
+                with self._lock:
+                    self._unsupported.add(devices)
+            return False
+        return True
+
+    def _copy_blocks(self, fsrc, fdst, old_hashes, digest):
+        """Hash every source block and write those not matching old_hashes (all if None)"""
+        buf = bytearray(self.block_size)
+        view = memoryview(buf)
+        hashes = bytearray()
+        written = 0
+        offset = 0
+        while True:
+            n = fsrc.readinto(buf)
+            if not n:
+                break
+            block = view[:n]
+            if digest is not None:
+                digest.update(block)
+            block_hash = block_digest(block)
+            start = len(hashes)
+            hashes += block_hash
+            if old_hashes is None or old_hashes[start:start + BLOCK_DIGEST_SIZE] != block_hash:
+                if old_hashes is not None:
+                    fdst.seek(offset)
+                fdst.write(block)
+                written += n
+            offset += n
+            if self.throttle is not None:
+                self.throttle.consume_bytes(n)
+        # A shrunk file leaves the clone's tail behind
+        fdst.truncate(offset)
+        return hashes, written
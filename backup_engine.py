@@ -0,0 +1,777 @@
+#!/usr/bin/env python3
+"""
+Backup Engine - shared copy engine used by every Backup Toolkit front-end
+Walks the source tree once and copies files with a pool of worker threads
+"""
+
+import os
+import re
+import time
+import shutil
+import hashlib
+import queue
+import threading
+from collections import deque, namedtuple
+from datetime import datetime, timedelta
+
+from backup_index import FileIndex, file_hash
+from backup_store import ChunkStore
+from backup_archive import ARCHIVE_FORMATS, ArchiveWriter
+from backup_fastcopy import FastCopier
+from backup_delta import DeltaCopier
+from backup_verify import BackupVerifier, ManifestWriter, manifest_path_for, read_manifest
+from backup_clean import SourceCleaner, cleaned_log_path_for
+from backup_journal import TEMP_SUFFIX, CheckpointJournal, is_incomplete, is_locked, temp_path_for
+from backup_metrics import SlowestFiles
+from backup_progress import BackupCancelled, check_cancelled
+from backup_throttle import Throttle, set_io_priority
+from backup_filter import filter_from_options
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Stands in for os.stat_result when a file's details come from the index
+IndexedStat = namedtuple('IndexedStat', ['st_size', 'st_mtime_ns', 'st_ino'])
+
+# Engine settings stored in backup_config.json next to the front-end settings
+ENGINE_DEFAULTS = {
+    'copy_workers': DEFAULT_WORKERS,
+    'incremental': False,
+    'use_index': True,
+    'backup_format': 'folder',
+    'compression_level': None,
+    'verify': False,
+    'checksums': True,
+    'move_on_clean': True,
+    'keep_last': 0,
+    'keep_daily': 0,
+    'keep_weekly': 0,
+    'keep_monthly': 0,
+    'metrics_textfile': '',
+    'max_mb_per_s': 0,
+    'max_files_per_s': 0,
+    'io_nice': '',
+    'exclude': [],
+    'include': [],
+    'watch_changes': False,
+    'full_rescan_hours': 24,
+    'continuous_interval': 0,
+    'continuous_debounce': 10,
+    'delta_copy': False,
+    'delta_min_mb': 64,
+    'delta_block_kb': 1024,
+}
+
+BACKUP_FORMATS = ('folder', 'chunks') + ARCHIVE_FORMATS
+
+def load_engine_options(config):
+    """Pick the engine settings out of a loaded config dict"""
+    options = dict(ENGINE_DEFAULTS)
+    for key in ENGINE_DEFAULTS:
+        if key in config:
+            options[key] = config[key]
+    return options
+
+def _source_name(source_folder):
+    return os.path.basename(os.path.normpath(source_folder))
+
+def new_snapshot_name(source_folder, when=None):
+    """Return the timestamped name for a new backup of source_folder taken at when (default now)"""
+    timestamp = (when or datetime.now()).strftime("%Y%m%d_%H%M%S")
+    return f"{_source_name(source_folder)}_backup_{timestamp}"
+
+def new_snapshot_path(source_folder, backup_location):
+    """Return the timestamped folder path for a new backup of source_folder"""
+    return os.path.join(backup_location, new_snapshot_name(source_folder))
+
+def _snapshot_folders(backup_location, source_folder):
+    pattern = re.compile(re.escape(_source_name(source_folder)) + r'_backup_\d{8}_\d{6}$')
+    try:
+        with os.scandir(backup_location) as entries:
+            names = [entry.name for entry in entries
+                     if pattern.match(entry.name) and entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return []
+    # The timestamp format sorts chronologically as a string
+    return [os.path.join(backup_location, name) for name in sorted(names)]
+
+def find_snapshots(backup_location, source_folder):
+    """Return the finished snapshot folders of source_folder, oldest first"""
+    return [path for path in _snapshot_folders(backup_location, source_folder)
+            if not is_incomplete(path)]
+
+def find_incomplete_snapshot(backup_location, source_folder):
+    """Return the newest interrupted snapshot folder no backup is writing to, or None"""
+    for path in reversed(_snapshot_folders(backup_location, source_folder)):
+        if is_incomplete(path) and not is_locked(path):
+            return path
+    return None
+
+def latest_snapshot(backup_location, source_folder):
+    """Return the most recent snapshot folder of source_folder, or None"""
+    snapshots = find_snapshots(backup_location, source_folder)
+    return snapshots[-1] if snapshots else None
+
+class CopyStats:
+    """Thread-safe counters for a single copy run"""
+    def __init__(self, record=False):
+        self.files = 0
+        self.bytes = 0
+        self.dirs = 0
+        self.linked = 0
+        # Number of files handled by each mechanism (hardlink, reflink, ...)
+        self.methods = {}
+        # (path, size, mtime_ns, inode, hash) per file when recording for the index
+        self.records = [] if record else None
+        # path -> (block_size, hashes) of large files, for the index's blocks table
+        self.blocks = {} if record else None
+        # Size of the files copied as a delta, and the bytes those copies wrote
+        self.delta_bytes = 0
+        self.delta_written = 0
+        self.slowest = SlowestFiles()
+        self._lock = threading.Lock()
+
+    def add_file(self, size, linked=False, record=None, method=None, blocks=None, written=None):
+        """Record a copied (or hard-linked) file"""
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            if linked:
+                self.linked += 1
+                method = 'hardlink'
+            if method:
+                self.methods[method] = self.methods.get(method, 0) + 1
+            if record is not None and self.records is not None:
+                self.records.append(record)
+                if blocks is not None:
+                    self.blocks[record[0]] = blocks
+            if method == 'delta':
+                self.delta_bytes += size
+                self.delta_written += written or 0
+
+    def add_dir(self):
+        """Record a created directory"""
+        with self._lock:
+            self.dirs += 1
+
+    def summary(self):
+        """One-line description of the run"""
+        summary = (f"Backed up {self.files} files ({self.bytes / (1024 * 1024):.1f} MB), "
+                   f"{self.linked} unchanged files hard-linked")
+        if self.methods:
+            methods = ', '.join(f"{name} {count}" for name, count in sorted(self.methods.items()))
+            summary += f" [{methods}]"
+        if self.delta_bytes:
+            summary += (f", delta copies rewrote {self.delta_written / (1024 * 1024):.1f} of "
+                        f"{self.delta_bytes / (1024 * 1024):.1f} MB")
+        return summary
+
+class _TreeCopy:
+    """Per-call state shared by the walker and the copy workers"""
+    def __init__(self, source, destination, link_dest, index, record, progress, checksums,
+                 cancel=None, journal=None, path_filter=None, changes=None, resume=False):
+        self.source = source
+        self.destination = destination
+        self.link_dest = link_dest
+        self.index = index
+        self.progress = progress
+        self.checksums = checksums
+        self.cancel = cancel
+        self.journal = journal
+        self.path_filter = path_filter
+        self.changes = changes
+        # Files an interrupted earlier attempt already completed, and the
+        # files seen this time (only tracked when resuming)
+        self.resume = resume and journal is not None
+        self.completed = {}
+        self.seen = set()
+        # Checksums of the previous snapshot, reused for hard-linked files
+        self.previous_checksums = {}
+        self.stats = CopyStats(record=record)
+        self.errors = []
+        self.errors_lock = threading.Lock()
+        self.created_dirs = []
+
+    def add_error(self, src, dst, why):
+        with self.errors_lock:
+            self.errors.append((src, dst, str(why)))
+
+class CopyEngine:
+    """Parallel replacement for shutil.copytree
+
+    A single walker pops directories off the directory queue, creates them in
+    the destination and hands their files to the file queue, which a pool of
+    worker threads drains. Directory metadata is applied once all files are
+    in place, like shutil.copytree does.
+
+    When link_dest points at a previous snapshot, files whose size and mtime
+    match the copy in that snapshot are hard-linked instead of copied
+    (rsync --link-dest style), so the new snapshot is still a full tree.
+    If a FileIndex describing link_dest is given, the walker trusts it
+    instead and never looks inside link_dest for unchanged files.
+
+    File data is copied with FastCopier, which picks reflink, copy_file_range,
+    sendfile or a userspace copy per file; the stats count each method used.
+    When file hashes are needed (for the index or a checksum manifest) the
+    source is hashed right after a kernel copy, or during a userspace one.
+
+    Each file is written under a temporary name and renamed into place once
+    complete. With a CheckpointJournal, every completed file is journaled;
+    with resume=True the copy carries on into an existing destination,
+    skipping files the journal lists whose source and copy are unchanged.
+
+    Files and folders a PathFilter excludes are skipped by the walker; an
+    excluded folder is never scanned.
+
+    With a ChangeSet (from a ChangeWatcher) describing the changes since
+    link_dest, and the index of link_dest, folders the change set reports
+    unchanged are not read from the source at all: their entries are taken
+    from link_dest and their files' details from the index.
+
+    A Throttle shared by all workers limits the files started per second
+    and the bytes copied per second; io_nice lowers the I/O priority of
+    the worker threads.
+
+    With a DeltaCopier, changed files of at least its min_size are copied
+    block by block when recording for the index. If the index of link_dest
+    holds block hashes for such a file, its copy in link_dest is cloned
+    and only the changed blocks are rewritten; the new block hashes go
+    into the stats for the index (linked files keep their old ones).
+    """
+    def __init__(self, workers=DEFAULT_WORKERS, throttle=None, io_nice=None, delta=None):
+        self.workers = max(1, int(workers))
+        self.throttle = throttle
+        self.io_nice = io_nice
+        self.copier = FastCopier(throttle=throttle)
+        self.delta = delta
+
+    def copy_tree(self, source, destination, link_dest=None, index=None, record=False,
+                  progress=None, checksums=None, cancel=None, journal=None, path_filter=None,
+                  changes=None, resume=False):
+        """Copy source into destination (which must not exist yet)
+
+        With record=True the returned stats carry an index record for every
+        file, ready for FileIndex.replace. A ProgressTracker passed as
+        progress is advanced as each file completes, and a ManifestWriter
+        passed as checksums receives the hash of each file. Once the
+        threading.Event cancel is set, no further files are started and
+        BackupCancelled is raised. The journal is completed (deleted) once
+        every file has been handled, and kept if the copy is interrupted.
+        resume=True carries on an interrupted copy into an existing
+        destination, skipping the files its journal lists as complete.
+        """
+        if index is None or link_dest is None:
+            changes = None
+        job = _TreeCopy(source, destination, link_dest, index, record, progress, checksums,
+                        cancel, journal, path_filter, changes, resume)
+        if link_dest and (record or checksums is not None):
+            try:
+                job.previous_checksums = read_manifest(manifest_path_for(link_dest))
+            except OSError:
+                pass
+
+        # Bounded so the walker cannot run arbitrarily far ahead of the copiers
+        file_queue = queue.Queue(maxsize=self.workers * 64)
+        workers = [
+            threading.Thread(target=self._file_worker, args=(job, file_queue), daemon=True)
+            for _ in range(self.workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            self._walk(job, file_queue)
+        finally:
+            for _ in workers:
+                file_queue.put(None)
+            for worker in workers:
+                worker.join()
+            if journal is not None:
+                journal.close()
+        check_cancelled(cancel)
+
+        # Apply directory metadata deepest first so file writes don't bump mtimes
+        for src_dir, dst_dir in reversed(job.created_dirs):
+            try:
+                shutil.copystat(src_dir, dst_dir)
+            except OSError as why:
+                job.add_error(src_dir, dst_dir, why)
+
+        if job.resume:
+            # Files completed by the earlier attempt whose source is gone since
+            for rel_path in set(job.completed) - job.seen:
+                try:
+                    os.remove(os.path.join(destination, rel_path))
+                except OSError:
+                    pass
+        if journal is not None:
+            # Every file was handled (copy errors are reported, not retried)
+            journal.complete()
+        if job.errors:
+            raise shutil.Error(job.errors)
+        return job.stats
+
+    def _walk(self, job, file_queue):
+        """Create the destination directories and queue every file for copying"""
+        os.makedirs(job.destination, exist_ok=job.resume)
+        if job.journal is not None:
+            job.completed = job.journal.open().completed
+            if job.resume:
+                self._remove_temp_files(job.destination)
+        job.stats.add_dir()
+        job.created_dirs.append((job.source, job.destination))
+
+        dir_queue = deque([(job.source, job.destination, job.link_dest, '')])
+        while dir_queue:
+            src_dir, dst_dir, prev_dir, rel_dir = dir_queue.popleft()
+            if job.changes is not None and prev_dir and not job.changes.listing_changed(rel_dir):
+                self._walk_unchanged(job, file_queue, dir_queue, src_dir, dst_dir, prev_dir, rel_dir)
+                continue
+            try:
+                with os.scandir(src_dir) as entries:
+                    for entry in entries:
+                        check_cancelled(job.cancel)
+                        dst_path = os.path.join(dst_dir, entry.name)
+                        prev_path = os.path.join(prev_dir, entry.name) if prev_dir else None
+                        rel_path = os.path.join(rel_dir, entry.name)
+                        is_dir = entry.is_dir()
+                        if job.path_filter is not None and job.path_filter.excluded(rel_path, is_dir):
+                            continue
+                        if is_dir:
+                            try:
+                                os.mkdir(dst_path)
+                            except OSError as why:
+                                if not (job.resume and os.path.isdir(dst_path)):
+                                    job.add_error(entry.path, dst_path, why)
+                                    continue
+                            job.stats.add_dir()
+                            job.created_dirs.append((entry.path, dst_path))
+                            dir_queue.append((entry.path, dst_path, prev_path, rel_path))
+                            continue
+
+                        try:
+                            src_stat = entry.stat()
+                        except OSError as why:
+                            job.add_error(entry.path, dst_path, why)
+                            continue
+                        if job.progress is not None:
+                            job.progress.add_total(src_stat.st_size)
+                        if job.resume:
+                            job.seen.add(rel_path)
+                        known_hash = old_blocks = None
+                        if job.index is not None and prev_path:
+                            row = job.index.lookup(rel_path)
+                            if row and row[:3] == (src_stat.st_size, src_stat.st_mtime_ns,
+                                                   src_stat.st_ino):
+                                known_hash = row[3]
+                            old_blocks = self._old_blocks(job, rel_path, src_stat)
+                        file_queue.put((entry.path, dst_path, prev_path, rel_path,
+                                        src_stat, known_hash, old_blocks))
+            except OSError as why:
+                job.add_error(src_dir, dst_dir, why)
+
+    def _walk_unchanged(self, job, file_queue, dir_queue, src_dir, dst_dir, prev_dir, rel_dir):
+        """Queue a folder the change set reports unchanged without reading the source
+
+        Its entries are those of the same folder in the previous snapshot,
+        and its files are linked using their index rows.
+        """
+        try:
+            with os.scandir(prev_dir) as entries:
+                for entry in entries:
+                    check_cancelled(job.cancel)
+                    src_path = os.path.join(src_dir, entry.name)
+                    dst_path = os.path.join(dst_dir, entry.name)
+                    rel_path = os.path.join(rel_dir, entry.name)
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    if job.path_filter is not None and job.path_filter.excluded(rel_path, is_dir):
+                        continue
+                    if is_dir:
+                        try:
+                            os.mkdir(dst_path)
+                        except OSError as why:
+                            job.add_error(src_path, dst_path, why)
+                            continue
+                        job.stats.add_dir()
+                        job.created_dirs.append((src_path, dst_path))
+                        dir_queue.append((src_path, dst_path, entry.path, rel_path))
+                        continue
+
+                    row = job.index.lookup(rel_path)
+                    known_hash = None
+                    if row is not None:
+                        src_stat, known_hash = IndexedStat(*row[:3]), row[3]
+                    else:
+                        # Not indexed: look at the source, unless it is snapshot
+                        # bookkeeping (checksums, cleaned log) with no source file
+                        try:
+                            src_stat = os.stat(src_path)
+                        except FileNotFoundError:
+                            continue
+                        except OSError as why:
+                            job.add_error(src_path, dst_path, why)
+                            continue
+                    if job.progress is not None:
+                        job.progress.add_total(src_stat.st_size)
+                    file_queue.put((src_path, dst_path, entry.path, rel_path, src_stat, known_hash,
+                                    self._old_blocks(job, rel_path, src_stat)))
+        except OSError as why:
+            job.add_error(prev_dir, dst_dir, why)
+
+    def _old_blocks(self, job, rel_path, src_stat):
+        """Return the index's block hashes for a file the DeltaCopier handles, or None"""
+        if self.delta is None or src_stat.st_size < self.delta.min_size:
+            return None
+        return job.index.lookup_blocks(rel_path)
+
+    def _file_worker(self, job, file_queue):
+        """Copy files off the queue until the walker sends the stop marker"""
+        recording = job.stats.records is not None
+        hashing = recording or job.checksums is not None
+        # Block hashes are only worth computing if the index keeps them
+        delta = self.delta if recording else None
+        if self.io_nice:
+            set_io_priority(self.io_nice)
+        while True:
+            item = file_queue.get()
+            if item is None:
+                return
+            if job.cancel is not None and job.cancel.is_set():
+                # Keep draining so the walker is never blocked on a full queue
+                continue
+            src_path, dst_path, prev_path, rel_path, src_stat, known_hash, old_blocks = item
+            if self.throttle is not None:
+                self.throttle.consume_file()
+            started = time.monotonic()
+            try:
+                method = blocks = written = None
+                done = job.completed.get(rel_path)
+                if (done is not None and done[:2] == (src_stat.st_size, src_stat.st_mtime_ns)
+                        and self._unchanged(src_stat, dst_path)):
+                    # Completed by the interrupted attempt this run resumes
+                    linked, digest, method = False, done[2], 'resumed'
+                elif known_hash is not None and self._link(prev_path, dst_path, job.resume):
+                    linked, digest, blocks = True, known_hash, old_blocks
+                elif (known_hash is None and prev_path
+                        and self._unchanged(src_stat, prev_path)
+                        and self._link(prev_path, dst_path, job.resume)):
+                    linked, digest, blocks = True, None, old_blocks
+                else:
+                    hasher = hashlib.blake2b() if hashing else None
+                    tmp_path = temp_path_for(dst_path)
+                    try:
+                        if delta is not None and src_stat.st_size >= delta.min_size:
+                            method, blocks, written = delta.copy(src_path, tmp_path, prev_path,
+                                                                 old_blocks, hasher)
+                        else:
+                            method = self.copier.copy(src_path, tmp_path, hasher)
+                        os.replace(tmp_path, dst_path)
+                    except OSError:
+                        self._discard(tmp_path)
+                        raise
+                    linked, digest = False, hasher.hexdigest() if hasher else None
+
+                if hashing and digest is None:
+                    digest = job.previous_checksums.get(rel_path) or file_hash(dst_path)
+                if job.checksums is not None:
+                    job.checksums.add(rel_path, digest)
+                if job.journal is not None and method != 'resumed':
+                    job.journal.add(rel_path, src_stat.st_size, src_stat.st_mtime_ns, digest)
+                record = None
+                if recording:
+                    record = (rel_path, src_stat.st_size, src_stat.st_mtime_ns,
+                              src_stat.st_ino, digest)
+                job.stats.add_file(src_stat.st_size, linked=linked, record=record, method=method,
+                                   blocks=blocks, written=written)
+                job.stats.slowest.add(time.monotonic() - started, rel_path, src_stat.st_size)
+                if job.progress is not None:
+                    job.progress.advance(src_stat.st_size)
+            except OSError as why:
+                job.add_error(src_path, dst_path, why)
+
+    def _unchanged(self, src_stat, prev_path):
+        """Return True if prev_path has the same size and mtime as the source"""
+        try:
+            prev_stat = os.stat(prev_path, follow_symlinks=False)
+        except OSError:
+            return False
+        return (src_stat.st_size == prev_stat.st_size
+                and src_stat.st_mtime_ns == prev_stat.st_mtime_ns)
+
+    def _link(self, prev_path, dst_path, replace=False):
+        """Hard-link dst_path to prev_path, returning False if that is not possible
+
+        replace=True (when resuming) swaps out a file already at dst_path.
+        """
+        try:
+            if replace:
+                tmp_path = temp_path_for(dst_path)
+                self._discard(tmp_path)
+                os.link(prev_path, tmp_path)
+                os.replace(tmp_path, dst_path)
+            else:
+                os.link(prev_path, dst_path)
+        except OSError:
+            # Missing, different filesystem, link limit reached, etc. - just copy it
+            return False
+        return True
+
+    def _discard(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _remove_temp_files(self, destination):
+        """Delete half-written files an interrupted attempt left behind"""
+        for dirpath, dirnames, filenames in os.walk(destination):
+            for name in filenames:
+                if name.endswith(TEMP_SUFFIX):
+                    self._discard(os.path.join(dirpath, name))
+
+class MoveStats:
+    """Counters for a backup done by moving the source entries"""
+    def __init__(self):
+        self.entries = 0
+
+    def summary(self):
+        """One-line description of the run"""
+        return f"Moved {self.entries} entries into the backup (same filesystem, nothing copied)"
+
+class BackupRun:
+    """A single backup of source_folder into a new snapshot in backup_location
+
+    backup_path is the new snapshot folder, the manifest file when the
+    'chunks' format is used, or the archive file for the tar formats.
+
+    move=True tells the run that the source will be emptied afterwards. A
+    folder backup on the same filesystem as the source is then done by
+    renaming each top-level entry into the snapshot (if 'move_on_clean' is
+    set), and moved is True; there is nothing left to verify or clean.
+
+    The options' exclude / include rules (see PathFilter) apply to every
+    format, to the pre-verify walk of the source, and rule out moving.
+
+    changes (a ChangeSet) lets an incremental folder backup with a trusted
+    index skip reading unchanged source folders; it is only used if it
+    describes the changes since the snapshot the index belongs to, and
+    used_changes tells whether it was.
+
+    A folder backup that was interrupted (its snapshot still holds a
+    checkpoint journal) is resumed: the run writes into that snapshot
+    instead of a new one, and resuming is True.
+
+    cancel() (or setting the cancel event passed in) stops the run between
+    files: run(), verify() and clean_source() then raise BackupCancelled,
+    and the partial snapshot or archive is removed.
+
+    The copy is held to the options' max_mb_per_s and max_files_per_s. A
+    front-end passes its own Throttle instead to change the limits while
+    the run is in progress.
+
+    With the 'delta_copy' option, an incremental folder backup with the
+    file index copies changed files of at least delta_min_mb MB as a delta
+    against the previous snapshot (see DeltaCopier).
+    """
+    def __init__(self, source_folder, backup_location, options, index_path=None, progress=None,
+                 scan=None, move=False, cancel=None, throttle=None, changes=None):
+        self.source_folder = source_folder
+        self.backup_location = backup_location
+        self.options = options
+        self.progress = progress
+        if progress is not None and scan is not None:
+            # Known totals from a pre-scan make the progress fraction and ETA meaningful
+            progress.set_totals(scan.bytes, scan.files)
+        self.backup_format = options.get('backup_format', 'folder')
+        if self.backup_format not in BACKUP_FORMATS:
+            raise ValueError(f"Unknown backup format: {self.backup_format}")
+        self.snapshot_name, self.backup_path = self._new_snapshot()
+        self.index_path = None
+        if self.backup_format == 'folder' and options.get('use_index'):
+            self.index_path = index_path
+        self.resuming = False
+        if self.backup_format == 'folder':
+            interrupted = find_incomplete_snapshot(backup_location, source_folder)
+            if interrupted:
+                self.backup_path = interrupted
+                self.snapshot_name = os.path.basename(interrupted)
+                self.resuming = True
+        self.previous_snapshot = None
+        self.stats = None
+        self.path_filter = filter_from_options(options)
+        # Moving would take excluded entries along, so only move unfiltered backups
+        self.move = (move and self.backup_format == 'folder' and options.get('move_on_clean', True)
+                     and self.path_filter is None)
+        self.moved = False
+        self.started_ns = None
+        self.cancel_event = cancel if cancel is not None else threading.Event()
+        self.throttle = throttle if throttle is not None else Throttle.from_options(options)
+        self.changes = changes
+        self.used_changes = False
+        # Checksum manifest filled in while the data is copied
+        self.checksums = None
+        if options.get('checksums', True):
+            self.checksums = ManifestWriter(manifest_path_for(self.backup_path,
+                                                              self.backup_format == 'folder'))
+
+    def _snapshot_path(self, snapshot_name):
+        if self.backup_format == 'chunks':
+            return ChunkStore(self.backup_location).manifest_path(snapshot_name)
+        if self.backup_format in ARCHIVE_FORMATS:
+            return os.path.join(self.backup_location, f"{snapshot_name}.{self.backup_format}")
+        return os.path.join(self.backup_location, snapshot_name)
+
+    def _new_snapshot(self):
+        """Return the name and path of the new snapshot
+
+        Names have one-second resolution, so a backup started in the same
+        second as an earlier one takes the next free second instead of
+        writing into the earlier snapshot.
+        """
+        when = datetime.now()
+        while True:
+            snapshot_name = new_snapshot_name(self.source_folder, when)
+            backup_path = self._snapshot_path(snapshot_name)
+            if not os.path.lexists(backup_path):
+                return snapshot_name, backup_path
+            when += timedelta(seconds=1)
+
+    def cancel(self):
+        """Ask the run to stop as soon as possible"""
+        self.cancel_event.set()
+
+    def run(self):
+        """Perform the backup and return the copy statistics"""
+        self.started_ns = time.time_ns()
+        try:
+            check_cancelled(self.cancel_event)
+            if self.move and not self.resuming and self._same_filesystem():
+                return self._run_move()
+            if self.backup_format == 'chunks':
+                stats = self._run_chunks()
+            elif self.backup_format in ARCHIVE_FORMATS:
+                stats = self._run_archive()
+            else:
+                stats = self._run_folder()
+            if self.checksums is not None:
+                self.checksums.finish()
+            return stats
+        except BaseException as e:
+            if self.checksums is not None:
+                self.checksums.abort()
+            if isinstance(e, BackupCancelled) and self.backup_format == 'folder':
+                shutil.rmtree(self.backup_path, ignore_errors=True)
+            raise
+        finally:
+            if self.progress is not None:
+                self.progress.finish()
+
+    def verify(self):
+        """Check the finished backup against the source and return a VerifyResult"""
+        check_cancelled(self.cancel_event)
+        return BackupVerifier().verify(self.source_folder, self.backup_path, self.backup_format,
+                                       path_filter=self.path_filter)
+
+    def clean_source(self, verified):
+        """Remove the source files confirmed by a VerifyResult and return a CleanResult"""
+        check_cancelled(self.cancel_event)
+        return SourceCleaner().clean(self.source_folder, verified.confirmed, self.started_ns,
+                                     cleaned_log_path_for(self.backup_path,
+                                                          self.backup_format == 'folder'))
+
+    def _same_filesystem(self):
+        """True if the source and every top-level entry in it share the backup location's device"""
+        device = os.stat(self.backup_location).st_dev
+        if os.stat(self.source_folder).st_dev != device:
+            return False
+        with os.scandir(self.source_folder) as entries:
+            return all(entry.stat(follow_symlinks=False).st_dev == device for entry in entries)
+
+    def _run_move(self):
+        """Back up by renaming the source's top-level entries into the snapshot folder"""
+        self.checksums = None
+        os.makedirs(self.backup_path)
+        self.stats = MoveStats()
+        for name in sorted(os.listdir(self.source_folder)):
+            os.rename(os.path.join(self.source_folder, name), os.path.join(self.backup_path, name))
+            self.stats.entries += 1
+        shutil.copystat(self.source_folder, self.backup_path)
+        self.moved = True
+        return self.stats
+
+    def _run_folder(self):
+        """Copy the source into a plain snapshot folder"""
+        # Delta copies need a previous snapshot and an index to keep block hashes in
+        delta = None
+        if self.index_path and self.options.get('incremental'):
+            delta = DeltaCopier.from_options(self.options, self.throttle)
+        engine = CopyEngine(workers=self.options['copy_workers'], throttle=self.throttle,
+                            io_nice=self.options.get('io_nice'), delta=delta)
+        index = FileIndex(self.index_path) if self.index_path else None
+        try:
+            trusted_index = None
+            if self.options.get('incremental'):
+                # Prefer the snapshot the index describes so its rows can be trusted,
+                # as long as it is a snapshot in this destination
+                indexed = index.snapshot if index else None
+                if (indexed and os.path.isdir(indexed) and os.path.dirname(os.path.abspath(indexed))
+                        == os.path.abspath(self.backup_location)):
+                    self.previous_snapshot = indexed
+                    trusted_index = index
+                else:
+                    self.previous_snapshot = latest_snapshot(self.backup_location,
+                                                             self.source_folder)
+
+            changes = None
+            if (self.changes is not None and trusted_index is not None and not self.resuming
+                    and self.changes.snapshot == self.previous_snapshot):
+                changes = self.changes
+                self.used_changes = True
+            self.stats = engine.copy_tree(self.source_folder, self.backup_path,
+                                          link_dest=self.previous_snapshot,
+                                          index=trusted_index,
+                                          record=index is not None,
+                                          progress=self.progress,
+                                          checksums=self.checksums,
+                                          cancel=self.cancel_event,
+                                          journal=CheckpointJournal(self.backup_path),
+                                          path_filter=self.path_filter,
+                                          changes=changes,
+                                          resume=self.resuming)
+            if index is not None:
+                index.replace(self.stats.records, self.backup_path, self.stats.blocks)
+        finally:
+            if index is not None:
+                index.close()
+        return self.stats
+
+    def _run_chunks(self):
+        """Store the source in the deduplicating chunk repository"""
+        store = ChunkStore(self.backup_location)
+        manifests = store.list_manifests(_source_name(self.source_folder))
+        # Always compare against the last manifest: unchanged files reuse its chunks
+        self.previous_snapshot = manifests[-1] if manifests else None
+        self.backup_path, self.stats = store.backup_tree(
+            self.source_folder, self.snapshot_name,
+            workers=self.options['copy_workers'],
+            previous_manifest=self.previous_snapshot,
+            progress=self.progress,
+            checksums=self.checksums,
+            cancel=self.cancel_event,
+            throttle=self.throttle,
+            io_nice=self.options.get('io_nice'),
+            path_filter=self.path_filter)
+        return self.stats
+
+    def _run_archive(self):
+        """Stream the source into a single compressed tar archive"""
+        writer = ArchiveWriter(self.backup_format,
+                               level=self.options.get('compression_level'),
+                               workers=self.options['copy_workers'],
+                               throttle=self.throttle,
+                               io_nice=self.options.get('io_nice'))
+        self.stats = writer.write_tree(self.source_folder, self.backup_path,
+                                       progress=self.progress,
+                                       checksums=self.checksums,
+                                       cancel=self.cancel_event,
+                                       path_filter=self.path_filter)
+        return self.stats
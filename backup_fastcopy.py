@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Backup Fast Copy - kernel-level file copy paths for the copy engine
+Tries a reflink clone, then copy_file_range, then sendfile, and falls back to
+a buffered userspace copy, remembering what each filesystem pair supports.
+When a checksum is wanted too, the source is hashed after a kernel copy
+(usually from the page cache), or on its way through the userspace copy
+"""
+
+import os
+import errno
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl number of FICLONE (_IOW(0x94, 9, int)) - shares extents on Btrfs/XFS/OCFS2
+FICLONE = 0x40049409
+
+BUFFER_SIZE = 1024 * 1024
+
+# Largest single kernel copy call; throttled copies go BUFFER_SIZE at a time
+KERNEL_CHUNK = 1 << 30
+
+# Errors meaning "this mechanism does not work here", not "the copy failed"
+FALLBACK_ERRNOS = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EBADF,
+    errno.EOPNOTSUPP, errno.ENOTTY, errno.EPERM, errno.ETXTBSY,
+}
+
+COPY_METHODS = ('reflink', 'copy_file_range', 'sendfile', 'userspace')
+
+class _Unsupported(Exception):
+    """Raised inside a copy method when it cannot handle this file"""
+
+class FastCopier:
+    """Copy files with the fastest mechanism available for each filesystem pair
+
+    A mechanism that fails with a "not supported" error is not tried again
+    for the same (source device, destination device) pair, so the probing
+    cost is paid once per run rather than once per file.
+
+    With a Throttle, every piece of data read or written is charged to its
+    byte bucket, so the copy speed stays within the configured MB/s.
+    """
+    def __init__(self, methods=COPY_METHODS, throttle=None):
+        self.methods = [m for m in methods if self._available(m)]
+        self.throttle = throttle
+        self._unsupported = set()
+        self._lock = threading.Lock()
+
+    def _available(self, method):
+        if method == 'reflink':
+            return fcntl is not None and hasattr(fcntl, 'ioctl') and os.name == 'posix'
+        if method == 'copy_file_range':
+            return hasattr(os, 'copy_file_range')
+        if method == 'sendfile':
+            return hasattr(os, 'sendfile') and os.name == 'posix'
+        return method == 'userspace'
+
+    def copy(self, src_path, dst_path, digest=None):
+        """Copy data and metadata like shutil.copy2 and return the method used
+
+        If a hashlib object is passed as digest it is fed the file's data.
+        The kernel copy paths are still used: the source is read again for
+        the hash once they are done, which the page cache usually serves
+        (a file larger than memory is read from disk twice). The userspace
+        fallback hashes each buffer as it is written instead. The hash is
+        always of the source, so verifying against it catches a bad copy.
+        """
+        methods = self.methods
+        if digest is not None:
+            methods = ['hashed' if m == 'userspace' else m for m in self.methods]
+        with open(src_path, 'rb') as fsrc, open(dst_path, 'wb') as fdst:
+            src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+            size = os.fstat(src_fd).st_size
+            devices = (os.fstat(src_fd).st_dev, os.fstat(dst_fd).st_dev)
+            used = None
+            for method in methods:
+                if (method, devices) in self._unsupported:
+                    continue
+                try:
+                    if method == 'hashed':
+                        self._copy_hashed(fsrc, fdst, digest)
+                    else:
+                        getattr(self, '_copy_' + method)(fsrc, fdst, size)
+                    used = method
+                    break
+                except _Unsupported:
+                    pass
+                except OSError as e:
+                    if e.errno not in FALLBACK_ERRNOS or method in ('userspace', 'hashed'):
+                        raise
+                    with self._lock:
+                        self._unsupported.add((method, devices))
+                # Start over cleanly with the next mechanism
+                fdst.seek(0)
+                fdst.truncate()
+                fsrc.seek(0)
+            if digest is not None and used != 'hashed':
+                fsrc.seek(0)
+                self._hash(fsrc, digest)
+        shutil.copystat(src_path, dst_path)
+        return used
+
+    def _charge(self, count):
+        if self.throttle is not None:
+            self.throttle.consume_bytes(count)
+
+    def _kernel_chunk(self):
+        return BUFFER_SIZE if self.throttle is not None and self.throttle.active else KERNEL_CHUNK
+
+    def _copy_reflink(self, fsrc, fdst, size):
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+    def _copy_copy_file_range(self, fsrc, fdst, size):
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        chunk = self._kernel_chunk()
+        copied = 0
+        while copied < size:
+            sent = os.copy_file_range(src_fd, dst_fd, min(size - copied, chunk))
+            if sent == 0:
+                if copied == 0:
+                    # Some filesystems (procfs, some FUSE) report success but copy nothing
+                    raise _Unsupported()
+                break
+            copied += sent
+            self._charge(sent)
+
+    def _copy_sendfile(self, fsrc, fdst, size):
+        src_fd, dst_fd = fsrc.fileno(), fdst.fileno()
+        chunk = self._kernel_chunk()
+        copied = 0
+        while copied < size:
+            sent = os.sendfile(dst_fd, src_fd, copied, min(size - copied, chunk))
+            if sent == 0:
+                if copied == 0:
+                    raise _Unsupported()
+                break
+            copied += sent
+            self._charge(sent)
+
+    def _copy_userspace(self, fsrc, fdst, size):
+        if self.throttle is None:
+            shutil.copyfileobj(fsrc, fdst, BUFFER_SIZE)
+            return
+        while True:
+            buf = fsrc.read(BUFFER_SIZE)
+            if not buf:
+                break
+            fdst.write(buf)
+            self._charge(len(buf))
+
+    def _copy_hashed(self, fsrc, fdst, digest):
+        buf = bytearray(BUFFER_SIZE)
+        view = memoryview(buf)
+        while True:
+            n = fsrc.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+            fdst.write(view[:n])
+            self._charge(n)
+
+    def _hash(self, fsrc, digest):
+        buf = bytearray(BUFFER_SIZE)
+        view = memoryview(buf)
+        while True:
+            n = fsrc.readinto(buf)
+            if not n:
+                break
+            digest.update(view[:n])
+            self._charge(n)
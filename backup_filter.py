@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Backup Filter - gitignore-style include/exclude rules for the source tree
+The rules are compiled once into a few combined regular expressions and
+checked while the source is walked, so excluded folders are never entered
+"""
+
+import os
+import re
+
+# Patterns without wildcards or slashes are matched by name with a set lookup
+_WILDCARDS = set('*?[\\')
+
+def _translate(pattern):
+    """Translate one gitignore glob (no leading or trailing slash) into a regex"""
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        if pattern.startswith('**/', i):
+            # Zero or more folders
+            parts.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i) and i + 2 == n:
+            # Everything inside
+            parts.append('.*')
+            i += 2
+            continue
+        c = pattern[i]
+        i += 1
+        if c == '*':
+            parts.append('[^/]*')
+        elif c == '?':
+            parts.append('[^/]')
+        elif c == '\\' and i < n:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+        elif c == '[':
+            j = i
+            if j < n and pattern[j] in '!^':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            end = pattern.find(']', j)
+            if end == -1:
+                parts.append(re.escape(c))
+                continue
+            body = pattern[i:end].replace('\\', '\\\\')
+            if body[0] in '!^':
+                body = '^' + body[1:]
+            parts.append(f'(?!/)[{body}]')
+            i = end + 1
+        else:
+            parts.append(re.escape(c))
+    return ''.join(parts)
+
+def parse_rule(line):
+    """Parse one gitignore line into (negated, dir_only, name, regex), or None for blanks and comments
+
+    name is set instead of regex for plain names that match at any depth.
+    """
+    line = line.rstrip('\n')
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+    if not line or line.startswith('#'):
+        return None
+    negated = line.startswith('!')
+    if negated:
+        line = line[1:]
+    elif line.startswith('\\#') or line.startswith('\\!'):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+    # A slash anywhere but at the end anchors the pattern to the source folder
+    anchored = '/' in line
+    line = line.lstrip('/')
+    if not anchored and not _WILDCARDS & set(line):
+        return negated, dir_only, line, None
+    regex = ('' if anchored else '(?:.*/)?') + _translate(line)
+    return negated, dir_only, None, regex
+
+class _RuleGroup:
+    """Consecutive rules of the same kind, matched together"""
+    def __init__(self, negated):
+        self.negated = negated
+        self.file_names = set()
+        self.dir_names = set()
+        self.file_patterns = []
+        self.dir_patterns = []
+
+    def add(self, dir_only, name, regex):
+        if name is not None:
+            self.dir_names.add(name)
+            if not dir_only:
+                self.file_names.add(name)
+        else:
+            self.dir_patterns.append(regex)
+            if not dir_only:
+                self.file_patterns.append(regex)
+
+    def compile(self):
+        self.file_regex = self._combine(self.file_patterns)
+        self.dir_regex = self._combine(self.dir_patterns)
+
+    def _combine(self, patterns):
+        if not patterns:
+            return None
+        return re.compile('(?:' + '|'.join(f'(?:{p})' for p in patterns) + r')\Z', re.DOTALL)
+
+    def matches(self, rel_path, name, is_dir):
+        if name in (self.dir_names if is_dir else self.file_names):
+            return True
+        regex = self.dir_regex if is_dir else self.file_regex
+        return regex is not None and regex.match(rel_path) is not None
+
+class PathFilter:
+    """Compiled gitignore-style exclude rules with include exceptions
+
+    exclude holds gitignore lines: `*.tmp`, `node_modules/` (folders only),
+    `/build` (only at the top of the source), `docs/**/*.pdf`, and `!keep.tmp`
+    to take a file back in. include holds patterns that are always kept,
+    as if they were added as `!` lines after the excludes. As in git, the
+    last matching rule wins, and a file inside an excluded folder cannot be
+    taken back in because the folder is never walked.
+
+    Paths are relative to the source folder. Consecutive rules of one kind
+    are merged into one regex (plus a set for plain names), so checking a
+    path costs a few regex matches whatever the number of rules.
+    """
+    def __init__(self, exclude=(), include=()):
+        self.rules = tuple(exclude) + tuple('!' + pattern.lstrip('!') for pattern in include)
+        self._groups = []
+        for line in self.rules:
+            rule = parse_rule(line)
+            if rule is None:
+                continue
+            negated, dir_only, name, regex = rule
+            if not self._groups or self._groups[-1].negated != negated:
+                self._groups.append(_RuleGroup(negated))
+            self._groups[-1].add(dir_only, name, regex)
+        for group in self._groups:
+            group.compile()
+
+    def __bool__(self):
+        return any(not group.negated for group in self._groups)
+
+    def excluded(self, rel_path, is_dir=False):
+        """True if the file or folder at rel_path should not be backed up"""
+        if os.sep != '/':
+            rel_path = rel_path.replace(os.sep, '/')
+        name = rel_path.rpartition('/')[2]
+        for group in reversed(self._groups):
+            if group.matches(rel_path, name, is_dir):
+                return not group.negated
+        return False
+
+def filter_from_options(options):
+    """Return the PathFilter for the engine options, or None if nothing is excluded"""
+    path_filter = PathFilter(options.get('exclude') or (), options.get('include') or ())
+    return path_filter if path_filter else None
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Backup Frontend - the backup flow shared by the GUI front-ends
+Checks the folders, sizes the source, hands the backup to the front-end's
+orchestrator and runs it (copy, verify, clean, prune) with run metrics. Each
+GUI only supplies its settings and its own way of showing what happened
+"""
+
+import os
+import json
+import queue
+import shutil
+from tkinter import messagebox
+
+from backup_engine import BackupRun
+from backup_filter import filter_from_options
+from backup_index import index_path_for
+from backup_scan import check_free_space, estimate
+from backup_retention import prune_in_background, retention_enabled
+from backup_metrics import RunMetrics
+from backup_orchestrator import BackupOrchestrator
+from backup_scheduler import DAY_CODES, BackupScheduler
+from backup_daemon import DaemonClient, DaemonError, daemon_running, socket_path_for
+from backup_throttle import Throttle
+from backup_progress import BackupCancelled, ProgressTracker
+
+# Job name of a GUI's backups in the orchestrator and the run log (the CLI's default job)
+BACKUP_JOB = "default"
+
+# How often the Tk thread picks up messages from backup threads
+UI_POLL_MS = 100
+
+def save_gui_config(config_file, settings):
+    """Write a GUI's own settings into the config file and return the whole config
+
+    The file is read again first, so everything else in it (CLI jobs, engine
+    options, filters, retention) stays as it was last saved, by whichever
+    front-end saved it.
+    """
+    config = {}
+    if os.path.exists(config_file):
+        with open(config_file, 'r') as f:
+            config = json.load(f)
+    config.update(settings)
+    with open(config_file, 'w') as f:
+        json.dump(config, f, indent=2)
+    return config
+
+class FrontendBackups:
+    """Manual and scheduled backups of one GUI front-end
+
+    Scheduled backups run from a BackupScheduler (the one the CLI uses),
+    set with set_schedule() and stopped by close().
+
+    settings() returns the next backup's source_folder, backup_location,
+    engine_options and clean flag as a dict. notify(kind, title, message)
+    shows a state change: kind is 'info', 'busy', 'warning' or 'error', and
+    message is None for a status that needs no dialog (e.g. "Scanning...").
+    on_started(progress) is called once a manual backup is queued; with
+    track_progress it gets the run's ProgressTracker, otherwise None.
+
+    While a backup daemon (backup_cli.py --daemon) is running, it owns the
+    job queue and its per-destination limits: a manual backup is handed to
+    it as a trigger of its default job, and scheduled backups are left to
+    it. This is checked each time, so a daemon started after the GUI counts.
+
+    All of these run on the Tk thread. Backup threads never touch Tk: they
+    post to a queue the Tk main loop drains every UI_POLL_MS, so a backup
+    can always finish even while the main thread waits for it.
+    """
+    def __init__(self, root, config_file, options, settings, notify, on_started=None,
+                 track_progress=False):
+        self.root = root
+        self.config_file = config_file
+        self.settings = settings
+        self.notify = notify
+        self.on_started = on_started
+        self.track_progress = track_progress
+        self.orchestrator = BackupOrchestrator()
+        # Rate limits from the config file, picked up by running backups when it changes
+        self.throttle = Throttle.from_options(options, config_file=config_file)
+        self.closing = False
+        self._scan = None
+        self._ui_calls = queue.Queue()
+        self._poll_id = self.root.after(UI_POLL_MS, self._poll)
+        self.scheduler = BackupScheduler()
+        self.scheduler.start()
+
+    def backup_now(self):
+        """Start a manual backup after checking the folders and sizing the source
+
+        A second click while a backup runs offers to cancel it. Returns True
+        if the pre-scan was started.
+        """
+        if self.orchestrator.is_active(BACKUP_JOB):
+            if messagebox.askyesno("Backup Running", "A backup is already running. Cancel it?"):
+                self.orchestrator.cancel(BACKUP_JOB)
+            return False
+
+        settings = self.settings()
+        if not settings['source_folder'] or not settings['backup_location']:
+            self.notify('error', "Error", "Please select both source folder and backup location first!")
+            return False
+        if not os.path.exists(settings['source_folder']):
+            self.notify('error', "Error", "Source folder does not exist!")
+            return False
+        if not os.path.exists(settings['backup_location']):
+            self.notify('error', "Error", "Backup location does not exist!")
+            return False
+
+        self.notify('busy', "Scanning...", None)
+        # Size the backup off the UI thread before copying anything
+        self._scan = self.orchestrator.run_blocking(self._prepare_backup, settings)
+        return True
+
+    def set_schedule(self, days, time_str):
+        """Back up on days (DAY_CODES) at time_str (HH:MM), replacing the previous schedule
+
+        Nothing is scheduled while a backup daemon is running; it owns the
+        schedule. Raises ValueError for a malformed time_str.
+        """
+        self.scheduler.clear()
+        if daemon_running(self.config_file):
+            return
+        days = [day for day in days if day in DAY_CODES]
+        if days and time_str:
+            self.scheduler.add_job(days, time_str, self.scheduled_backup)
+
+    def scheduled_backup(self):
+        """Queue a scheduled backup (from the scheduler thread); skipped if one is already active"""
+        if daemon_running(self.config_file):
+            return
+        self._post(self._queue_scheduled)
+
+    def close(self, on_closed):
+        """Cancel every backup and call on_closed (e.g. root.destroy) once they have stopped
+
+        The Tk main loop keeps running meanwhile; messages from the backups
+        are dropped instead of shown.
+        """
+        if self.closing:
+            return
+        self.closing = True
+        self.scheduler.stop()
+        self.orchestrator.cancel_all()
+        self._wait_closed(on_closed)
+
+    def _wait_closed(self, on_closed):
+        status = self.orchestrator.status()
+        if status['running'] or status['queued'] or (self._scan is not None and not self._scan.done()):
+            self.root.after(UI_POLL_MS, lambda: self._wait_closed(on_closed))
+            return
+        self.root.after_cancel(self._poll_id)
+        self.orchestrator.shutdown(wait=False)
+        on_closed()
+
+    def _post(self, func):
+        """Run func on the Tk thread (safe from any thread)"""
+        self._ui_calls.put(func)
+
+    def _poll(self):
+        while True:
+            try:
+                func = self._ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            if not self.closing:
+                func()
+        self._poll_id = self.root.after(UI_POLL_MS, self._poll)
+
+    def _queue_scheduled(self):
+        settings = self.settings()
+        if settings['source_folder'] and settings['backup_location']:
+            self.orchestrator.submit(BACKUP_JOB,
+                                     lambda cancel: self._perform_backup(settings, cancel=cancel),
+                                     settings['backup_location'])
+
+    def _daemon_request(self, command, **args):
+        """Send a command to the running daemon; errors are reported and give None"""
+        try:
+            return DaemonClient(socket_path_for(self.config_file)).request(command, **args)
+        except (OSError, ValueError, DaemonError) as e:
+            error = str(e)
+            self._post(lambda: self.notify('error', "Backup Failed", f"Backup daemon: {error}"))
+            return None
+
+    def _trigger_daemon(self):
+        """Hand a manual backup to the running daemon and report what it did"""
+        reply = self._daemon_request('trigger')
+        if reply is not None:
+            self._post(lambda: self._daemon_triggered(reply))
+
+    def _daemon_triggered(self, reply):
+        paused = " It is paused and will start the backup when resumed." if reply['paused'] else ""
+        if reply['queued']:
+            self.notify('busy', "Backup Queued", f"The backup daemon is running this backup.{paused}")
+        elif messagebox.askyesno("Backup Running",
+                                 "A backup is already queued or running in the backup daemon. Cancel it?"):
+            job = reply['job']
+            self.orchestrator.run_blocking(lambda: self._daemon_request('cancel', job=job))
+            self.notify('warning', "Backup Cancelled", "The backup daemon is cancelling the backup.")
+        else:
+            self.notify('info', "Ready", None)
+
+    def _prepare_backup(self, settings):
+        """Scan the source and check free space, then continue on the UI thread
+
+        With a backup daemon running, the backup is handed to it instead.
+        """
+        if daemon_running(self.config_file):
+            self._trigger_daemon()
+            return
+        options = settings['engine_options']
+        try:
+            scan = estimate(settings['source_folder'], workers=options['copy_workers'],
+                            path_filter=filter_from_options(options))
+            status, message = check_free_space(scan, settings['backup_location'], options)
+        except Exception as e:
+            error = str(e)
+            self._post(lambda: self.notify('error', "Backup Failed", f"Error during backup: {error}"))
+            return
+        self._post(lambda: self._start_backup(settings, scan, status, message))
+
+    def _start_backup(self, settings, scan, status, message):
+        """Refuse or confirm a backup that may not fit, then queue it"""
+        if status == 'refuse':
+            self.notify('error', "Not Enough Space", message)
+            return
+        if status == 'warn' and not messagebox.askyesno("Low Disk Space", f"{message}\n\nContinue anyway?"):
+            self.notify('info', "Ready", None)
+            return
+
+        progress = ProgressTracker() if self.track_progress else None
+        future = self.orchestrator.submit(BACKUP_JOB,
+                                          lambda cancel: self._perform_backup(settings, scan, progress, cancel),
+                                          settings['backup_location'])
+        if future is None:
+            if progress is not None:
+                progress.finish()
+            self.notify('info', "Backup Running", "A backup is already running.")
+            return
+        if progress is not None:
+            # A job dropped from the queue before it started never runs _perform_backup
+            future.add_done_callback(lambda _: progress.finish())
+        if self.on_started is not None:
+            self.on_started(progress)
+
+    def _perform_backup(self, settings, scan=None, progress=None, cancel=None):
+        """Run one backup on an orchestrator thread and report the outcome
+
+        progress is always finished, whatever happens, so a progress display
+        following it stops.
+        """
+        try:
+            self._run_backup(settings, scan, progress, cancel)
+        finally:
+            if progress is not None:
+                progress.finish()
+
+    def _run_backup(self, settings, scan, progress, cancel):
+        source_folder = settings['source_folder']
+        backup_location = settings['backup_location']
+        options = settings['engine_options']
+        metrics = RunMetrics(BACKUP_JOB, source_folder, backup_location, options['backup_format'])
+        if scan is not None:
+            metrics.add_phase('scan', scan.seconds)
+        try:
+            backup_run = BackupRun(source_folder, backup_location, options,
+                                   index_path=index_path_for(self.config_file, source_folder, backup_location),
+                                   progress=progress, scan=scan, move=settings['clean'],
+                                   cancel=cancel, throttle=self.throttle)
+            backup_path = backup_run.backup_path
+            self._post(lambda: self.notify('busy', "Backup Started", "Backup in progress..."))
+
+            with metrics.phase('copy'):
+                stats = backup_run.run()
+            metrics.add_stats(stats)
+
+            # Verify the copy; cleaning the source is only allowed once it checks out
+            # (a moved source is already empty and there is no copy to verify)
+            clean = settings['clean'] and not backup_run.moved
+            if (options['verify'] and not backup_run.moved) or clean:
+                with metrics.phase('verify'):
+                    verified = backup_run.verify()
+                if not verified.ok:
+                    metrics.add_errors(len(verified.mismatched) + len(verified.missing))
+                    note = " - the source was not cleaned" if clean else ""
+                    raise RuntimeError(f"{verified.summary()}{note}")
+
+            if clean:
+                with metrics.phase('clean'):
+                    cleaned = backup_run.clean_source(verified)
+                metrics.add_errors(len(cleaned.errors))
+
+            metrics.finish(True)
+            metrics.write(self.config_file, options)
+
+            # Pruning runs on its own thread so the next backup is never held up
+            if retention_enabled(options):
+                prune_in_background(backup_location, source_folder, options)
+
+            self._post(lambda: self.notify('info', "Backup Complete",
+                                           f"Backup completed successfully!\nSaved to: {backup_path}"))
+        except BackupCancelled:
+            metrics.finish(False, "cancelled")
+            metrics.write(self.config_file, options)
+            self._post(lambda: self.notify('warning', "Backup Cancelled", "The backup was cancelled."))
+        except Exception as e:
+            if isinstance(e, shutil.Error):
+                metrics.add_errors(len(e.args[0]))
+            metrics.finish(False, str(e))
+            metrics.write(self.config_file, options)
+            error = str(e)
+            self._post(lambda: self.notify('error', "Backup Failed", f"Error during backup: {error}"))
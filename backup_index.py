@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Backup Index - persistent per-source file-state database
+Remembers size, mtime, inode and content hash of every backed-up file so the
+next backup can find changed files by walking the source only
+"""
+
+import os
+import hashlib
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_BUFFER_SIZE = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    hash TEXT
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    path TEXT PRIMARY KEY,
+    block_size INTEGER NOT NULL,
+    hashes BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def file_hash(path):
+    """Return the BLAKE2b hex digest of a file, read in fixed-size buffers"""
+    digest = hashlib.blake2b()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_BUFFER_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def index_path_for(config_file, source_folder, backup_location):
+    """Return the index database path for source_folder backed up to backup_location, next to config_file
+
+    Each destination has its own index: the index describes the latest
+    snapshot in one destination, so two jobs backing the same source up to
+    different disks must not share it.
+    """
+    source = os.path.abspath(source_folder)
+    source_name = os.path.basename(os.path.normpath(source)) or 'root'
+    destination = os.path.abspath(backup_location)
+    key = hashlib.sha1(f"{source}\0{destination}".encode('utf-8')).hexdigest()[:8]
+    config_dir = os.path.dirname(os.path.abspath(config_file))
+    return os.path.join(config_dir, f"backup_index_{source_name}_{key}.db")
+
+class FileIndex:
+    """SQLite-backed record of the files in the most recent snapshot
+
+    Each row describes a source file (by path relative to the source folder)
+    as it was when the snapshot named in the meta table was taken. A source
+    file whose size, mtime and inode still match its row is unchanged and can
+    be hard-linked from that snapshot without looking at it.
+
+    Large files backed up with delta copies also have a row in the blocks
+    table: the hashes of their fixed-size blocks as stored in the snapshot.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    @property
+    def snapshot(self):
+        """Snapshot folder the index rows describe, or None"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'snapshot'").fetchone()
+        return row[0] if row else None
+
+    def lookup(self, rel_path):
+        """Return (size, mtime_ns, inode, hash) for rel_path, or None"""
+        return self.conn.execute(
+            "SELECT size, mtime_ns, inode, hash FROM files WHERE path = ?", (rel_path,)
+        ).fetchone()
+
+    def lookup_blocks(self, rel_path):
+        """Return (block_size, hashes) for rel_path, or None"""
+        return self.conn.execute(
+            "SELECT block_size, hashes FROM blocks WHERE path = ?", (rel_path,)
+        ).fetchone()
+
+    def replace(self, records, snapshot, blocks=None):
+        """Replace the whole index with records describing snapshot
+
+        records is an iterable of (path, size, mtime_ns, inode, hash) tuples,
+        blocks an optional dict of path -> (block_size, hashes).
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM files")
+            self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", records)
+            self.conn.execute("DELETE FROM blocks")
+            if blocks:
+                self.conn.executemany("INSERT OR REPLACE INTO blocks VALUES (?, ?, ?)",
+                                      ((path, block_size, hashes)
+                                       for path, (block_size, hashes) in blocks.items()))
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('snapshot', ?)", (snapshot,))
+
+    def rebuild(self, source_folder, snapshot, workers=4):
+        """Recreate the index from source_folder and an existing snapshot
+
+        Only files whose size and mtime match their copy in snapshot are
+        indexed (and hashed); everything else is copied on the next backup.
+        Returns the number of indexed files.
+        """
+        candidates = []
+        for dirpath, dirnames, filenames in os.walk(source_folder):
+            rel_dir = os.path.relpath(dirpath, source_folder)
+            for name in filenames:
+                rel_path = os.path.normpath(os.path.join(rel_dir, name))
+                try:
+                    src_stat = os.stat(os.path.join(dirpath, name))
+                    snap_stat = os.stat(os.path.join(snapshot, rel_path))
+                except OSError:
+                    continue
+                if (src_stat.st_size == snap_stat.st_size
+                        and src_stat.st_mtime_ns == snap_stat.st_mtime_ns):
+                    candidates.append((rel_path, src_stat))
+
+        def hash_record(candidate):
+            rel_path, src_stat = candidate
+            try:
+                digest = file_hash(os.path.join(snapshot, rel_path))
+            except OSError:
+                return None
+            return (rel_path, src_stat.st_size, src_stat.st_mtime_ns, src_stat.st_ino, digest)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            records = [record for record in pool.map(hash_record, candidates) if record]
+
+        self.replace(records, snapshot)
+        return len(records)
@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+"""
+Backup Jobs - limits and helpers for running many named backup jobs
+Default concurrency caps, the destination-disk key the per-destination cap is
+counted by, and reading the queue status another process wrote
+"""
+
+import os
+import json
+
+DEFAULT_MAX_JOBS = 4
+DEFAULT_PER_DESTINATION = 1
+
+def destination_key(backup_location):
+    """Identify the disk a backup location lives on (its device number)"""
+    try:
+        return os.stat(backup_location).st_dev
+    except OSError:
+        return os.path.abspath(backup_location)
+
+def load_status(status_file):
+    """Read a queue status written by another process, or None"""
+    try:
+        with open(status_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Backup Journal - checkpoint journal that makes folder backups resumable
+Records every file that is completely in a snapshot being written, so an
+interrupted backup can carry on where it stopped instead of starting over
+"""
+
+import os
+import json
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Present in a snapshot folder for as long as the backup into it is unfinished
+JOURNAL_NAME = ".backup_journal"
+
+# Files are written under this suffix and renamed into place once complete
+TEMP_SUFFIX = ".backup-tmp"
+
+def journal_path_for(snapshot):
+    return os.path.join(snapshot, JOURNAL_NAME)
+
+def temp_path_for(dst_path):
+    """Return the name a file is written under before it is complete"""
+    folder, name = os.path.split(dst_path)
+    return os.path.join(folder, f".{name}{TEMP_SUFFIX}")
+
+def is_incomplete(snapshot):
+    """True if snapshot is a folder backup that was never finished"""
+    return os.path.exists(journal_path_for(snapshot))
+
+def is_locked(snapshot):
+    """True if another backup is writing into snapshot right now"""
+    if fcntl is None:
+        return False
+    try:
+        with open(journal_path_for(snapshot), 'rb') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+    return False
+
+class CheckpointJournal:
+    """Append-only list of files completely copied into a snapshot
+
+    Each line is a JSON array [relative path, size, mtime_ns, hash], added
+    only after the file has been renamed from its temporary name, and
+    flushed straight away. A torn last line (power loss mid-write) is
+    ignored on load. The journal is locked while a backup writes to the
+    snapshot and is deleted by complete() once every file is in place,
+    which is what marks the snapshot as finished.
+    """
+    def __init__(self, snapshot):
+        self.path = journal_path_for(snapshot)
+        self.completed = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        """Load the entries of an earlier attempt (if any) and start appending"""
+        self.completed = self._load()
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return self
+
+    def _load(self):
+        completed = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        rel_path, size, mtime_ns, digest = json.loads(line)
+                    except ValueError:
+                        continue
+                    completed[rel_path] = (size, mtime_ns, digest)
+        except OSError:
+            pass
+        return completed
+
+    def add(self, rel_path, size, mtime_ns, digest):
+        line = json.dumps([rel_path, size, mtime_ns, digest]) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        """Stop appending but keep the journal, leaving the snapshot resumable"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def complete(self):
+        """Mark the snapshot finished by deleting the journal"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Backup Metrics - per-run timings and counters
+Each backup records its phase timings, volumes, errors and slowest files,
+appends them to a rotating JSONL run log and refreshes a Prometheus text
+file for node_exporter's textfile collector
+"""
+
+import os
+import json
+import time
+import heapq
+import threading
+import contextlib
+from datetime import datetime
+
+RUN_LOG_NAME = "backup_runs.jsonl"
+PROMETHEUS_NAME = "backup_metrics.prom"
+
+# The run log is rotated to .1, .2, ... once it grows past this size
+RUN_LOG_MAX_BYTES = 1024 * 1024
+RUN_LOG_BACKUPS = 3
+
+SLOWEST_FILES = 10
+
+_write_lock = threading.Lock()
+
+class SlowestFiles:
+    """Thread-safe record of the N files that took longest to back up"""
+    def __init__(self, limit=SLOWEST_FILES):
+        self.limit = limit
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds, path, size):
+        with self._lock:
+            item = (seconds, path, size)
+            if len(self._heap) < self.limit:
+                heapq.heappush(self._heap, item)
+            elif seconds > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def items(self):
+        """Return [{path, seconds, bytes}], slowest first"""
+        with self._lock:
+            return [{'path': path, 'seconds': round(seconds, 4), 'bytes': size}
+                    for seconds, path, size in sorted(self._heap, reverse=True)]
+
+def metrics_paths(config_file, options=None):
+    """Return (run log path, Prometheus file path) for a config file
+
+    The Prometheus file goes to options['metrics_textfile'] when set, so it
+    can live in node_exporter's --collector.textfile.directory.
+    """
+    config_dir = os.path.dirname(os.path.abspath(config_file))
+    prom_path = (options or {}).get('metrics_textfile') or os.path.join(config_dir, PROMETHEUS_NAME)
+    return os.path.join(config_dir, RUN_LOG_NAME), prom_path
+
+class RunMetrics:
+    """Timings and counters of one backup run
+
+    Wrap each stage in `with metrics.phase('copy'):`; the duration is
+    recorded even if the stage raises. finish() stamps the outcome, and
+    write() appends the run to the log and refreshes the Prometheus file.
+    """
+    def __init__(self, job, source_folder, backup_location, backup_format):
+        self.record = {
+            'job': job,
+            'source': source_folder,
+            'destination': backup_location,
+            'format': backup_format,
+            'started': datetime.now().isoformat(timespec='seconds'),
+            'finished': None,
+            'ok': None,
+            'error': None,
+            'seconds': None,
+            'phases': {},
+            'files': 0,
+            'bytes': 0,
+            'linked_files': 0,
+            'throughput_mb_s': None,
+            'errors': 0,
+            'slowest_files': [],
+        }
+        self._start = time.monotonic()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record['phases'][name] = round(time.monotonic() - start, 4)
+
+    def add_phase(self, name, seconds):
+        """Record a phase timed elsewhere (e.g. a pre-scan)"""
+        self.record['phases'][name] = round(seconds, 4)
+
+    def add_stats(self, stats):
+        """Take the counters from CopyStats, ChunkStats, ArchiveStats or MoveStats"""
+        self.record['files'] = getattr(stats, 'files', getattr(stats, 'entries', 0))
+        self.record['bytes'] = getattr(stats, 'bytes', 0)
+        self.record['linked_files'] = getattr(stats, 'linked', getattr(stats, 'reused', 0))
+        slowest = getattr(stats, 'slowest', None)
+        if slowest is not None:
+            self.record['slowest_files'] = slowest.items()
+
+    def add_errors(self, count):
+        self.record['errors'] += count
+
+    def finish(self, ok, error=None):
+        seconds = time.monotonic() - self._start
+        self.record.update({
+            'finished': datetime.now().isoformat(timespec='seconds'),
+            'ok': ok,
+            'error': error,
+            'seconds': round(seconds, 4),
+        })
+        copy_seconds = self.record['phases'].get('copy')
+        if copy_seconds:
+            self.record['throughput_mb_s'] = round(self.record['bytes'] / (1024 * 1024) / copy_seconds, 2)
+        if error and not self.record['errors']:
+            self.record['errors'] = 1
+
+    def write(self, config_file, options=None):
+        """Append this run to the run log and refresh the Prometheus file"""
+        log_path, prom_path = metrics_paths(config_file, options)
+        try:
+            with _write_lock:
+                append_run(log_path, self.record)
+                write_prometheus(prom_path, last_runs_by_job(log_path))
+        except OSError as e:
+            print(f"Error writing backup metrics: {e}")
+
+def append_run(log_path, record, max_bytes=RUN_LOG_MAX_BYTES, backups=RUN_LOG_BACKUPS):
+    """Append one JSON line, rotating the log first if it is full"""
+    try:
+        if os.path.getsize(log_path) >= max_bytes:
+            for i in range(backups - 1, 0, -1):
+                if os.path.exists(f"{log_path}.{i}"):
+                    os.replace(f"{log_path}.{i}", f"{log_path}.{i + 1}")
+            os.replace(log_path, f"{log_path}.1")
+    except OSError:
+        pass
+    with open(log_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+def read_runs(log_path, limit=None):
+    """Return the runs in the current run log, oldest first (the last `limit` if given)"""
+    runs = []
+    try:
+        with open(log_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        return []
+    return runs[-limit:] if limit else runs
+
+def last_runs_by_job(log_path):
+    """Return {job: (last run, last successful run or None)} from the run log"""
+    jobs = {}
+    for run in read_runs(log_path):
+        _, last_ok = jobs.get(run['job'], (None, None))
+        jobs[run['job']] = (run, run if run['ok'] else last_ok)
+    return jobs
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _timestamp(iso):
+    return datetime.fromisoformat(iso).timestamp() if iso else 0
+
+def write_prometheus(prom_path, jobs):
+    """Write the last run of every job in Prometheus text format, atomically"""
+    metrics = [
+        ('backup_last_run_timestamp_seconds', 'gauge', 'When the last backup finished'),
+        ('backup_last_success_timestamp_seconds', 'gauge', 'When the last successful backup finished'),
+        ('backup_last_run_success', 'gauge', '1 if the last backup succeeded'),
+        ('backup_last_run_duration_seconds', 'gauge', 'Duration of the last backup'),
+        ('backup_last_run_files', 'gauge', 'Files handled by the last backup'),
+        ('backup_last_run_bytes', 'gauge', 'Bytes handled by the last backup'),
+        ('backup_last_run_errors', 'gauge', 'Errors in the last backup'),
+        ('backup_last_run_phase_seconds', 'gauge', 'Duration of each phase of the last backup'),
+    ]
+    lines = []
+    for name, kind, help_text in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for job, (run, last_ok) in sorted(jobs.items()):
+            labels = f'job="{_label(job)}",source="{_label(run["source"])}"'
+            if name == 'backup_last_run_phase_seconds':
+                for phase, seconds in run['phases'].items():
+                    lines.append(f'{name}{{{labels},phase="{_label(phase)}"}} {seconds}')
+                continue
+            value = {
+                'backup_last_run_timestamp_seconds': _timestamp(run['finished']),
+                'backup_last_success_timestamp_seconds': _timestamp(last_ok['finished']) if last_ok else 0,
+                'backup_last_run_success': 1 if run['ok'] else 0,
+                'backup_last_run_duration_seconds': run['seconds'] or 0,
+                'backup_last_run_files': run['files'],
+                'backup_last_run_bytes': run['bytes'],
+                'backup_last_run_errors': run['errors'],
+            }[name]
+            lines.append(f"{name}{{{labels}}} {value}")
+    tmp_path = f"{prom_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, prom_path)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Backup Orchestrator - one asyncio event loop owning every backup of a front-end
+Queues backup jobs, starts each job at most once at a time, keeps concurrent
+runs within a global and a per-destination cap, cancels runs cooperatively
+and hands the blocking work to a bounded thread pool
+"""
+
+import json
+import os
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+from backup_jobs import DEFAULT_MAX_JOBS, DEFAULT_PER_DESTINATION, destination_key
+from backup_progress import BackupCancelled
+
+class BackupOrchestrator:
+    """Job queue driven by an asyncio loop on its own thread
+
+    submit(name, func, backup_location) queues func(cancel) as job `name`;
+    cancel is a threading.Event the job passes on to BackupRun. A second
+    submit for a job that is already queued or running is refused, so two
+    triggers can never write the same backup twice. Jobs start in
+    submission order, except that a job whose destination disk is at its
+    cap waits until a job on that disk finishes. While paused, jobs are
+    queued but none is started.
+
+    The public methods may be called from any thread (GUI, scheduler,
+    daemon); all queue state lives on the loop thread. The queue state is
+    mirrored to status_file (if given) so another process can display it.
+    """
+    def __init__(self, max_workers=DEFAULT_MAX_JOBS, per_destination=DEFAULT_PER_DESTINATION,
+                 status_file=None):
+        self.max_workers = max(1, int(max_workers))
+        self.per_destination = max(1, int(per_destination))
+        self.status_file = status_file
+        self.paused = False
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix='backup-job')
+        self._pending = []
+        self._running = {}
+        self._active_per_destination = {}
+        self._recent = []
+        self._idle = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        self._call(lambda: None)
+
+    def _serve(self):
+        asyncio.set_event_loop(self._loop)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._loop.run_forever()
+
+    def _call(self, func, *args):
+        """Run func(*args) on the loop thread and return its result"""
+        if threading.current_thread() is self._thread:
+            return func(*args)
+        future = Future()
+
+        def call():
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        self._loop.call_soon_threadsafe(call)
+        return future.result()
+
+    # Public interface
+
+    def submit(self, name, func, backup_location):
+        """Queue func(cancel) as job `name` writing to backup_location
+
+        Returns a concurrent.futures.Future for the job's result (False if
+        it failed or was cancelled), or None if a job with that name is
+        already queued or running.
+        """
+        return self._call(self._submit, name, func, backup_location)
+
+    def run_blocking(self, func, *args):
+        """Run a blocking helper (e.g. a pre-scan) on the job pool and return a Future"""
+        return self._executor.submit(func, *args)
+
+    def is_active(self, name):
+        """True if job `name` is queued or running"""
+        return self._call(lambda: name in self._running or any(job['name'] == name for job in self._pending))
+
+    def cancel(self, name):
+        """Drop job `name` from the queue or ask it to stop if it is running
+
+        Returns 'queued', 'running' or None if no such job is active.
+        """
+        return self._call(self._cancel, name)
+
+    def cancel_all(self):
+        """Cancel every queued and running job and return their names"""
+        return self._call(self._cancel_all)
+
+    def pause(self):
+        """Stop starting queued jobs (running ones carry on)"""
+        self._call(self._set_paused, True)
+
+    def resume(self):
+        """Start queued jobs again"""
+        self._call(self._set_paused, False)
+
+    def set_limits(self, max_workers=None, per_destination=None):
+        """Change the caps; they apply to the next jobs started"""
+        self._call(self._set_limits, max_workers, per_destination)
+
+    def status(self):
+        """Return a snapshot of the queue state"""
+        return self._call(self._status)
+
+    def shutdown(self, wait=True, cancel=False):
+        """Stop the orchestrator
+
+        wait=True runs every queued job first; otherwise queued jobs are
+        dropped. Running jobs are always waited for, after being asked to
+        stop if cancel is set.
+        """
+        def stop():
+            if wait:
+                self._set_paused(False)
+            else:
+                for job in list(self._pending):
+                    self._cancel(job['name'])
+            if cancel:
+                for name in list(self._running):
+                    self._cancel(name)
+            return self._idle
+
+        idle = self._call(stop)
+        asyncio.run_coroutine_threadsafe(idle.wait(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    # Loop thread only
+
+    def _submit(self, name, func, backup_location):
+        if name in self._running or any(job['name'] == name for job in self._pending):
+            return None
+        job = {
+            'name': name,
+            'func': func,
+            'destination': backup_location,
+            'key': destination_key(backup_location),
+            'queued': datetime.now().isoformat(timespec='seconds'),
+            'cancel': threading.Event(),
+            'future': Future(),
+        }
+        self._pending.append(job)
+        self._idle.clear()
+        self._dispatch()
+        self._write_status()
+        return job['future']
+
+    def _cancel(self, name):
+        for job in self._pending:
+            if job['name'] == name:
+                self._pending.remove(job)
+                job['future'].set_result(False)
+                self._finished(job, 'cancelled')
+                return 'queued'
+        job = self._running.get(name)
+        if job is not None:
+            job['cancel'].set()
+            self._write_status()
+            return 'running'
+        return None
+
+    def _cancel_all(self):
+        names = [job['name'] for job in self._pending] + list(self._running)
+        return [name for name in names if self._cancel(name)]
+
+    def _set_paused(self, paused):
+        self.paused = paused
+        self._dispatch()
+        self._write_status()
+
+    def _set_limits(self, max_workers, per_destination):
+        if per_destination is not None:
+            self.per_destination = max(1, int(per_destination))
+        if max_workers is not None and max(1, int(max_workers)) != self.max_workers:
+            self.max_workers = max(1, int(max_workers))
+            # Running jobs finish on the old pool; new ones start on a pool of the new size
+            old_executor = self._executor
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                thread_name_prefix='backup-job')
+            old_executor.shutdown(wait=False)
+        self._dispatch()
+        self._write_status()
+
+    def _dispatch(self):
+        """Start every pending job allowed by the caps"""
+        if self.paused:
+            return
+        for job in list(self._pending):
+            if len(self._running) >= self.max_workers:
+                break
+            if self._active_per_destination.get(job['key'], 0) >= self.per_destination:
+                continue
+            self._pending.remove(job)
+            job['started'] = datetime.now().isoformat(timespec='seconds')
+            self._running[job['name']] = job
+            self._active_per_destination[job['key']] = self._active_per_destination.get(job['key'], 0) + 1
+            self._loop.create_task(self._run(job))
+
+    async def _run(self, job):
+        result = False
+        outcome = 'failed'
+        try:
+            result = await self._loop.run_in_executor(self._executor, job['func'], job['cancel'])
+            outcome = 'cancelled' if job['cancel'].is_set() else ('ok' if result is not False else 'failed')
+        except BackupCancelled:
+            outcome = 'cancelled'
+            print(f"[{job['name']}] Backup cancelled")
+        except Exception as e:
+            print(f"[{job['name']}] Backup failed: {e}")
+        finally:
+            del self._running[job['name']]
+            self._active_per_destination[job['key']] -= 1
+            job['future'].set_result(result if outcome == 'ok' else False)
+            self._finished(job, outcome)
+            self._dispatch()
+            self._write_status()
+
+    def _finished(self, job, outcome):
+        self._recent.append({'name': job['name'], 'ok': outcome == 'ok', 'outcome': outcome,
+                             'finished': datetime.now().isoformat(timespec='seconds')})
+        del self._recent[:-20]
+        if not self._pending and not self._running:
+            self._idle.set()
+
+    def _status(self):
+        running_keys = {job['key'] for job in self._running.values()}
+        return {
+            'updated': datetime.now().isoformat(timespec='seconds'),
+            'paused': self.paused,
+            'running': [{'name': job['name'], 'destination': job['destination'],
+                         'started': job['started'], 'cancelling': job['cancel'].is_set()}
+                        for job in self._running.values()],
+            'queued': [{'name': job['name'], 'destination': job['destination'],
+                        'queued': job['queued'],
+                        'waiting_for_destination': job['key'] in running_keys}
+                       for job in self._pending],
+            'recent': list(self._recent),
+        }
+
+    def _write_status(self):
+        if not self.status_file:
+            return
+        try:
+            tmp_path = self.status_file + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._status(), f, indent=2)
+            os.replace(tmp_path, self.status_file)
+        except OSError as e:
+            print(f"Error writing queue status: {e}")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Backup Progress - byte-accurate progress reporting for the copy engine
+Copy workers update a shared tracker, which publishes throttled snapshots to
+a thread-safe queue that a UI loop drains at its own frame rate. A running
+backup can also be asked to stop through a cancel event
+"""
+
+import time
+import queue
+import threading
+from collections import namedtuple
+
+ProgressEvent = namedtuple('ProgressEvent', [
+    'bytes_done', 'bytes_total', 'files_done', 'files_total',
+    'throughput', 'finished',
+])
+
+class ProgressTracker:
+    """Thread-safe progress counters that publish ProgressEvents to a queue
+
+    Workers may call advance() for every file; at most one event per
+    interval seconds is put on the queue (plus a final one from finish()),
+    so a slow consumer is never flooded.
+    """
+    def __init__(self, events=None, interval=0.1):
+        self.events = events if events is not None else queue.Queue()
+        self.interval = interval
+        self.bytes_done = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.files_total = 0
+        self.totals_fixed = False
+        self.throughput = 0.0
+        self._lock = threading.Lock()
+        self._last_publish = time.monotonic()
+        self._last_bytes = 0
+
+    def set_totals(self, bytes_total, files_total):
+        """Set the expected totals up front (e.g. from a pre-scan)"""
+        with self._lock:
+            self.bytes_total = bytes_total
+            self.files_total = files_total
+            self.totals_fixed = True
+
+    def add_total(self, size, files=1):
+        """Grow the totals as the walker discovers files, unless they were pre-set"""
+        with self._lock:
+            if not self.totals_fixed:
+                self.bytes_total += size
+                self.files_total += files
+
+    def advance(self, size, files=1):
+        """Record finished work and publish an event if the interval has passed"""
+        with self._lock:
+            self.bytes_done += size
+            self.files_done += files
+            now = time.monotonic()
+            if now - self._last_publish >= self.interval:
+                self._publish(now, finished=False)
+
+    def finish(self):
+        """Publish the final event"""
+        with self._lock:
+            self._publish(time.monotonic(), finished=True)
+
+    def _publish(self, now, finished):
+        elapsed = now - self._last_publish
+        if elapsed > 0:
+            rate = (self.bytes_done - self._last_bytes) / elapsed
+            # Exponential moving average keeps the displayed speed steady
+            self.throughput = rate if not self.throughput else 0.7 * self.throughput + 0.3 * rate
+        self._last_publish = now
+        self._last_bytes = self.bytes_done
+        self.events.put(ProgressEvent(
+            self.bytes_done, max(self.bytes_total, self.bytes_done),
+            self.files_done, max(self.files_total, self.files_done),
+            self.throughput, finished,
+        ))
+
+class BackupCancelled(Exception):
+    """Raised inside a backup whose cancel event was set"""
+
+def check_cancelled(cancel):
+    """Raise BackupCancelled if cancel (a threading.Event or None) is set"""
+    if cancel is not None and cancel.is_set():
+        raise BackupCancelled("Backup cancelled")
+
+def drain_latest(events):
+    """Return the most recent event waiting in the queue (or None) and discard the rest"""
+    latest = None
+    while True:
+        try:
+            latest = events.get_nowait()
+        except queue.Empty:
+            return latest
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Backup Restore - pull single files, globs or subtrees out of any backup
+Uses the checksum manifest of a snapshot folder, the member index of an
+archive or the chunk manifest as a path index, and reads only the data of
+the selected files
+"""
+
+import os
+import gzip
+import json
+import time
+import shutil
+import tarfile
+from fnmatch import fnmatchcase
+
+from backup_archive import member_index_path
+from backup_retention import list_backups
+from backup_store import ChunkStore
+from backup_verify import MANIFEST_NAME, manifest_path_for, read_manifest
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Metadata files the backup writes into a snapshot folder
+SNAPSHOT_METADATA = (MANIFEST_NAME, '.backup_cleaned.txt')
+
+def _has_glob(pattern):
+    return any(char in pattern for char in '*?[')
+
+def normalize_pattern(pattern):
+    """Turn a user-supplied path or glob into a snapshot-relative pattern
+
+    Raises ValueError for a pattern that leads out of the snapshot.
+    """
+    pattern = os.path.normpath(pattern.strip('/'))
+    if os.path.isabs(pattern) or pattern == os.pardir or pattern.startswith(os.pardir + os.sep):
+        raise ValueError(f"Path is outside the backup: {pattern}")
+    return '' if pattern == '.' else pattern
+
+def _inside(path, folder):
+    """True if path is folder or lies under it (both already resolved)"""
+    return os.path.commonpath([path, folder]) == folder
+
+def matches(rel_path, patterns):
+    """True if rel_path is, lies under, or glob-matches one of the patterns ('' matches everything)"""
+    for pattern in patterns:
+        if not pattern or rel_path == pattern or rel_path.startswith(pattern + '/'):
+            return True
+        if _has_glob(pattern) and fnmatchcase(rel_path, pattern):
+            return True
+    return False
+
+def find_backup(backup_location, source_folder, snapshot=None):
+    """Return the Backup to restore from: the one named snapshot (name or path), or the newest"""
+    backups = list_backups(backup_location, source_folder)
+    if snapshot is None:
+        return backups[-1] if backups else None
+    wanted = os.path.basename(os.path.normpath(snapshot))
+    for backup in backups:
+        if os.path.basename(backup.path) in (wanted, wanted + '.json'):
+            return backup
+    return None
+
+class RestoreResult:
+    """Outcome of a restore"""
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.skipped = []
+        self.outside = []
+        self.seconds = 0.0
+
+    def summary(self):
+        summary = (f"Restored {self.files} files ({self.bytes / (1024 * 1024):.1f} MB) "
+                   f"in {self.seconds:.1f}s")
+        if self.skipped:
+            summary += f", skipped {len(self.skipped)} that already exist (use --overwrite)"
+        if self.outside:
+            summary += f", refused {len(self.outside)} that would land outside the target"
+        return summary
+
+class Restorer:
+    """Copy selected paths out of a backup into a target folder
+
+    Folder snapshots: exact paths and subtrees are looked up directly, globs
+    are matched against the snapshot's checksum manifest. Archives: the
+    member index gives each member's uncompressed offset and the compressed
+    offset of each independent block, so reading starts at the block that
+    holds the member (consecutive members are read on from there). Chunked
+    backups: the manifest lists each file's chunks, which are read directly.
+    Existing files in the target are left alone unless overwrite is set.
+    A file whose destination resolves outside the target (a '..' member
+    name or a symlink already in the target) is refused.
+    """
+    def __init__(self, overwrite=False):
+        self.overwrite = overwrite
+
+    def restore(self, backup, patterns, target):
+        start = time.monotonic()
+        result = RestoreResult()
+        patterns = [normalize_pattern(pattern) for pattern in patterns] or ['']
+        os.makedirs(target, exist_ok=True)
+        target = os.path.realpath(target)
+        if backup.kind == 'folder':
+            self._restore_folder(backup.path, patterns, target, result)
+        elif backup.kind == 'chunks':
+            self._restore_chunks(backup.path, patterns, target, result)
+        elif os.path.exists(member_index_path(backup.path)):
+            self._restore_indexed_archive(backup.path, patterns, target, result)
+        else:
+            self._restore_archive_stream(backup.path, backup.kind, patterns, target, result)
+        result.seconds = time.monotonic() - start
+        return result
+
+    def _open_target(self, target, rel_path, result):
+        """Return the output path for rel_path, or None if it exists and may not be replaced
+        or lies outside target"""
+        path = os.path.join(target, rel_path)
+        if not _inside(os.path.realpath(path), target):
+            result.outside.append(rel_path)
+            return None
+        if not self.overwrite and os.path.lexists(path):
+            result.skipped.append(rel_path)
+            return None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        return path
+
+    def _finish_file(self, path, size, mode, mtime, result):
+        os.chmod(path, mode)
+        os.utime(path, (mtime, mtime))
+        result.files += 1
+        result.bytes += size
+
+    # Snapshot folders
+
+    def _folder_files(self, snapshot, patterns):
+        """Yield the snapshot-relative files selected by patterns"""
+        manifest = None
+        for pattern in patterns:
+            if _has_glob(pattern) or not pattern:
+                if manifest is None:
+                    manifest_path = manifest_path_for(snapshot, True)
+                    if os.path.exists(manifest_path):
+                        manifest = sorted(read_manifest(manifest_path))
+                    else:
+                        manifest = sorted(self._walk(snapshot, ''))
+                yield from (rel_path for rel_path in manifest if matches(rel_path, [pattern]))
+                continue
+            path = os.path.join(snapshot, pattern)
+            if os.path.isdir(path) and not os.path.islink(path):
+                yield from self._walk(snapshot, pattern)
+            elif os.path.lexists(path):
+                yield pattern
+
+    def _walk(self, snapshot, rel_dir):
+        for dirpath, dirnames, filenames in os.walk(os.path.join(snapshot, rel_dir)):
+            rel = os.path.relpath(dirpath, snapshot)
+            for name in filenames:
+                rel_path = os.path.normpath(os.path.join(rel, name))
+                if rel_path not in SNAPSHOT_METADATA:
+                    yield rel_path
+
+    def _restore_folder(self, snapshot, patterns, target, result):
+        seen = set()
+        for rel_path in self._folder_files(snapshot, patterns):
+            if rel_path in seen:
+                continue
+            seen.add(rel_path)
+            path = self._open_target(target, rel_path, result)
+            if path is None:
+                continue
+            src_path = os.path.join(snapshot, rel_path)
+            shutil.copy2(src_path, path, follow_symlinks=False)
+            result.files += 1
+            result.bytes += os.lstat(src_path).st_size
+
+    # Chunked backups
+
+    def _restore_chunks(self, manifest_path, patterns, target, result):
+        store = ChunkStore(os.path.dirname(os.path.dirname(os.path.dirname(manifest_path))))
+        for entry in store.load_manifest(manifest_path)['entries']:
+            if entry['type'] != 'file' or not matches(entry['path'], patterns):
+                continue
+            path = self._open_target(target, entry['path'], result)
+            if path is None:
+                continue
+            with open(path, 'wb') as out:
+                for digest in entry['chunks']:
+                    out.write(store.read_chunk(digest))
+            self._finish_file(path, entry['size'], entry['mode'], entry['mtime_ns'] / 1e9, result)
+
+    # Archives
+
+    def _decompressed(self, raw, archive_format):
+        """Return a stream decompressing raw from its current position on"""
+        if archive_format == 'tar.zst':
+            if zstandard is None:
+                raise RuntimeError("Restoring from tar.zst backups requires the 'zstandard' package")
+            return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        # GzipFile reads the concatenated per-block gzip members as one stream
+        return gzip.GzipFile(fileobj=raw)
+
+    def _skip(self, stream, count):
+        while count > 0:
+            data = stream.read(min(COPY_BUFFER_SIZE, count))
+            if not data:
+                raise EOFError("Archive ended early")
+            count -= len(data)
+
+    def _restore_indexed_archive(self, archive_path, patterns, target, result):
+        with open(member_index_path(archive_path), 'r') as f:
+            index = json.load(f)
+        block_size = index['block_size']
+        selected = sorted((member for member in index['members']
+                           if member[1] == 'file' and matches(member[0], patterns)),
+                          key=lambda member: member[2])
+        with open(archive_path, 'rb') as raw:
+            stream = None
+            position = 0
+            for name, _, offset, size, mode, mtime in selected:
+                path = self._open_target(target, name, result)
+                if path is None:
+                    continue
+                if stream is None or offset < position or offset - position > block_size:
+                    # Jump to the block holding this member instead of reading up to it
+                    block = offset // block_size
+                    raw.seek(index['blocks'][block])
+                    stream = self._decompressed(raw, index['format'])
+                    position = block * block_size
+                self._skip(stream, offset - position)
+                remaining = size
+                with open(path, 'wb') as out:
+                    while remaining > 0:
+                        data = stream.read(min(COPY_BUFFER_SIZE, remaining))
+                        if not data:
+                            raise EOFError("Archive ended early")
+                        out.write(data)
+                        remaining -= len(data)
+                position = offset + size
+                self._finish_file(path, size, mode, mtime, result)
+
+    def _restore_archive_stream(self, archive_path, archive_format, patterns, target, result):
+        """Fallback for archives without a member index: read the whole stream"""
+        with open(archive_path, 'rb') as raw:
+            with tarfile.open(fileobj=self._decompressed(raw, archive_format), mode='r|') as archive:
+                for member in archive:
+                    name = os.path.normpath(member.name)
+                    if not member.isfile() or not matches(name, patterns):
+                        continue
+                    path = self._open_target(target, name, result)
+                    if path is None:
+                        continue
+                    with open(path, 'wb') as out:
+                        shutil.copyfileobj(archive.extractfile(member), out, COPY_BUFFER_SIZE)
+                    self._finish_file(path, member.size, member.mode, member.mtime, result)
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Backup Retention - keep-last / daily / weekly / monthly pruning of old backups
+Decides which backups of a source to keep and deletes the rest with a pool of
+threads, including chunks no chunk-store manifest uses any more
+"""
+
+import os
+import re
+import time
+import threading
+from collections import namedtuple
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from backup_archive import ARCHIVE_FORMATS, MEMBER_INDEX_SUFFIX
+from backup_engine import find_snapshots
+from backup_store import ChunkStore
+
+DEFAULT_PRUNE_WORKERS = 16
+
+# Retention settings stored in backup_config.json; 0 means "no limit of this kind"
+RETENTION_KEYS = ('keep_last', 'keep_daily', 'keep_weekly', 'keep_monthly')
+
+# Unreferenced chunks younger than this are left alone: a backup running right
+# now may be about to reference them in a manifest it has not written yet
+CHUNK_GRACE_SECONDS = 24 * 60 * 60
+
+# Files written next to an archive or chunk manifest for the same backup
+SIDECAR_SUFFIXES = ('.b2', '.cleaned.txt', MEMBER_INDEX_SUFFIX)
+
+# kind is the backup format: 'folder', 'chunks' or one of the archive formats
+Backup = namedtuple('Backup', ['path', 'time', 'kind'])
+
+_TIMESTAMP = re.compile(r'_backup_(\d{8}_\d{6})')
+
+def retention_enabled(options):
+    """True if any retention limit is set"""
+    return any(options.get(key) for key in RETENTION_KEYS)
+
+def _backup_time(path):
+    match = _TIMESTAMP.search(os.path.basename(path))
+    return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+
+def list_backups(backup_location, source_folder):
+    """Return every backup of source_folder in backup_location (folders, archives, chunk manifests), oldest first"""
+    source_name = os.path.basename(os.path.normpath(source_folder))
+    backups = [Backup(path, _backup_time(path), 'folder')
+               for path in find_snapshots(backup_location, source_folder)]
+    archive_pattern = re.compile(re.escape(source_name) + r'_backup_\d{8}_\d{6}\.('
+                                 + '|'.join(re.escape(fmt) for fmt in ARCHIVE_FORMATS) + r')$')
+    try:
+        with os.scandir(backup_location) as entries:
+            for entry in entries:
+                match = archive_pattern.match(entry.name)
+                if match and entry.is_file(follow_symlinks=False):
+                    backups.append(Backup(entry.path, _backup_time(entry.path), match.group(1)))
+    except OSError:
+        pass
+    for path in ChunkStore(backup_location).list_manifests(source_name):
+        backups.append(Backup(path, _backup_time(path), 'chunks'))
+    backups.sort(key=lambda backup: (backup.time, backup.path))
+    return backups
+
+def plan(backups, options):
+    """Split backups into (keep, prune) lists according to the retention options
+
+    keep_last keeps the N newest backups. keep_daily, keep_weekly and
+    keep_monthly keep the newest backup of each of the N most recent days,
+    ISO weeks and months that have one. A backup kept by any rule is kept,
+    and the newest backup is always kept. With no limits set nothing is
+    pruned.
+    """
+    if not retention_enabled(options) or not backups:
+        return list(backups), []
+    newest_first = sorted(backups, key=lambda backup: backup.time, reverse=True)
+    keep = {newest_first[0].path}
+    keep.update(backup.path for backup in newest_first[:options.get('keep_last') or 0])
+    buckets = {
+        'keep_daily': lambda t: t.date(),
+        'keep_weekly': lambda t: t.isocalendar()[:2],
+        'keep_monthly': lambda t: (t.year, t.month),
+    }
+    for key, bucket_of in buckets.items():
+        limit = options.get(key) or 0
+        seen = set()
+        for backup in newest_first:
+            if len(seen) >= limit:
+                break
+            bucket = bucket_of(backup.time)
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(backup.path)
+    return ([backup for backup in backups if backup.path in keep],
+            [backup for backup in backups if backup.path not in keep])
+
+class PruneResult:
+    """Outcome of applying retention to one source"""
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.kept = []
+        self.pruned = []
+        self.chunks_removed = 0
+        # Folders an interrupted earlier prune left renamed to .deleting
+        self.leftovers = []
+        self.errors = []
+        self.seconds = 0.0
+
+    def summary(self):
+        leftovers = f"{len(self.leftovers)} left over from an interrupted prune"
+        if self.dry_run:
+            summary = f"Would prune {len(self.pruned)} of {len(self.kept) + len(self.pruned)} backups"
+            return summary + (f" and remove {leftovers}" if self.leftovers else "")
+        summary = (f"Pruned {len(self.pruned)} old backups, kept {len(self.kept)} "
+                   f"in {self.seconds:.1f}s")
+        if self.leftovers:
+            summary += f", removed {leftovers}"
+        if self.chunks_removed:
+            summary += f", removed {self.chunks_removed} unused chunks"
+        if self.errors:
+            summary += f", {len(self.errors)} errors"
+        return summary
+
+class Pruner:
+    """Delete the backups a retention plan drops, using a pool of threads
+
+    Snapshot folders are first renamed to <name>.deleting so a half-deleted
+    tree is never mistaken for a snapshot, then all of their files are
+    unlinked in parallel and the emptied directories removed deepest first.
+    Such folders left behind by an interrupted prune are removed by the
+    next one. After chunk manifests are pruned, chunks no remaining
+    manifest refers to are deleted as well.
+    """
+    def __init__(self, workers=DEFAULT_PRUNE_WORKERS):
+        self.workers = max(1, int(workers))
+
+    def prune(self, backup_location, source_folder, options, dry_run=False):
+        start = time.monotonic()
+        result = PruneResult(dry_run)
+        result.kept, result.pruned = plan(list_backups(backup_location, source_folder), options)
+        result.leftovers = self._leftovers(backup_location, source_folder)
+        if dry_run or not (result.pruned or result.leftovers):
+            return result
+
+        folders = list(result.leftovers)
+        files = []
+        for backup in result.pruned:
+            if backup.kind == 'folder':
+                doomed = backup.path + '.deleting'
+                try:
+                    os.rename(backup.path, doomed)
+                    folders.append(doomed)
+                except OSError as e:
+                    result.errors.append((backup.path, str(e)))
+            else:
+                files.append(backup.path)
+                files.extend(path for path in (backup.path + suffix for suffix in SIDECAR_SUFFIXES)
+                             if os.path.exists(path))
+
+        dirs = []
+        for folder in folders:
+            for dirpath, dirnames, filenames in os.walk(folder):
+                dirs.append(dirpath)
+                files.extend(os.path.join(dirpath, name) for name in filenames)
+                # Symlinks to directories are unlinked, not descended into
+                files.extend(os.path.join(dirpath, name) for name in dirnames
+                             if os.path.islink(os.path.join(dirpath, name)))
+        self._remove_files(files, result)
+        for path in sorted(dirs, key=lambda d: d.count(os.sep), reverse=True):
+            try:
+                os.rmdir(path)
+            except OSError as e:
+                result.errors.append((path, str(e)))
+
+        if any(backup.kind == 'chunks' for backup in result.pruned):
+            self._collect_chunks(ChunkStore(backup_location), result)
+        result.seconds = time.monotonic() - start
+        return result
+
+    def _leftovers(self, backup_location, source_folder):
+        """Return the .deleting folders of source_folder's snapshots in backup_location"""
+        prefix = os.path.basename(os.path.normpath(source_folder)) + '_backup_'
+        try:
+            with os.scandir(backup_location) as entries:
+                return sorted(entry.path for entry in entries
+                              if entry.name.startswith(prefix) and entry.name.endswith('.deleting')
+                              and _TIMESTAMP.search(entry.name)
+                              and entry.is_dir(follow_symlinks=False))
+        except OSError:
+            return []
+
+    def _remove_files(self, paths, result):
+        def remove(path):
+            try:
+                os.unlink(path)
+                return None
+            except FileNotFoundError:
+                return None
+            except OSError as e:
+                return path, str(e)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            result.errors.extend(error for error in pool.map(remove, paths, chunksize=64) if error)
+
+    def _collect_chunks(self, store, result):
+        """Delete chunks that no manifest in the store refers to"""
+        referenced = set()
+        for name in os.listdir(store.manifests_dir):
+            if name.endswith('.json'):
+                for entry in store.load_manifest(os.path.join(store.manifests_dir, name))['entries']:
+                    referenced.update(entry.get('chunks', ()))
+        cutoff = time.time() - CHUNK_GRACE_SECONDS
+        unused = []
+        for prefix in os.listdir(store.chunks_dir):
+            prefix_dir = os.path.join(store.chunks_dir, prefix)
+            with os.scandir(prefix_dir) as entries:
+                for entry in entries:
+                    if (entry.name not in referenced and not entry.name.endswith('.tmp')
+                            and entry.stat().st_mtime < cutoff):
+                        unused.append(entry.path)
+        before = len(result.errors)
+        self._remove_files(unused, result)
+        result.chunks_removed = len(unused) - (len(result.errors) - before)
+
+def prune_in_background(backup_location, source_folder, options, on_done=None):
+    """Run the pruner on its own thread so it never holds up a backup or the scheduler
+
+    on_done(result), if given, is called from that thread when pruning ends.
+    """
+    def run():
+        try:
+            result = Pruner().prune(backup_location, source_folder, options)
+        except Exception as e:
+            print(f"Pruning old backups failed: {e}")
+            return
+        if on_done is not None:
+            on_done(result)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
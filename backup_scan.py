@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Backup Scan - fast concurrent size estimate of a source folder
+Scans directories in parallel with os.scandir so a backup can be sized (for
+ETAs and free-space checks) before anything is copied
+"""
+
+import os
+import time
+import shutil
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+ScanResult = namedtuple('ScanResult', ['files', 'bytes', 'dirs', 'errors', 'seconds'])
+
+# Keep this much free space on top of the estimate, and cache scans this long
+SPACE_MARGIN = 64 * 1024 * 1024
+CACHE_SECONDS = 300
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+def _scan_dir(path, rel_dir='', path_filter=None):
+    """Return (files, bytes, subdirectories, errors) for a single directory"""
+    files = 0
+    size = 0
+    subdirs = []
+    errors = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                    rel_path = os.path.join(rel_dir, entry.name)
+                    if path_filter is not None and path_filter.excluded(rel_path, is_dir):
+                        continue
+                    if is_dir:
+                        st = entry.stat()
+                        subdirs.append((entry.path, rel_path, (st.st_dev, st.st_ino)))
+                    else:
+                        files += 1
+                        size += entry.stat().st_size
+                except OSError:
+                    errors += 1
+    except OSError:
+        errors += 1
+    return files, size, subdirs, errors
+
+def scan_tree(source_folder, workers=8, path_filter=None):
+    """Count the files and bytes under source_folder using a pool of scanners
+
+    Symlinked directories are followed like the copy engine does, but each
+    directory is only scanned once so symlink loops cannot run away. Paths
+    a PathFilter excludes are not counted, nor are excluded folders scanned.
+    """
+    start = time.monotonic()
+    files = size = errors = 0
+    dirs = 1
+    root_stat = os.stat(source_folder)
+    visited = {(root_stat.st_dev, root_stat.st_ino)}
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {pool.submit(_scan_dir, source_folder, '', path_filter)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                dir_files, dir_size, subdirs, dir_errors = future.result()
+                files += dir_files
+                size += dir_size
+                errors += dir_errors
+                for subdir, rel_path, key in subdirs:
+                    if key in visited:
+                        continue
+                    visited.add(key)
+                    dirs += 1
+                    pending.add(pool.submit(_scan_dir, subdir, rel_path, path_filter))
+    return ScanResult(files, size, dirs, errors, time.monotonic() - start)
+
+def estimate(source_folder, workers=8, max_age=CACHE_SECONDS, path_filter=None):
+    """Return a ScanResult for source_folder, reusing a recent scan with the same filter"""
+    key = (os.path.abspath(source_folder), path_filter.rules if path_filter is not None else ())
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+    if cached and now - cached[0] < max_age:
+        return cached[1]
+    result = scan_tree(source_folder, workers, path_filter)
+    with _cache_lock:
+        _cache[key] = (time.monotonic(), result)
+    return result
+
+def check_free_space(scan, backup_location, options):
+    """Compare the estimate with the free space at backup_location
+
+    Returns (status, message) where status is 'ok', 'warn' or 'refuse'.
+    Full folder backups need the whole estimate and are refused when it does
+    not fit; incremental, chunked and compressed backups usually need less,
+    so for them a shortfall is only a warning.
+    """
+    free = shutil.disk_usage(backup_location).free
+    needed = scan.bytes + SPACE_MARGIN
+    if needed <= free:
+        return 'ok', ""
+    message = (f"Backup needs up to {scan.bytes / (1024 * 1024):.1f} MB but only "
+               f"{free / (1024 * 1024):.1f} MB is free at {backup_location}")
+    full_copy = options.get('backup_format', 'folder') == 'folder' and not options.get('incremental')
+    return ('refuse' if full_copy else 'warn'), message
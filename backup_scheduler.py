@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Backup Scheduler - event-driven weekly scheduler shared by all front-ends
+Keeps jobs in a heap ordered by next fire time and sleeps until the earliest
+one is due, waking early whenever the schedule changes or a continuous job's
+source changes
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+
+DAY_CODES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+# Upper bound on a single sleep. Monotonic timeouts stop during system
+# suspend, so the wall clock is re-checked at least this often to catch up
+# on runs that fell due while the machine was asleep.
+MAX_SLEEP = 600
+
+DEFAULT_DEBOUNCE = 10
+
+def next_fire_time(days, time_str, after):
+    """Return the first datetime strictly after `after` on one of days at time_str (HH:MM)"""
+    hour, minute = (int(part) for part in time_str.split(':'))
+    for offset in range(8):
+        day = after.date() + timedelta(days=offset)
+        if DAY_CODES[day.weekday()] not in days:
+            continue
+        candidate = datetime(day.year, day.month, day.day, hour, minute)
+        if candidate > after:
+            return candidate
+    return None
+
+class ContinuousTrigger:
+    """Runs a job soon after its source changes, at most once per interval
+
+    changed() records a change. The job fires once changes have been quiet
+    for debounce seconds, or interval seconds after the first change if
+    writes keep coming, but never sooner than interval seconds after its
+    previous run, so a burst of writes costs one backup. If func returns
+    False (the job is still running) the changes stay pending and the job
+    is tried again an interval later.
+    """
+    def __init__(self, func, interval, debounce, condition):
+        self.func = func
+        self.interval = max(1, interval)
+        self.debounce = max(0, min(debounce, self.interval))
+        self._condition = condition
+        self._first_change = None
+        self._last_change = None
+        self._last_run = None
+
+    def changed(self):
+        """Record a change in the source (safe to call from any thread)"""
+        with self._condition:
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+            self._condition.notify()
+
+    def _due_in(self, now):
+        """Seconds until the job should run, or None if nothing changed (lock held)"""
+        if self._first_change is None:
+            return None
+        due = min(self._last_change + self.debounce, self._first_change + self.interval)
+        if self._last_run is not None:
+            due = max(due, self._last_run + self.interval)
+        return max(0, due - now)
+
+    def _take(self, now):
+        pending = (self._first_change, self._last_change)
+        self._first_change = self._last_change = None
+        self._last_run = now
+        return pending
+
+    def _put_back(self, pending):
+        first_change, last_change = pending
+        if self._first_change is None:
+            self._first_change, self._last_change = first_change, last_change
+        else:
+            self._first_change = min(self._first_change, first_change)
+
+class BackupScheduler:
+    """Heap-based replacement for the old polling SimpleScheduler
+
+    add_job()/clear() keep the SimpleScheduler interface. start() runs a
+    background thread that waits on a condition variable until the next job
+    is due (or the schedule changes), runs it, and reschedules it. A job whose
+    fire time passed while the process was suspended runs once on wake-up.
+    add_continuous() adds a job driven by source changes instead of the
+    clock; it runs on the same thread.
+    """
+    def __init__(self):
+        self.jobs = []
+        self.triggers = []
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def add_job(self, days, time_str, func):
+        """Add a scheduled job"""
+        job = {'days': list(days), 'time': time_str, 'func': func}
+        fire_at = next_fire_time(job['days'], time_str, datetime.now())
+        if fire_at is None:
+            return
+        with self._condition:
+            self.jobs.append(job)
+            heapq.heappush(self._heap, (fire_at, next(self._counter), job))
+            self._condition.notify()
+
+    def add_continuous(self, func, interval, debounce=DEFAULT_DEBOUNCE):
+        """Add a job run after source changes; call changed() on the returned ContinuousTrigger"""
+        trigger = ContinuousTrigger(func, interval, debounce, self._condition)
+        with self._condition:
+            self.triggers.append(trigger)
+            self._condition.notify()
+        return trigger
+
+    def clear(self):
+        """Clear all scheduled jobs"""
+        with self._condition:
+            self.jobs = []
+            self.triggers = []
+            self._heap = []
+            self._condition.notify()
+
+    def next_run(self):
+        """Return the datetime of the next scheduled run, or None"""
+        with self._condition:
+            return self._heap[0][0] if self._heap else None
+
+    @property
+    def running(self):
+        return self._running
+
+    def start(self):
+        """Start the scheduler thread"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1):
+        """Stop the scheduler thread"""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def run_pending(self):
+        """Run every job that is due now (for callers driving their own loop)"""
+        for job in self._pop_due():
+            self._run_job(job)
+
+    def _pop_due(self):
+        """Remove and reschedule all due jobs, returning them"""
+        now = datetime.now()
+        due = []
+        with self._condition:
+            while self._heap and self._heap[0][0] <= now:
+                fire_at, _, job = heapq.heappop(self._heap)
+                due.append(job)
+                # Missed fire times collapse into this single catch-up run
+                next_at = next_fire_time(job['days'], job['time'], now)
+                if next_at is not None:
+                    heapq.heappush(self._heap, (next_at, next(self._counter), job))
+        return due
+
+    def _pop_due_triggers(self):
+        """Return (trigger, pending changes) for every continuous job due now"""
+        now = time.monotonic()
+        with self._condition:
+            return [(trigger, trigger._take(now)) for trigger in self.triggers
+                    if trigger._due_in(now) == 0]
+
+    def _run_trigger(self, trigger, pending):
+        try:
+            queued = trigger.func()
+        except Exception as e:
+            print(f"Continuous backup failed: {e}")
+            queued = True
+        if queued is False:
+            with self._condition:
+                trigger._put_back(pending)
+
+    def _delay(self):
+        """Seconds until the next job or trigger is due, or None if there is none (lock held)"""
+        delays = []
+        if self._heap:
+            delays.append((self._heap[0][0] - datetime.now()).total_seconds())
+        now = time.monotonic()
+        delays.extend(delay for delay in (trigger._due_in(now) for trigger in self.triggers)
+                      if delay is not None)
+        return min(delays) if delays else None
+
+    def _run_job(self, job):
+        print(f"Running scheduled backup at {datetime.now().strftime('%H:%M')}")
+        try:
+            job['func']()
+        except Exception as e:
+            print(f"Scheduled backup failed: {e}")
+
+    def _run(self):
+        """Scheduler loop: sleep until the next job is due, then run it"""
+        while True:
+            with self._condition:
+                if not self._running:
+                    return
+                delay = self._delay()
+                if delay is None:
+                    # Nothing scheduled or changed: sleep until notified
+                    self._condition.wait()
+                    continue
+                if delay > 0:
+                    self._condition.wait(timeout=min(delay, MAX_SLEEP))
+                    continue
+            # Run jobs outside the lock so the schedule can change meanwhile
+            for job in self._pop_due():
+                self._run_job(job)
+            for trigger, pending in self._pop_due_triggers():
+                self._run_trigger(trigger, pending)
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+"""
+Backup Store - content-addressed, deduplicating chunk repository
+Files are split into content-defined chunks stored once by hash; each backup
+is a small JSON manifest listing the chunks of every file
+"""
+
+import os
+import json
+import shutil
+import zlib
+import hashlib
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from backup_metrics import SlowestFiles
+from backup_progress import check_cancelled
+from backup_throttle import set_io_priority
+
+STORE_DIR = "chunk_store"
+
+# Content-defined chunking parameters (average chunk size ~1 MiB)
+CHUNK_MIN = 256 * 1024
+CHUNK_MAX = 4 * 1024 * 1024
+CHUNK_WINDOW = 48
+CHUNK_MASK = (1 << 8) - 1
+# Bytes classified per step while looking for a boundary
+CHUNK_SCAN = 256 * 1024
+
+def _class_table():
+    """Map the 256 byte values onto 16 classes, each run of 16 consecutive values covering all of them
+
+    Text uses runs of consecutive values (digits, letters), so its bytes
+    still spread evenly over the classes. The order within a run is fixed
+    and pseudo-random.
+    """
+    table = bytearray(256)
+    for base in range(0, 256, 16):
+        run = sorted(range(16), key=lambda offset: hashlib.blake2b(bytes([base + offset])).digest())
+        for cls, offset in enumerate(run):
+            table[base + offset] = cls
+    return bytes(table)
+
+# bytes.translate table mapping every byte to its class
+CHUNK_CLASSES = _class_table()
+# Classes of the last bytes before a candidate boundary (1 in 4096 positions)
+CHUNK_PATTERN = b'\x03\x0a\x05'
+
+def find_cut(data):
+    """Return the length of the first content-defined chunk at the start of data
+
+    Every byte position is considered. The data is translated to one of 16
+    classes per byte and the positions where the last bytes' classes spell
+    CHUNK_PATTERN are located with bytes.find, so the scan runs at C speed
+    on any data, with or without line breaks. A candidate becomes a
+    boundary when the CRC of the window of bytes ending there has its low
+    bits all zero. Boundaries depend only on nearby content, so an
+    insertion shifts them locally and the remaining chunks still
+    deduplicate. Data without variation (e.g. all zeros) is cut at
+    CHUNK_MAX, into identical chunks.
+    """
+    size = len(data)
+    if size <= CHUNK_MIN:
+        return size
+    end = min(size, CHUNK_MAX)
+    view = memoryview(data)
+    width = len(CHUNK_PATTERN)
+    # Translate a piece at a time: most chunks end well before CHUNK_MAX
+    start = CHUNK_MIN + 1 - width
+    while True:
+        stop = min(end, start + CHUNK_SCAN)
+        classes = data[start:stop].translate(CHUNK_CLASSES)
+        pos = classes.find(CHUNK_PATTERN)
+        while pos != -1:
+            cut = start + pos + width
+            if not zlib.crc32(view[cut - CHUNK_WINDOW:cut]) & CHUNK_MASK:
+                return cut
+            pos = classes.find(CHUNK_PATTERN, pos + 1)
+        if stop == end:
+            return end
+        # Overlap so a pattern straddling the two pieces is still found
+        start = stop - width + 1
+
+def iter_chunks(path):
+    """Yield the content-defined chunks of a file without reading it all at once"""
+    with open(path, 'rb') as f:
+        buf = b''
+        eof = False
+        while not eof or buf:
+            if not eof and len(buf) < CHUNK_MAX:
+                data = f.read(CHUNK_MAX)
+                if data:
+                    buf += data
+                    continue
+                eof = True
+                # An empty file has no chunks
+                continue
+            cut = find_cut(buf)
+            yield buf[:cut]
+            buf = buf[cut:]
+
+def store_path(backup_location):
+    """Return the chunk repository folder inside backup_location"""
+    return os.path.join(backup_location, STORE_DIR)
+
+class ChunkStats:
+    """Counters for a chunk store backup"""
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.dirs = 0
+        self.reused = 0
+        self.new_chunks = 0
+        self.new_bytes = 0
+        self.slowest = SlowestFiles()
+        self._lock = threading.Lock()
+
+    def add_file(self, size, reused=False):
+        with self._lock:
+            self.files += 1
+            self.bytes += size
+            if reused:
+                self.reused += 1
+
+    def add_chunk(self, size):
+        with self._lock:
+            self.new_chunks += 1
+            self.new_bytes += size
+
+    def summary(self):
+        """One-line description of the run"""
+        return (f"Backed up {self.files} files ({self.bytes / (1024 * 1024):.1f} MB), "
+                f"{self.reused} unchanged files reused, {self.new_chunks} new chunks "
+                f"({self.new_bytes / (1024 * 1024):.1f} MB) stored")
+
+class ChunkStore:
+    """Deduplicating repository of chunks and manifests
+
+    Layout inside backup_location/chunk_store:
+        chunks/ab/abcd...   one file per chunk, named by its BLAKE2b hash
+        manifests/<name>_backup_<timestamp>.json   one manifest per backup
+    """
+    def __init__(self, backup_location):
+        self.root = store_path(backup_location)
+        self.chunks_dir = os.path.join(self.root, "chunks")
+        self.manifests_dir = os.path.join(self.root, "manifests")
+
+    def init(self):
+        """Create the repository folders if needed"""
+        os.makedirs(self.chunks_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+    def manifest_path(self, snapshot_name):
+        return os.path.join(self.manifests_dir, f"{snapshot_name}.json")
+
+    def chunk_path(self, digest):
+        return os.path.join(self.chunks_dir, digest[:2], digest)
+
+    def list_manifests(self, source_name):
+        """Return the manifest paths for source_name, oldest first"""
+        prefix = f"{source_name}_backup_"
+        try:
+            names = sorted(name for name in os.listdir(self.manifests_dir)
+                           if name.startswith(prefix) and name.endswith('.json'))
+        except OSError:
+            return []
+        return [os.path.join(self.manifests_dir, name) for name in names]
+
+    def load_manifest(self, path):
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def put_chunk(self, data, stats=None):
+        """Store a chunk unless it already exists and return its hash"""
+        digest = hashlib.blake2b(data, digest_size=32).hexdigest()
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            # Refresh the mtime so pruning never collects a chunk a running backup reuses
+            try:
+                os.utime(path)
+                return digest
+            except FileNotFoundError:
+                pass
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a unique temporary name so concurrent writers never see half a chunk
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if stats is not None:
+            stats.add_chunk(len(data))
+        return digest
+
+    def read_chunk(self, digest):
+        with open(self.chunk_path(digest), 'rb') as f:
+            return f.read()
+
+    def backup_tree(self, source_folder, snapshot_name, workers=4, previous_manifest=None,
+                    progress=None, checksums=None, cancel=None, throttle=None, io_nice=None,
+                    path_filter=None):
+        """Store source_folder as a new manifest and return (manifest_path, stats)
+
+        Files whose size and mtime match the previous manifest reuse its chunk
+        list without being read. Each file entry carries the BLAKE2b hash of
+        the whole file, computed from the chunks as they are read, and is
+        also passed to checksums (a ManifestWriter) if one is given. Setting
+        the cancel event stops the backup with BackupCancelled before the
+        manifest is written; chunks already stored are left for pruning.
+        A Throttle limits the files and chunk bytes read per second, and
+        io_nice lowers the I/O priority of the worker threads. Paths a
+        PathFilter excludes are left out, and excluded folders are not walked.
+        Symlinked folders are followed, as in folder backups. A file or
+        folder that cannot be read is left out and the backup carries on;
+        the manifest is still written and shutil.Error lists them at the end.
+        """
+        self.init()
+        stats = ChunkStats()
+        previous = {}
+        if previous_manifest:
+            for entry in self.load_manifest(previous_manifest)['entries']:
+                if entry['type'] == 'file':
+                    previous[entry['path']] = entry
+
+        entries = []
+        files = []
+        errors = []
+        errors_lock = threading.Lock()
+
+        def add_error(path, rel_path, why):
+            with errors_lock:
+                errors.append((path, rel_path, str(why)))
+
+        for dirpath, dirnames, filenames in os.walk(
+                source_folder, followlinks=True,
+                onerror=lambda e: add_error(e.filename, os.path.relpath(e.filename, source_folder), e)):
+            check_cancelled(cancel)
+            rel_dir = os.path.relpath(dirpath, source_folder)
+            if path_filter is not None:
+                prefix = '' if rel_dir == '.' else rel_dir
+                dirnames[:] = [name for name in dirnames
+                               if not path_filter.excluded(os.path.join(prefix, name), True)]
+                filenames = [name for name in filenames
+                             if not path_filter.excluded(os.path.join(prefix, name))]
+            try:
+                dir_stat = os.stat(dirpath)
+            except OSError as why:
+                add_error(dirpath, rel_dir, why)
+                dirnames[:] = []
+                continue
+            entries.append({'path': rel_dir, 'type': 'dir',
+                            'mode': dir_stat.st_mode & 0o7777,
+                            'mtime_ns': dir_stat.st_mtime_ns})
+            stats.dirs += 1
+            for name in filenames:
+                files.append((os.path.join(dirpath, name),
+                              os.path.normpath(os.path.join(rel_dir, name))))
+                if progress is not None:
+                    try:
+                        progress.add_total(os.path.getsize(files[-1][0]))
+                    except OSError:
+                        pass
+
+        def store_file(item):
+            try:
+                return read_file(*item)
+            except OSError as why:
+                add_error(*item, why)
+                return None
+
+        def read_file(src_path, rel_path):
+            check_cancelled(cancel)
+            if throttle is not None:
+                throttle.consume_file()
+            started = time.monotonic()
+            src_stat = os.stat(src_path)
+            entry = {'path': rel_path, 'type': 'file',
+                     'mode': src_stat.st_mode & 0o7777,
+                     'mtime_ns': src_stat.st_mtime_ns,
+                     'size': src_stat.st_size}
+            old = previous.get(rel_path)
+            if (old and old['size'] == entry['size'] and old['mtime_ns'] == entry['mtime_ns']
+                    and old.get('hash')):
+                entry['chunks'] = old['chunks']
+                entry['hash'] = old['hash']
+                stats.add_file(entry['size'], reused=True)
+            else:
+                digest = hashlib.blake2b()
+                entry['chunks'] = []
+                for chunk in iter_chunks(src_path):
+                    check_cancelled(cancel)
+                    if throttle is not None:
+                        throttle.consume_bytes(len(chunk))
+                    digest.update(chunk)
+                    entry['chunks'].append(self.put_chunk(chunk, stats))
+                entry['hash'] = digest.hexdigest()
+                stats.add_file(entry['size'])
+            if checksums is not None:
+                checksums.add(rel_path, entry['hash'])
+            stats.slowest.add(time.monotonic() - started, rel_path, entry['size'])
+            if progress is not None:
+                progress.advance(entry['size'])
+            return entry
+
+        with ThreadPoolExecutor(max_workers=max(1, workers),
+                                initializer=set_io_priority if io_nice else None,
+                                initargs=(io_nice,) if io_nice else ()) as pool:
+            entries.extend(entry for entry in pool.map(store_file, files) if entry is not None)
+
+        manifest = {
+            'source': os.path.abspath(source_folder),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'entries': entries,
+        }
+        manifest_path = self.manifest_path(snapshot_name)
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+        if errors:
+            raise shutil.Error(errors)
+        return manifest_path, stats
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Backup Throttle - shared rate limits and I/O priority for backup workers
+Token buckets cap the MB/s and files/s of all workers of a backup together,
+the limits can change while a backup runs, and worker threads can lower
+their own I/O scheduling priority (like ionice)
+"""
+
+import os
+import json
+import time
+import ctypes
+import platform
+import threading
+
+# Config keys; 0 or '' means unlimited / unchanged
+THROTTLE_KEYS = ('max_mb_per_s', 'max_files_per_s', 'io_nice')
+
+# How often a throttle watching the config file checks it for new limits
+WATCH_INTERVAL = 2.0
+
+# ioprio_set(2) - not wrapped by the os module
+_IOPRIO_SET = {'x86_64': 251, 'i386': 289, 'i686': 289, 'aarch64': 30, 'armv7l': 314, 'armv6l': 314}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_CLASS_BE = 2
+_IOPRIO_CLASS_IDLE = 3
+
+class TokenBucket:
+    """Thread-safe token bucket; rate <= 0 means unlimited
+
+    consume() takes tokens and sleeps for as long as the bucket is in
+    debt, so callers sharing a bucket are slowed down together. The bucket
+    holds at most one second's worth of tokens, which bounds bursts.
+    """
+    def __init__(self, rate=0):
+        self.rate = float(rate or 0)
+        self._tokens = self.rate
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self.rate = float(rate or 0)
+            self._tokens = min(self._tokens, self.rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def consume(self, amount):
+        with self._lock:
+            if self.rate <= 0:
+                return
+            self._refill()
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+class Throttle:
+    """Byte and file rate limits shared by every worker of a backup
+
+    Workers call consume_bytes() for each piece of data they move and
+    consume_file() once per file. set_limits() takes effect immediately.
+    If config_file is given, it is checked every WATCH_INTERVAL seconds
+    and new max_mb_per_s / max_files_per_s values are applied on the fly.
+    """
+    def __init__(self, mb_per_s=0, files_per_s=0, config_file=None):
+        self.bytes = TokenBucket()
+        self.files = TokenBucket()
+        self.mb_per_s = 0
+        self.files_per_s = 0
+        self.set_limits(mb_per_s, files_per_s)
+        self.config_file = config_file
+        self._config_mtime = self._mtime()
+        self._next_check = time.monotonic() + WATCH_INTERVAL
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_options(cls, options, config_file=None):
+        return cls(options.get('max_mb_per_s') or 0, options.get('max_files_per_s') or 0, config_file)
+
+    @property
+    def active(self):
+        return self.mb_per_s > 0 or self.files_per_s > 0
+
+    def set_limits(self, mb_per_s=None, files_per_s=None):
+        if mb_per_s is not None:
+            self.mb_per_s = max(0, mb_per_s)
+            self.bytes.set_rate(self.mb_per_s * 1024 * 1024)
+        if files_per_s is not None:
+            self.files_per_s = max(0, files_per_s)
+            self.files.set_rate(self.files_per_s)
+
+    def consume_bytes(self, count):
+        self._check_config()
+        self.bytes.consume(count)
+
+    def consume_file(self):
+        self._check_config()
+        self.files.consume(1)
+
+    def _mtime(self):
+        try:
+            return os.stat(self.config_file).st_mtime_ns if self.config_file else None
+        except OSError:
+            return None
+
+    def _check_config(self):
+        """Pick up limits changed in the config file while a backup runs"""
+        if self.config_file is None or time.monotonic() < self._next_check:
+            return
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + WATCH_INTERVAL
+            mtime = self._mtime()
+            if mtime == self._config_mtime:
+                return
+            self._config_mtime = mtime
+            try:
+                with open(self.config_file, 'r') as f:
+                    config = json.load(f)
+            except (OSError, ValueError):
+                return
+        self.set_limits(config.get('max_mb_per_s') or 0, config.get('max_files_per_s') or 0)
+
+def parse_io_nice(value):
+    """Turn an io_nice setting into (class, level), or None to leave the priority alone
+
+    'idle' only uses the disk when nothing else does; 0-7 is a best-effort
+    level like ionice -c2 -n (7 is the lowest priority).
+    """
+    if value in (None, '', 'off', 'none'):
+        return None
+    if str(value).lower() == 'idle':
+        return _IOPRIO_CLASS_IDLE, 0
+    level = int(value)
+    if not 0 <= level <= 7:
+        raise ValueError("io_nice must be 'idle' or a level from 0 to 7")
+    return _IOPRIO_CLASS_BE, level
+
+def set_io_priority(io_nice):
+    """Lower the I/O priority of the calling thread (Linux); returns True if it was applied
+
+    Meant as a thread pool initializer for backup workers.
+    """
+    try:
+        priority = parse_io_nice(io_nice)
+    except ValueError:
+        return False
+    syscall_number = _IOPRIO_SET.get(platform.machine())
+    if priority is None or syscall_number is None or not platform.system() == 'Linux':
+        return False
+    io_class, level = priority
+    libc = ctypes.CDLL(None, use_errno=True)
+    # who=0 with IOPRIO_WHO_PROCESS means the calling thread
+    result = libc.syscall(syscall_number, _IOPRIO_WHO_PROCESS, 0,
+                          (io_class << _IOPRIO_CLASS_SHIFT) | level)
+    return result == 0
@@ -7,14 +7,15 @@ Clone of FOCUS Toolkit for backing up folders on a schedule
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import shutil
 import json
-import threading
-import time
 from datetime import datetime, timedelta
-import schedule
 from pathlib import Path
 
+from backup_engine import ENGINE_DEFAULTS, load_engine_options
+from backup_daemon import reload_daemon
+from backup_scheduler import DAY_CODES
+from backup_frontend import FrontendBackups, save_gui_config
+
 class BackupToolkit:
     def __init__(self, root):
         self.root = root
@@ -33,6 +34,7 @@ class BackupToolkit:
         self.auto_launch = False
         self.daily_backup_enabled = False
         self.clean_after_backup = False
+        self.engine_options = dict(ENGINE_DEFAULTS)
         
         # Load existing configuration
         self.load_config()
@@ -40,10 +42,12 @@ class BackupToolkit:
         # Setup GUI
         self.setup_gui()
         
-        # Start scheduler thread
-        self.scheduler_running = True
-        self.scheduler_thread = threading.Thread(target=self.run_scheduler, daemon=True)
-        self.scheduler_thread.start()
+        # Manual and scheduled backups go through the shared front-end backup flow
+        self.backups = FrontendBackups(self.root, self.config_file, self.engine_options,
+                                       self.backup_settings, self.show_backup_state)
+        
+        # Scheduled backups with the saved schedule
+        self.update_schedule()
         
     def setup_gui(self):
         # Title
@@ -211,88 +215,35 @@ class BackupToolkit:
         messagebox.showinfo("Schedule Saved", "Backup schedule has been updated!")
     
     def backup_now(self):
-        if not self.source_folder or not self.backup_location:
-            messagebox.showerror("Error", "Please select both source folder and backup location first!")
-            return
-        
-        if not os.path.exists(self.source_folder):
-            messagebox.showerror("Error", "Source folder does not exist!")
-            return
-        
-        if not os.path.exists(self.backup_location):
-            messagebox.showerror("Error", "Backup location does not exist!")
-            return
-        
-        # Run backup in a separate thread
-        backup_thread = threading.Thread(target=self._perform_backup, daemon=True)
-        backup_thread.start()
+        self.backups.backup_now()
     
-    def _perform_backup(self):
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            source_name = os.path.basename(self.source_folder)
-            backup_folder_name = f"{source_name}_backup_{timestamp}"
-            backup_path = os.path.join(self.backup_location, backup_folder_name)
-            
-            # Show progress (simplified)
-            self.root.after(0, lambda: messagebox.showinfo("Backup Started", "Backup in progress..."))
-            
-            # Perform the backup
-            shutil.copytree(self.source_folder, backup_path)
-            
-            # Clean source if option is enabled
-            if self.clean_after_backup and self.clean_var.get():
-                for item in os.listdir(self.source_folder):
-                    item_path = os.path.join(self.source_folder, item)
-                    if os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                    else:
-                        os.remove(item_path)
-            
-            self.root.after(0, lambda: messagebox.showinfo("Backup Complete", 
-                                                           f"Backup completed successfully!\nSaved to: {backup_path}"))
-            
-        except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Backup Failed", f"Error during backup: {str(e)}"))
-    
-    def update_schedule(self):
-        # Clear existing schedule
-        schedule.clear()
-        
-        # Add new scheduled jobs
-        if self.selected_days and self.backup_time:
-            try:
-                for day in self.selected_days:
-                    if day == 'mon':
-                        schedule.every().monday.at(self.backup_time).do(self._scheduled_backup)
-                    elif day == 'tue':
-                        schedule.every().tuesday.at(self.backup_time).do(self._scheduled_backup)
-                    elif day == 'wed':
-                        schedule.every().wednesday.at(self.backup_time).do(self._scheduled_backup)
-                    elif day == 'thu':
-                        schedule.every().thursday.at(self.backup_time).do(self._scheduled_backup)
-                    elif day == 'fri':
-                        schedule.every().friday.at(self.backup_time).do(self._scheduled_backup)
-                    elif day == 'sat':
-                        schedule.every().saturday.at(self.backup_time).do(self._scheduled_backup)
-                    elif day == 'sun':
-                        schedule.every().sunday.at(self.backup_time).do(self._scheduled_backup)
-                
-                # Add daily backup if enabled
-                if self.daily_backup_enabled and self.daily_backup_var.get():
-                    schedule.every().day.at(self.backup_time).do(self._scheduled_backup)
-                    
-            except Exception as e:
-                print(f"Error setting up schedule: {e}")
+    def backup_settings(self):
+        """Folders and options for the next backup"""
+        return {
+            'source_folder': self.source_folder,
+            'backup_location': self.backup_location,
+            'engine_options': self.engine_options,
+            'clean': self.clean_after_backup and self.clean_var.get(),
+        }
     
-    def _scheduled_backup(self):
-        if self.source_folder and self.backup_location:
-            self._perform_backup()
+    def show_backup_state(self, kind, title, message):
+        """Report a backup's progress to the user (status-only changes have no message)"""
+        if message is None:
+            return
+        if kind == 'error':
+            messagebox.showerror(title, message)
+        else:
+            messagebox.showinfo(title, message)
     
-    def run_scheduler(self):
-        while self.scheduler_running:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+    def update_schedule(self):
+        days = self.selected_days
+        # A daily backup runs on every day of the week
+        if self.daily_backup_enabled and self.daily_backup_var.get():
+            days = DAY_CODES
+        try:
+            self.backups.set_schedule(days, self.backup_time)
+        except ValueError as e:
+            print(f"Error setting up schedule: {e}")
     
     def load_config(self):
         try:
@@ -306,6 +257,7 @@ class BackupToolkit:
                     self.auto_launch = config.get('auto_launch', False)
                     self.daily_backup_enabled = config.get('daily_backup_enabled', False)
                     self.clean_after_backup = config.get('clean_after_backup', False)
+                    self.engine_options = load_engine_options(config)
         except Exception as e:
             print(f"Error loading config: {e}")
     
@@ -321,8 +273,12 @@ class BackupToolkit:
         }
         
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            # Only the settings above are written; the rest of the file (e.g. CLI
+            # backup jobs) is kept, and changes made to it elsewhere are picked up
+            config = save_gui_config(self.config_file, config)
+            self.engine_options = load_engine_options(config)
+            # Let a running backup daemon pick up the new settings
+            reload_daemon(self.config_file)
         except Exception as e:
             print(f"Error saving config: {e}")
     
@@ -345,13 +301,13 @@ class BackupToolkit:
             self.clean_var.set(False)
             
             self.save_config()
-            schedule.clear()
+            self.update_schedule()
             messagebox.showinfo("Reset Complete", "Configuration has been reset!")
     
     def on_closing(self):
-        self.scheduler_running = False
         self.save_config()
-        self.root.destroy()
+        # The schedule stops and running backups are cancelled; the window closes once they have stopped
+        self.backups.close(self.root.destroy)
 
 def main():
     root = tk.Tk()
@@ -7,40 +7,20 @@ A premium backup application with Apple-like animations and transitions
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import shutil
 import json
-import threading
-import time
 from datetime import datetime
 import math
 
-# Enhanced scheduler with animation support
-class SimpleScheduler:
-    def __init__(self):
-        self.jobs = []
-    
-    def add_job(self, days, time_str, func):
-        """Add a scheduled job"""
-        self.jobs.append({
-            'days': days,
-            'time': time_str,
-            'func': func
-        })
-    
-    def run_pending(self):
-        """Check and run any pending jobs"""
-        now = datetime.now()
-        current_day = now.strftime('%a').lower()
-        current_time = now.strftime('%H:%M')
-        
-        for job in self.jobs:
-            if current_day in job['days'] and current_time == job['time']:
-                print(f"Running scheduled backup at {current_time}")
-                job['func']()
-    
-    def clear(self):
-        """Clear all scheduled jobs"""
-        self.jobs = []
+from backup_engine import ENGINE_DEFAULTS, load_engine_options
+from backup_daemon import reload_daemon
+from backup_frontend import FrontendBackups, save_gui_config
+from backup_progress import drain_latest
+
+# Progress ring refresh interval while a backup runs (~30 fps)
+PROGRESS_FRAME_MS = 33
+
+# Status indicator colour for each kind of backup state
+STATE_COLORS = {'info': '#34c759', 'busy': '#ff9f0a', 'warning': '#ff9f0a', 'error': '#ff3b30'}
 
 class AnimatedButton(tk.Button):
     """Custom button with hover animations"""
@@ -230,6 +210,7 @@ class BackupToolkitPremium:
         self.auto_launch = False
         self.daily_backup_enabled = False
         self.clean_after_backup = False
+        self.engine_options = dict(ENGINE_DEFAULTS)
         
         # Animation state
         self.backup_progress = None
@@ -241,11 +222,14 @@ class BackupToolkitPremium:
         # Setup enhanced GUI
         self.setup_premium_gui()
         
-        # Start scheduler thread
-        self.scheduler = SimpleScheduler()
-        self.scheduler_running = True
-        self.scheduler_thread = threading.Thread(target=self.run_scheduler, daemon=True)
-        self.scheduler_thread.start()
+        # Manual and scheduled backups go through the shared front-end backup flow,
+        # with live progress for the ring
+        self.backups = FrontendBackups(self.root, self.config_file, self.engine_options,
+                                       self.backup_settings, self.show_backup_state,
+                                       on_started=self.show_backup_progress, track_progress=True)
+        
+        # Scheduled backups with the saved schedule
+        self.update_schedule()
         
         # Initial fade-in animation
         self.animate_startup()
@@ -620,8 +604,8 @@ class BackupToolkitPremium:
         
         pulse()
     
-    def show_backup_progress(self):
-        """Show animated backup progress"""
+    def show_backup_progress(self, progress):
+        """Show the progress ring and start following the backup's progress events"""
         self.progress_canvas.pack(pady=20)
         
         if not self.progress_ring:
@@ -631,17 +615,21 @@ class BackupToolkitPremium:
         
         # Animate progress
         if self.progress_ring:
-            self.progress_ring.set_progress(0)
-            self.animate_backup_progress()
-    
-    def animate_backup_progress(self):
-        """Animate backup progress ring"""
-        # Simulate backup progress
-        for i in range(0, 101, 5):
-            self.root.after(i * 50, lambda p=i: self.progress_ring.set_progress(p, animate=False))
-        
-        # Hide progress when done
-        self.root.after(5500, self.hide_backup_progress)
+            self.progress_ring.set_progress(0, animate=False)
+            self.animate_backup_progress(progress.events)
+    
+    def animate_backup_progress(self, events):
+        """Drain progress events at a capped frame rate and update the ring"""
+        event = drain_latest(events)
+        if event is not None:
+            percent = 100 * event.bytes_done / event.bytes_total if event.bytes_total else 100
+            self.progress_ring.set_progress(percent, animate=False)
+            if event.finished:
+                # Leave the full ring visible for a moment before hiding it
+                self.root.after(500, self.hide_backup_progress)
+                return
+        
+        self.root.after(PROGRESS_FRAME_MS, lambda: self.animate_backup_progress(events))
     
     def hide_backup_progress(self):
         """Hide backup progress with fade out"""
@@ -704,50 +692,22 @@ class BackupToolkitPremium:
         notification.after(2000, fade_out)
     
     def backup_now(self):
-        if not self.source_folder or not self.backup_location:
-            self.show_premium_notification("Please select source and backup folders first")
-            return
-        
-        if not os.path.exists(self.source_folder):
-            self.show_premium_notification("Source folder does not exist")
-            return
-        
-        if not os.path.exists(self.backup_location):
-            self.show_premium_notification("Backup location does not exist")
-            return
-        
-        self.animate_status_change("Backing up...", "#ff9f0a")
-        self.show_backup_progress()
-        
-        # Run backup in a separate thread
-        backup_thread = threading.Thread(target=self._perform_backup, daemon=True)
-        backup_thread.start()
+        self.backups.backup_now()
     
-    def _perform_backup(self):
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            source_name = os.path.basename(self.source_folder)
-            backup_folder_name = f"{source_name}_backup_{timestamp}"
-            backup_path = os.path.join(self.backup_location, backup_folder_name)
-            
-            # Perform the backup
-            shutil.copytree(self.source_folder, backup_path)
-            
-            # Clean source if option is enabled
-            if self.clean_after_backup and hasattr(self, 'clean_var') and self.clean_var.get():
-                for item in os.listdir(self.source_folder):
-                    item_path = os.path.join(self.source_folder, item)
-                    if os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                    else:
-                        os.remove(item_path)
-            
-            self.root.after(0, lambda: self.animate_status_change("Backup Complete", "#34c759"))
-            self.root.after(0, lambda: self.show_premium_notification("Backup completed successfully!"))
-            
-        except Exception as e:
-            self.root.after(0, lambda: self.animate_status_change("Backup Failed", "#ff3b30"))
-            self.root.after(0, lambda: self.show_premium_notification(f"Backup failed: {str(e)}"))
+    def backup_settings(self):
+        """Folders and options for the next backup"""
+        return {
+            'source_folder': self.source_folder,
+            'backup_location': self.backup_location,
+            'engine_options': self.engine_options,
+            'clean': self.clean_after_backup and hasattr(self, 'clean_var') and self.clean_var.get(),
+        }
+    
+    def show_backup_state(self, kind, title, message):
+        """Show a backup's state in the status indicator and, if there is a message, a notification"""
+        self.animate_status_change(title, STATE_COLORS[kind])
+        if message is not None:
+            self.show_premium_notification(message)
     
     def save_schedule(self):
         try:
@@ -763,19 +723,7 @@ class BackupToolkitPremium:
     
     def update_schedule(self):
         """Update the backup schedule"""
-        self.scheduler.clear()
-        
-        if self.selected_days and self.backup_time:
-            day_mapping = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
-            selected_day_codes = [day for day in self.selected_days if day in day_mapping]
-            
-            if selected_day_codes:
-                self.scheduler.add_job(selected_day_codes, self.backup_time, self._perform_backup)
-    
-    def run_scheduler(self):
-        while self.scheduler_running:
-            self.scheduler.run_pending()
-            time.sleep(60)
+        self.backups.set_schedule(self.selected_days, self.backup_time)
     
     def load_config(self):
         try:
@@ -789,6 +737,7 @@ class BackupToolkitPremium:
                     self.auto_launch = config.get('auto_launch', False)
                     self.daily_backup_enabled = config.get('daily_backup_enabled', False)
                     self.clean_after_backup = config.get('clean_after_backup', False)
+                    self.engine_options = load_engine_options(config)
         except Exception as e:
             print(f"Error loading config: {e}")
     
@@ -804,8 +753,12 @@ class BackupToolkitPremium:
         }
         
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            # Only the settings above are written; the rest of the file (e.g. CLI
+            # backup jobs) is kept, and changes made to it elsewhere are picked up
+            config = save_gui_config(self.config_file, config)
+            self.engine_options = load_engine_options(config)
+            # Let a running backup daemon pick up the new settings
+            reload_daemon(self.config_file)
         except Exception as e:
             print(f"Error saving config: {e}")
     
@@ -830,16 +783,16 @@ class BackupToolkitPremium:
                 self.day_buttons[day].configure(bg='#3a3a3c', fg='#8e8e93')
             
             self.save_config()
-            self.scheduler.clear()
+            self.update_schedule()
             self.animate_status_change("Reset Complete", "#34c759")
             self.show_premium_notification("Configuration reset successfully!")
         
         self.root.after(500, do_reset)
     
     def on_closing(self):
-        self.scheduler_running = False
         self.save_config()
-        self.root.destroy()
+        # The schedule stops and running backups are cancelled; the window closes once they have stopped
+        self.backups.close(self.root.destroy)
 
 def main():
     root = tk.Tk()
@@ -7,39 +7,12 @@ A scheduled backup application with basic scheduling
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
-import shutil
 import json
-import threading
-import time
 from datetime import datetime
 
-# Simple scheduler class (same as in CLI version)
-class SimpleScheduler:
-    def __init__(self):
-        self.jobs = []
-    
-    def add_job(self, days, time_str, func):
-        """Add a scheduled job"""
-        self.jobs.append({
-            'days': days,
-            'time': time_str,
-            'func': func
-        })
-    
-    def run_pending(self):
-        """Check and run any pending jobs"""
-        now = datetime.now()
-        current_day = now.strftime('%a').lower()
-        current_time = now.strftime('%H:%M')
-        
-        for job in self.jobs:
-            if current_day in job['days'] and current_time == job['time']:
-                print(f"Running scheduled backup at {current_time}")
-                job['func']()
-    
-    def clear(self):
-        """Clear all scheduled jobs"""
-        self.jobs = []
+from backup_engine import ENGINE_DEFAULTS, load_engine_options
+from backup_daemon import reload_daemon
+from backup_frontend import FrontendBackups, save_gui_config
 
 class BackupToolkitSimple:
     def __init__(self, root):
@@ -59,6 +32,7 @@ class BackupToolkitSimple:
         self.auto_launch = False
         self.daily_backup_enabled = False
         self.clean_after_backup = False
+        self.engine_options = dict(ENGINE_DEFAULTS)
         
         # Load existing configuration
         self.load_config()
@@ -66,11 +40,12 @@ class BackupToolkitSimple:
         # Setup GUI
         self.setup_gui()
         
-        # Start scheduler thread
-        self.scheduler = SimpleScheduler()
-        self.scheduler_running = True
-        self.scheduler_thread = threading.Thread(target=self.run_scheduler, daemon=True)
-        self.scheduler_thread.start()
+        # Manual and scheduled backups go through the shared front-end backup flow
+        self.backups = FrontendBackups(self.root, self.config_file, self.engine_options,
+                                       self.backup_settings, self.show_backup_state)
+        
+        # Scheduled backups with the saved schedule
+        self.update_schedule()
         
     def setup_gui(self):
         # Title
@@ -243,65 +218,29 @@ class BackupToolkitSimple:
             messagebox.showerror("Invalid Time", "Please enter time in HH:MM format (e.g., 14:30)")
     
     def backup_now(self):
-        if not self.source_folder or not self.backup_location:
-            messagebox.showerror("Error", "Please select both source folder and backup location first!")
-            return
-        
-        if not os.path.exists(self.source_folder):
-            messagebox.showerror("Error", "Source folder does not exist!")
-            return
-        
-        if not os.path.exists(self.backup_location):
-            messagebox.showerror("Error", "Backup location does not exist!")
-            return
-        
-        # Run backup in a separate thread
-        backup_thread = threading.Thread(target=self._perform_backup, daemon=True)
-        backup_thread.start()
+        self.backups.backup_now()
     
-    def _perform_backup(self):
-        try:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            source_name = os.path.basename(self.source_folder)
-            backup_folder_name = f"{source_name}_backup_{timestamp}"
-            backup_path = os.path.join(self.backup_location, backup_folder_name)
-            
-            # Show progress (simplified)
-            self.root.after(0, lambda: messagebox.showinfo("Backup Started", "Backup in progress..."))
-            
-            # Perform the backup
-            shutil.copytree(self.source_folder, backup_path)
-            
-            # Clean source if option is enabled
-            if self.clean_after_backup and self.clean_var.get():
-                for item in os.listdir(self.source_folder):
-                    item_path = os.path.join(self.source_folder, item)
-                    if os.path.isdir(item_path):
-                        shutil.rmtree(item_path)
-                    else:
-                        os.remove(item_path)
-            
-            self.root.after(0, lambda: messagebox.showinfo("Backup Complete", 
-                                                           f"Backup completed successfully!\nSaved to: {backup_path}"))
-            
-        except Exception as e:
-            self.root.after(0, lambda: messagebox.showerror("Backup Failed", f"Error during backup: {str(e)}"))
+    def backup_settings(self):
+        """Folders and options for the next backup"""
+        return {
+            'source_folder': self.source_folder,
+            'backup_location': self.backup_location,
+            'engine_options': self.engine_options,
+            'clean': self.clean_after_backup and self.clean_var.get(),
+        }
     
-    def update_schedule(self):
-        """Update the backup schedule using simple scheduler"""
-        self.scheduler.clear()
-        
-        if self.selected_days and self.backup_time:
-            day_mapping = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
-            selected_day_codes = [day for day in self.selected_days if day in day_mapping]
-            
-            if selected_day_codes:
-                self.scheduler.add_job(selected_day_codes, self.backup_time, self._perform_backup)
+    def show_backup_state(self, kind, title, message):
+        """Report a backup's progress to the user (status-only changes have no message)"""
+        if message is None:
+            return
+        if kind == 'error':
+            messagebox.showerror(title, message)
+        else:
+            messagebox.showinfo(title, message)
     
-    def run_scheduler(self):
-        while self.scheduler_running:
-            self.scheduler.run_pending()
-            time.sleep(60)  # Check every minute
+    def update_schedule(self):
+        """Update the backup schedule"""
+        self.backups.set_schedule(self.selected_days, self.backup_time)
     
     def load_config(self):
         try:
@@ -315,6 +254,7 @@ class BackupToolkitSimple:
                     self.auto_launch = config.get('auto_launch', False)
                     self.daily_backup_enabled = config.get('daily_backup_enabled', False)
                     self.clean_after_backup = config.get('clean_after_backup', False)
+                    self.engine_options = load_engine_options(config)
         except Exception as e:
             print(f"Error loading config: {e}")
     
@@ -330,8 +270,12 @@ class BackupToolkitSimple:
         }
         
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
+            # Only the settings above are written; the rest of the file (e.g. CLI
+            # backup jobs) is kept, and changes made to it elsewhere are picked up
+            config = save_gui_config(self.config_file, config)
+            self.engine_options = load_engine_options(config)
+            # Let a running backup daemon pick up the new settings
+            reload_daemon(self.config_file)
         except Exception as e:
             print(f"Error saving config: {e}")
     
@@ -354,13 +298,13 @@ class BackupToolkitSimple:
             self.clean_var.set(False)
             
             self.save_config()
-            self.scheduler.clear()
+            self.update_schedule()
             messagebox.showinfo("Reset Complete", "Configuration has been reset!")
     
     def on_closing(self):
-        self.scheduler_running = False
         self.save_config()
-        self.root.destroy()
+        # The schedule stops and running backups are cancelled; the window closes once they have stopped
+        self.backups.close(self.root.destroy)
 
 def main():
     root = tk.Tk()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Backup Verify - post-backup integrity check
+Hashes source files and their backed-up copies in parallel with a process
+pool and records the verified checksums in a manifest next to the backup
+"""
+
+import os
+import gzip
+import time
+import hashlib
+import tarfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from backup_index import HASH_BUFFER_SIZE, file_hash
+from backup_store import ChunkStore
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# BLAKE2b checksums in `b2sum` format, so `b2sum -c` can re-check a folder backup
+MANIFEST_NAME = ".backup_checksums.b2"
+
+DEFAULT_VERIFY_WORKERS = os.cpu_count() or 1
+
+def manifest_path_for(backup_path, is_folder=None):
+    """Return the checksum manifest path for a snapshot folder, archive or chunk manifest"""
+    if is_folder is None:
+        is_folder = os.path.isdir(backup_path)
+    if is_folder:
+        return os.path.join(backup_path, MANIFEST_NAME)
+    return backup_path + '.b2'
+
+def write_manifest(path, checksums):
+    """Write {relative path: hex digest} in b2sum format"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for rel_path in sorted(checksums):
+            f.write(f"{checksums[rel_path]}  {rel_path}\n")
+    os.replace(tmp_path, path)
+
+def read_manifest(path):
+    """Read a checksum manifest back into {relative path: hex digest}"""
+    checksums = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            digest, _, rel_path = line.rstrip('\n').partition('  ')
+            if rel_path:
+                checksums[rel_path] = digest
+    return checksums
+
+class ManifestWriter:
+    """Append checksum lines to a manifest while a backup is being written
+
+    Lines go to a .partial file as each file completes (the file is opened on
+    the first line, once the snapshot folder exists); finish() renames it to
+    its final name, so a manifest only appears for a completed backup.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.partial_path = path + '.partial'
+        self._file = None
+        self._lock = threading.Lock()
+
+    def add(self, rel_path, digest):
+        """Record the checksum of one file (thread-safe)"""
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.partial_path, 'w', encoding='utf-8')
+            self._file.write(f"{digest}  {rel_path}\n")
+
+    def finish(self):
+        """Close the manifest and move it into place"""
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.partial_path, 'w', encoding='utf-8')
+            self._file.close()
+            os.replace(self.partial_path, self.path)
+
+    def abort(self):
+        """Close and remove an unfinished manifest"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                try:
+                    os.remove(self.partial_path)
+                except OSError:
+                    pass
+
+def _hash_or_none(path):
+    try:
+        return file_hash(path)
+    except FileNotFoundError:
+        return None
+
+def _hash_pair(paths):
+    """Hash a source file and its copy (runs in a worker process)"""
+    src_path, dst_path = paths
+    return _hash_or_none(src_path), _hash_or_none(dst_path)
+
+def _hash_chunks(chunk_paths):
+    """Hash the file a list of stored chunks reassembles to (runs in a worker process)"""
+    digest = hashlib.blake2b()
+    for path in chunk_paths:
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(HASH_BUFFER_SIZE)
+                if not data:
+                    break
+                digest.update(data)
+    return digest.hexdigest()
+
+def _hash_stream(fileobj):
+    digest = hashlib.blake2b()
+    while True:
+        data = fileobj.read(HASH_BUFFER_SIZE)
+        if not data:
+            break
+        digest.update(data)
+    return digest.hexdigest()
+
+def iter_source_files(source_folder, path_filter=None):
+    """Yield (relative path, absolute path) for every file the copy engine backs up
+
+    Symlinked directories are followed like the copy engine does, but each
+    directory is only visited once. Paths a PathFilter excludes are skipped.
+    """
+    root_stat = os.stat(source_folder)
+    visited = {(root_stat.st_dev, root_stat.st_ino)}
+    pending = [(source_folder, '')]
+    while pending:
+        src_dir, rel_dir = pending.pop()
+        try:
+            with os.scandir(src_dir) as entries:
+                for entry in entries:
+                    rel_path = os.path.join(rel_dir, entry.name)
+                    try:
+                        is_dir = entry.is_dir()
+                        if path_filter is not None and path_filter.excluded(rel_path, is_dir):
+                            continue
+                        if is_dir:
+                            st = entry.stat()
+                            if (st.st_dev, st.st_ino) not in visited:
+                                visited.add((st.st_dev, st.st_ino))
+                                pending.append((entry.path, rel_path))
+                            continue
+                    except OSError:
+                        pass
+                    yield rel_path, entry.path
+        except OSError:
+            continue
+
+class VerifyResult:
+    """Outcome of verifying one backup"""
+    def __init__(self):
+        self.files = 0
+        self.mismatched = []
+        self.missing = []
+        # Relative paths whose backed-up copy matched
+        self.confirmed = set()
+        self.manifest_path = None
+        self.seconds = 0.0
+
+    @property
+    def ok(self):
+        return not self.mismatched and not self.missing
+
+    def summary(self):
+        if self.ok:
+            return f"Verified {self.files} files in {self.seconds:.1f}s"
+        return (f"Verification FAILED: {len(self.mismatched)} files differ, "
+                f"{len(self.missing)} missing from the backup (of {self.files} checked)")
+
+class BackupVerifier:
+    """Compare every source file with its copy in a finished backup
+
+    Files are read in fixed-size buffers so memory use does not depend on
+    file size. Folder backups and chunk manifests are hashed on both sides in
+    a process pool; archives are read back as a single stream while the
+    source side is hashed in the pool. A file that disappears from the
+    source during verification is skipped rather than counted as a failure.
+
+    If the backup already has a checksum manifest written while copying, only
+    the backup side is read and compared with it; the source is not touched.
+    """
+    def __init__(self, workers=DEFAULT_VERIFY_WORKERS):
+        self.workers = max(1, int(workers))
+
+    def verify(self, source_folder, backup_path, backup_format='folder', use_manifest=True,
+               path_filter=None):
+        """Verify backup_path against source_folder and write its checksum manifest
+
+        Pass the PathFilter the backup was made with, so excluded source
+        files are not reported missing.
+        """
+        manifest_path = manifest_path_for(backup_path)
+        if use_manifest and os.path.exists(manifest_path):
+            return self.verify_manifest(backup_path, backup_format)
+        start = time.monotonic()
+        result = VerifyResult()
+        files = sorted(iter_source_files(source_folder, path_filter))
+        checksums = {}
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            if backup_format == 'folder':
+                pairs = [(src_path, os.path.join(backup_path, rel_path)) for rel_path, src_path in files]
+                backup_hashes = pool.map(_hash_pair, pairs, chunksize=16)
+                for (rel_path, _), (src_hash, dst_hash) in zip(files, backup_hashes):
+                    self._compare(result, checksums, rel_path, src_hash, dst_hash)
+            else:
+                source_hashes = pool.map(_hash_or_none, [path for _, path in files], chunksize=16)
+                if backup_format == 'chunks':
+                    stored = self._chunk_hashes(pool, backup_path)
+                else:
+                    stored = self._archive_hashes(backup_path, backup_format)
+                for (rel_path, _), src_hash in zip(files, source_hashes):
+                    self._compare(result, checksums, rel_path, src_hash, stored.get(rel_path))
+
+        result.manifest_path = manifest_path_for(backup_path)
+        write_manifest(result.manifest_path, checksums)
+        result.seconds = time.monotonic() - start
+        return result
+
+    def verify_manifest(self, backup_path, backup_format='folder'):
+        """Check a backup against the checksum manifest recorded when it was written"""
+        start = time.monotonic()
+        result = VerifyResult()
+        result.manifest_path = manifest_path_for(backup_path)
+        expected = read_manifest(result.manifest_path)
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            if backup_format == 'folder':
+                rel_paths = list(expected)
+                paths = [os.path.join(backup_path, rel_path) for rel_path in rel_paths]
+                stored = dict(zip(rel_paths, pool.map(_hash_or_none, paths, chunksize=16)))
+            elif backup_format == 'chunks':
+                stored = self._chunk_hashes(pool, backup_path)
+            else:
+                stored = self._archive_hashes(backup_path, backup_format)
+        checksums = {}
+        for rel_path, digest in expected.items():
+            self._compare(result, checksums, rel_path, digest, stored.get(rel_path))
+        result.seconds = time.monotonic() - start
+        return result
+
+    def _compare(self, result, checksums, rel_path, src_hash, dst_hash):
+        if src_hash is None:
+            return
+        result.files += 1
+        if dst_hash is None:
+            result.missing.append(rel_path)
+        elif src_hash != dst_hash:
+            result.mismatched.append(rel_path)
+        else:
+            checksums[rel_path] = dst_hash
+            result.confirmed.add(rel_path)
+
+    def _chunk_hashes(self, pool, manifest_path):
+        store = ChunkStore(os.path.dirname(os.path.dirname(os.path.dirname(manifest_path))))
+        entries = [entry for entry in store.load_manifest(manifest_path)['entries']
+                   if entry['type'] == 'file']
+        chunk_lists = [[store.chunk_path(digest) for digest in entry['chunks']] for entry in entries]
+        return {entry['path']: digest
+                for entry, digest in zip(entries, pool.map(_hash_chunks, chunk_lists))}
+
+    def _archive_hashes(self, archive_path, backup_format):
+        hashes = {}
+        with open(archive_path, 'rb') as raw:
+            if backup_format == 'tar.zst':
+                if zstandard is None:
+                    raise RuntimeError("Verifying tar.zst backups requires the 'zstandard' package")
+                stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+            else:
+                # GzipFile reads the concatenated per-block gzip members as one stream
+                stream = gzip.GzipFile(fileobj=raw)
+            with tarfile.open(fileobj=stream, mode='r|') as archive:
+                for member in archive:
+                    if member.isfile():
+                        hashes[os.path.normpath(member.name)] = _hash_stream(archive.extractfile(member))
+        return hashes
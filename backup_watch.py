@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Backup Watch - inotify change journal for incremental folder backups
+Watches a source tree between backups and records which folders changed,
+so the next backup only has to scan those and can rebuild the rest from
+the previous snapshot and the file index
+"""
+
+import os
+import errno
+import ctypes
+import select
+import struct
+import platform
+import threading
+import time
+
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+_EVENT = struct.Struct('iIII')
+
+DEFAULT_FULL_RESCAN_HOURS = 24
+
+_libc = None
+
+def _inotify():
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    return _libc
+
+def inotify_available():
+    """True if this system offers inotify (Linux)"""
+    if platform.system() != 'Linux':
+        return False
+    try:
+        return hasattr(_inotify(), 'inotify_init1')
+    except OSError:
+        return False
+
+def _join(rel_dir, name):
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+class ChangeSet:
+    """Folders changed since a snapshot, as recorded by a ChangeWatcher
+
+    dirs holds the paths (relative to the source folder, '' for the top)
+    of folders whose entries were created, deleted, renamed, written or
+    had their metadata changed. Folders under an unwatched path (a
+    symlinked folder, or one inotify could not watch) always count as
+    changed.
+    """
+    def __init__(self, dirs, snapshot, unwatched=()):
+        self.dirs = set(dirs)
+        self.snapshot = snapshot
+        self.unwatched = tuple(unwatched)
+
+    def listing_changed(self, rel_dir):
+        """True if anything directly inside rel_dir may differ from the snapshot"""
+        if rel_dir in self.dirs:
+            return True
+        return any(rel_dir == path or rel_dir.startswith(path + '/') for path in self.unwatched)
+
+class ChangeWatcher:
+    """Record the folders that change under source_folder, using inotify
+
+    start() adds a watch to every folder (in the background) and keeps
+    reading events on a daemon thread. Each backup calls take() first:
+    it returns a ChangeSet of everything changed since the last backup,
+    or None when that is not known for sure and the backup must scan the
+    whole source. That is the case until a first backup has run that
+    started after every folder was watched (ready), after the kernel
+    dropped events (queue overflow), when the inotify watch limit was
+    hit, and every full_rescan_hours as a safety net. The backup then calls finish(ok, snapshot); a failed
+    backup puts its changes back for the next attempt.
+
+    on_change, if given, is called on the watcher thread after each batch
+    of events that changed something (e.g. to start a continuous backup).
+    """
+    def __init__(self, source_folder, path_filter=None, full_rescan_hours=DEFAULT_FULL_RESCAN_HOURS,
+                 on_change=None):
+        self.source_folder = os.path.abspath(source_folder)
+        self.path_filter = path_filter
+        self.on_change = on_change
+        self.full_rescan_seconds = max(0, full_rescan_hours or 0) * 3600
+        # Set when inotify cannot follow the tree at all (e.g. watch limit reached)
+        self.failed = None
+        self.ready = False
+        self._fd = None
+        self._paths = {}
+        self._dirty = set()
+        self._unwatched = set()
+        self._overflowed = False
+        self._base = None
+        self._last_full = None
+        self._taken = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start watching; folders are added on the watcher thread"""
+        fd = _inotify().inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1: {os.strerror(err)}")
+        self._fd = fd
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def take(self):
+        """Hand the changes since the last backup to a starting backup (None = scan everything)"""
+        with self._lock:
+            full = (not self.ready or self.failed is not None or self._overflowed
+                    or self._base is None
+                    or (self.full_rescan_seconds
+                        and time.monotonic() - self._last_full >= self.full_rescan_seconds))
+            dirs, self._dirty = self._dirty, set()
+            self._overflowed = False
+            # Only a backup that started after every watch was in place may serve
+            # as the base: a folder changed before its watch was added is not in dirs
+            self._taken = (dirs, full, self.ready)
+            if full:
+                return None
+            return ChangeSet(dirs, self._base, self._unwatched)
+
+    def finish(self, ok, snapshot=None):
+        """Record the outcome of the backup that called take()"""
+        with self._lock:
+            if self._taken is None:
+                return
+            dirs, full, was_ready = self._taken
+            self._taken = None
+            if ok:
+                if was_ready:
+                    self._base = snapshot
+                    if full:
+                        self._last_full = time.monotonic()
+            else:
+                self._dirty |= dirs
+                self._overflowed = self._overflowed or full
+
+    def _serve(self):
+        self._add_tree('', initial=True)
+        with self._lock:
+            self.ready = True
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._fd], [], [], 0.5)
+            if not ready:
+                continue
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            self._handle(data)
+
+    def _add_watch(self, rel_dir):
+        path = os.path.join(self.source_folder, rel_dir) if rel_dir else self.source_folder
+        wd = _inotify().inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                self.failed = ("inotify watch limit reached; raise fs.inotify.max_user_watches "
+                               "to use the change journal")
+            elif err not in (errno.ENOENT, errno.ENOTDIR):
+                with self._lock:
+                    self._unwatched.add(rel_dir)
+            return False
+        # A folder renamed within the tree keeps its watch; only the path changes
+        self._paths[wd] = rel_dir
+        return True
+
+    def _add_tree(self, rel_top, initial=False):
+        """Watch rel_top and every folder below it; new folders also count as changed"""
+        pending = [rel_top]
+        while pending and not self._stop.is_set() and self.failed is None:
+            rel_dir = pending.pop()
+            if not self._add_watch(rel_dir):
+                continue
+            if not initial:
+                with self._lock:
+                    self._dirty.add(rel_dir)
+            path = os.path.join(self.source_folder, rel_dir) if rel_dir else self.source_folder
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if not entry.is_dir():
+                            continue
+                        rel_path = _join(rel_dir, entry.name)
+                        if self.path_filter is not None and self.path_filter.excluded(rel_path, True):
+                            continue
+                        if entry.is_symlink():
+                            # The copy engine follows it, but its events would arrive
+                            # under the target's path
+                            with self._lock:
+                                self._unwatched.add(rel_path)
+                            continue
+                        pending.append(rel_path)
+            except OSError:
+                with self._lock:
+                    self._dirty.add(rel_dir)
+
+    def _handle(self, data):
+        offset = 0
+        new_dirs = []
+        changed = False
+        with self._lock:
+            while offset + _EVENT.size <= len(data):
+                wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0'))
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    self._overflowed = changed = True
+                    continue
+                rel_dir = self._paths.get(wd)
+                if rel_dir is None:
+                    continue
+                if mask & IN_IGNORED:
+                    del self._paths[wd]
+                    continue
+                if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    continue
+                is_dir = bool(mask & IN_ISDIR)
+                rel_path = _join(rel_dir, name) if name else rel_dir
+                if (name and self.path_filter is not None
+                        and self.path_filter.excluded(rel_path, is_dir)):
+                    continue
+                self._dirty.add(rel_dir)
+                changed = True
+                if is_dir and mask & (IN_CREATE | IN_MOVED_TO):
+                    new_dirs.append(rel_path)
+                elif is_dir and mask & IN_ATTRIB:
+                    self._dirty.add(rel_path)
+        for rel_path in new_dirs:
+            self._add_tree(rel_path)
+        if changed and self.on_change is not None:
+            self.on_change()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Backup Benchmark - times the backup pipeline on synthetic source trees
+Builds a tree with a chosen file count, size distribution and depth in a
+temporary folder, runs full and incremental backups, verification, restore
+and source cleanup through BackupToolkitCLI, and prints the results as JSON
+"""
+
+import os
+import io
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import traceback
+import contextlib
+
+from backup_cli import BackupToolkitCLI
+from backup_engine import BACKUP_FORMATS
+
+SIZE_DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+
+def file_sizes(count, mean_size, distribution, rng):
+    """Return count file sizes averaging roughly mean_size bytes"""
+    if distribution == 'fixed':
+        return [mean_size] * count
+    if distribution == 'uniform':
+        return [rng.randint(0, 2 * mean_size) for _ in range(count)]
+    # Many small files and a long tail of big ones, like real home folders
+    sigma = 1.5
+    mu = max(0.0, math.log(max(mean_size, 1)) - sigma * sigma / 2)
+    return [int(rng.lognormvariate(mu, sigma)) for _ in range(count)]
+
+def directories(root, depth, fanout):
+    """Return root plus every folder of a tree `depth` levels deep with `fanout` folders each"""
+    levels = [[root]]
+    for level in range(depth):
+        levels.append([os.path.join(parent, f"d{level}_{i}") for parent in levels[-1] for i in range(fanout)])
+    return [folder for level in levels for folder in level]
+
+def build_tree(root, files, mean_size, distribution, depth, fanout, seed):
+    """Create a synthetic source tree and return (files, bytes) written"""
+    rng = random.Random(seed)
+    folders = directories(root, depth, fanout)
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+    total = 0
+    for i, size in enumerate(file_sizes(files, mean_size, distribution, rng)):
+        path = os.path.join(folders[i % len(folders)], f"file_{i:07d}.bin")
+        with open(path, 'wb') as f:
+            f.write(rng.randbytes(size))
+        total += size
+    return files, total
+
+def modify_tree(root, fraction, seed):
+    """Rewrite a fraction of the files in place and return (files, bytes) changed"""
+    rng = random.Random(seed + 1)
+    paths = sorted(os.path.join(dirpath, name)
+                   for dirpath, _, names in os.walk(root) for name in names)
+    changed = rng.sample(paths, int(len(paths) * fraction))
+    total = 0
+    for path in changed:
+        size = os.path.getsize(path)
+        with open(path, 'wb') as f:
+            f.write(rng.randbytes(size))
+        # Make sure the change is visible even on coarse mtime filesystems
+        os.utime(path, (time.time() + 2, time.time() + 2))
+        total += size
+    return len(changed), total
+
+def peak_rss_mb(usage):
+    """ru_maxrss is in kilobytes on Linux and bytes on macOS"""
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return round(usage.ru_maxrss * scale / (1024 * 1024), 1)
+
+def run_phase(func):
+    """Run func() in a forked child so its peak RSS is measured on its own
+
+    Returns (seconds, ok, peak RSS in MB). Without fork the phase runs in
+    this process and the process-wide peak is reported.
+    """
+    if not hasattr(os, 'fork'):
+        import resource
+        start = time.perf_counter()
+        ok = func()
+        return time.perf_counter() - start, ok is not False, peak_rss_mb(resource.getrusage(resource.RUSAGE_SELF))
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        status = 1
+        try:
+            start = time.perf_counter()
+            ok = func()
+            os.write(write_fd, json.dumps([time.perf_counter() - start, ok is not False]).encode())
+            status = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(status)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        data = f.read()
+    _, status, usage = os.wait4(pid, 0)
+    if not data:
+        return 0.0, False, peak_rss_mb(usage)
+    seconds, ok = json.loads(data)
+    return seconds, ok and status == 0, peak_rss_mb(usage)
+
+def phase_result(name, seconds, ok, rss, files, size):
+    return {
+        'phase': name,
+        'ok': ok,
+        'seconds': round(seconds, 4),
+        'files': files,
+        'bytes': size,
+        'files_per_s': round(files / seconds, 1) if seconds else None,
+        'mb_per_s': round(size / (1024 * 1024) / seconds, 1) if seconds else None,
+        'peak_rss_mb': rss,
+    }
+
+def run_benchmark(args):
+    """Run every phase once and return the JSON-ready report"""
+    workdir = tempfile.mkdtemp(prefix='backup_bench_', dir=args.tmpdir)
+    old_cwd = os.getcwd()
+    quiet = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+    phases = []
+    try:
+        # BackupToolkitCLI keeps its config (and index) in the current folder
+        os.chdir(workdir)
+        source = os.path.join(workdir, 'source')
+        backups = os.path.join(workdir, 'backups')
+        os.makedirs(backups)
+        start = time.perf_counter()
+        files, size = build_tree(source, args.files, args.mean_size, args.distribution,
+                                 args.depth, args.fanout, args.seed)
+        build_seconds = time.perf_counter() - start
+
+        with quiet:
+            toolkit = BackupToolkitCLI()
+            toolkit.set_source_folder(source)
+            toolkit.set_backup_location(backups)
+            toolkit.set_backup_format(args.format)
+            if args.workers:
+                toolkit.set_workers(args.workers)
+            toolkit.set_verify(False)
+            toolkit.set_incremental(False)
+
+        def backup():
+            with quiet:
+                return BackupToolkitCLI().backup_now()
+
+        def verify():
+            with quiet:
+                return BackupToolkitCLI().verify_backup()
+
+        def restore():
+            with quiet:
+                return BackupToolkitCLI().restore([], target=os.path.join(workdir, 'restored'))
+
+        phases.append(phase_result('full_backup', *run_phase(backup), files, size))
+
+        with quiet:
+            toolkit.set_incremental(True)
+        changed_files, changed_bytes = modify_tree(source, args.change, args.seed)
+        phases.append(phase_result('incremental_backup', *run_phase(backup), files, size))
+        phases[-1]['changed_files'] = changed_files
+        phases[-1]['changed_bytes'] = changed_bytes
+
+        phases.append(phase_result('verify', *run_phase(verify), files, size))
+        phases.append(phase_result('restore', *run_phase(restore), files, size))
+
+        # Last, because it empties the source: backup + verify + delete
+        with quiet:
+            toolkit.set_clean(True)
+            toolkit.set_move_on_clean(args.move)
+        phases.append(phase_result('backup_and_clean', *run_phase(backup), files, size))
+    finally:
+        os.chdir(old_cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'host': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'tree': {
+            'files': files,
+            'bytes': size,
+            'mean_size': args.mean_size,
+            'distribution': args.distribution,
+            'depth': args.depth,
+            'fanout': args.fanout,
+            'seed': args.seed,
+            'build_seconds': round(build_seconds, 3),
+        },
+        'options': {
+            'format': args.format,
+            'workers': args.workers,
+            'change': args.change,
+            'move': args.move,
+        },
+        'workdir': workdir if args.keep else None,
+        'phases': phases,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Backup Toolkit pipeline on a synthetic tree')
+    parser.add_argument('--files', type=int, default=2000, help='Number of files to generate')
+    parser.add_argument('--mean-size', type=int, default=64 * 1024, help='Average file size in bytes')
+    parser.add_argument('--distribution', choices=SIZE_DISTRIBUTIONS, default='lognormal', help='File size distribution')
+    parser.add_argument('--depth', type=int, default=3, help='Folder nesting depth')
+    parser.add_argument('--fanout', type=int, default=4, help='Subfolders per folder')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for the tree contents')
+    parser.add_argument('--format', choices=BACKUP_FORMATS, default='folder', help='Backup format to benchmark')
+    parser.add_argument('--workers', type=int, help='Copy workers (default: the engine default)')
+    parser.add_argument('--change', type=float, default=0.1, help='Fraction of files modified before the incremental backup')
+    parser.add_argument('--move', action='store_true', help='Let the cleaning phase move the source instead of copy + delete')
+    parser.add_argument('--tmpdir', help='Folder to create the benchmark tree in (default: system temp)')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated tree and backups')
+    parser.add_argument('--verbose', action='store_true', help='Show the toolkit output')
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"Benchmark results written to {args.output}")
+    else:
+        print(text)
+    if not all(phase['ok'] for phase in report['phases']):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Block assembly and member index of archive backups"""
+
+import gzip
+import io
+import json
+import os
+import shutil
+import tarfile
+import threading
+
+import pytest
+
+import backup_archive
+from backup_archive import BLOCK_SIZE, ArchiveWriter, member_index_path
+from backup_progress import BackupCancelled
+
+def _make_source(tmp_path):
+    source = tmp_path / 'src'
+    (source / 'sub' / 'deeper').mkdir(parents=True)
+    for i in range(40):
+        folder = source / 'sub' if i % 2 else source
+        (folder / f'small{i:02d}.txt').write_bytes(os.urandom(i * 997))
+    # Larger than the prefetch limit and spanning block boundaries
+    (source / 'sub' / 'deeper' / 'large.bin').write_bytes(os.urandom(3 * BLOCK_SIZE + 123))
+    (source / 'zlast.bin').write_bytes(os.urandom(2 * 1024 * 1024))
+    return source
+
+def _archive(tmp_path, source, **kwargs):
+    archive_path = str(tmp_path / 'src_backup_20260101_000000.tar.gz')
+    stats = ArchiveWriter('tar.gz', workers=4).write_tree(str(source), archive_path, **kwargs)
+    with open(member_index_path(archive_path)) as f:
+        index = json.load(f)
+    return archive_path, stats, index
+
+def test_archive_holds_every_file(tmp_path):
+    source = _make_source(tmp_path)
+    archive_path, stats, _ = _archive(tmp_path, source)
+    with tarfile.open(archive_path, 'r:gz') as archive:
+        files = {member.name: archive.extractfile(member).read()
+                 for member in archive.getmembers() if member.isfile()}
+    expected = {str(path.relative_to(source)): path.read_bytes()
+                for path in source.rglob('*') if path.is_file()}
+    assert files == expected
+    assert stats.files == len(expected)
+    assert stats.compressed_bytes == os.path.getsize(archive_path)
+
+def test_block_offsets_start_independent_blocks(tmp_path):
+    source = _make_source(tmp_path)
+    archive_path, _, index = _archive(tmp_path, source)
+    with open(archive_path, 'rb') as f:
+        raw = f.read()
+    stream = gzip.decompress(raw)
+    assert index['block_size'] == BLOCK_SIZE
+    assert len(index['blocks']) == -(-len(stream) // BLOCK_SIZE)
+    assert index['blocks'][0] == 0
+    for block, offset in enumerate(index['blocks']):
+        # Each block decompresses on its own, from its recorded offset
+        with gzip.GzipFile(fileobj=io.BytesIO(raw[offset:])) as member:
+            data = member.read(BLOCK_SIZE)
+        assert data == stream[block * BLOCK_SIZE:(block + 1) * BLOCK_SIZE]
+
+def test_member_offsets_point_at_their_data(tmp_path):
+    source = _make_source(tmp_path)
+    archive_path, _, index = _archive(tmp_path, source)
+    with open(archive_path, 'rb') as f:
+        stream = gzip.decompress(f.read())
+    with tarfile.open(archive_path, 'r:gz') as archive:
+        data_offsets = {member.name: member.offset_data for member in archive.getmembers()}
+    assert {member[0]: member[2] for member in index['members']} == data_offsets
+    for name, kind, offset, size, mode, mtime in index['members']:
+        if kind == 'file':
+            assert stream[offset:offset + size] == (source / name).read_bytes()
+            assert mtime == pytest.approx(os.stat(source / name).st_mtime, abs=1)
+
+def test_cancel_removes_the_partial_archive(tmp_path):
+    source = _make_source(tmp_path)
+    cancel = threading.Event()
+
+    class CancelEarly:
+        def add_total(self, size):
+            pass
+
+        def advance(self, size):
+            cancel.set()
+
+    archive_path = str(tmp_path / 'src_backup_20260101_000000.tar.gz')
+    with pytest.raises(BackupCancelled):
+        ArchiveWriter('tar.gz', workers=2).write_tree(str(source), archive_path,
+                                                      progress=CancelEarly(), cancel=cancel)
+    assert os.listdir(tmp_path) == ['src']
+
+def test_unreadable_files_are_left_out(tmp_path, monkeypatch):
+    source = _make_source(tmp_path)
+    os.symlink('/nonexistent', source / 'dangling')
+    read_file = backup_archive._read_file
+
+    def failing_read(path, size):
+        if path.endswith('small03.txt'):
+            raise PermissionError(13, 'Permission denied', path)
+        return read_file(path, size)
+
+    monkeypatch.setattr(backup_archive, '_read_file', failing_read)
+    archive_path = str(tmp_path / 'src_backup_20260101_000000.tar.gz')
+    with pytest.raises(shutil.Error) as raised:
+        ArchiveWriter('tar.gz', workers=2).write_tree(str(source), archive_path)
+    assert sorted(error[1] for error in raised.value.args[0]) == ['dangling', 'sub/small03.txt']
+    # The archive and its index are still completed without them
+    with tarfile.open(archive_path, 'r:gz') as archive:
+        names = archive.getnames()
+    assert 'sub/small03.txt' not in names and 'dangling' not in names
+    assert 'sub/small01.txt' in names
+    with open(member_index_path(archive_path)) as f:
+        assert 'sub/small03.txt' not in [member[0] for member in json.load(f)['members']]
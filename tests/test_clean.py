@@ -0,0 +1,59 @@
+"""Removing backed-up files from the source"""
+
+import os
+import time
+
+from backup_clean import CHANGE_MARGIN_NS, SourceCleaner
+
+def _make_source(tmp_path):
+    source = tmp_path / 'src'
+    (source / 'sub' / 'deeper').mkdir(parents=True)
+    for name in ('a.txt', 'b.txt', 'sub/c.txt', 'sub/deeper/d.txt'):
+        (source / name).write_text(name)
+    return source
+
+def _started_now():
+    """A backup start time after every file's last change"""
+    return time.time_ns() + CHANGE_MARGIN_NS
+
+def test_only_confirmed_files_are_removed(tmp_path):
+    source = _make_source(tmp_path)
+    log_path = tmp_path / 'cleaned.txt'
+    result = SourceCleaner(workers=4).clean(str(source), {'a.txt', 'sub/c.txt', 'sub/deeper/d.txt'},
+                                            _started_now(), str(log_path))
+    assert sorted(result.deleted) == ['a.txt', 'sub/c.txt', 'sub/deeper/d.txt']
+    assert result.kept == ['b.txt']
+    assert (source / 'b.txt').exists()
+    assert not (source / 'a.txt').exists()
+    assert log_path.read_text() == 'a.txt\nsub/c.txt\nsub/deeper/d.txt\n'
+
+def test_emptied_folders_are_removed_and_others_kept(tmp_path):
+    source = _make_source(tmp_path)
+    (source / 'empty').mkdir()
+    SourceCleaner().clean(str(source), {'sub/deeper/d.txt'}, _started_now())
+    assert not (source / 'sub' / 'deeper').exists()
+    assert not (source / 'empty').exists()
+    assert (source / 'sub' / 'c.txt').exists()
+    assert source.exists()
+
+def test_files_changed_since_the_backup_started_are_kept(tmp_path):
+    source = _make_source(tmp_path)
+    # Well clear of the kernel's coarse ctime clock on both sides
+    time.sleep(0.05)
+    started_ns = _started_now()
+    time.sleep(0.05)
+    (source / 'a.txt').write_text('edited while the backup ran')
+    result = SourceCleaner().clean(str(source), {'a.txt', 'b.txt'}, started_ns)
+    assert result.deleted == ['b.txt']
+    assert (source / 'a.txt').read_text() == 'edited while the backup ran'
+
+def test_symlinked_folders_are_left_alone(tmp_path):
+    source = _make_source(tmp_path)
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    (outside / 'e.txt').write_text('e')
+    os.symlink(outside, source / 'link')
+    result = SourceCleaner().clean(str(source), {'link', 'link/e.txt'}, _started_now())
+    assert 'link/e.txt' not in result.deleted
+    assert (outside / 'e.txt').exists()
+    assert (source / 'link').is_symlink()
@@ -0,0 +1,147 @@
+"""Control socket commands of the backup daemon"""
+
+import asyncio
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+import backup_orchestrator
+from backup_daemon import BackupDaemon, DaemonClient, DaemonError, daemon_running, socket_path_for
+from backup_orchestrator import BackupOrchestrator
+from backup_scheduler import BackupScheduler
+
+class _Toolkit:
+    """The parts of BackupToolkitCLI the daemon drives, with jobs that run until released"""
+    def __init__(self, config_file):
+        self.config_file = config_file
+        self.orchestrator = BackupOrchestrator(max_workers=1)
+        self.scheduler = BackupScheduler()
+        self.jobs = [{'name': name, 'source_folder': f'/data/{name}', 'backup_location': '/dst',
+                      'backup_time': '02:00', 'selected_days': ['mon']}
+                     for name in ('docs', 'photos')]
+        self.started = {job['name']: threading.Event() for job in self.jobs}
+        self.release = threading.Event()
+        self.reloads = 0
+
+    def start_scheduler(self):
+        self.scheduler.start()
+
+    def stop_scheduler(self):
+        self.scheduler.stop()
+
+    def all_jobs(self):
+        return self.jobs
+
+    def get_job(self, name):
+        return next((job for job in self.jobs if job['name'] == name), None)
+
+    def queue_job(self, job):
+        def run(cancel):
+            self.started[job['name']].set()
+            while not self.release.wait(timeout=0.01):
+                if cancel.is_set():
+                    return False
+            return True
+
+        return self.orchestrator.submit(job['name'], run, job['backup_location']) is not None
+
+    def reload_config(self):
+        self.reloads += 1
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup_orchestrator, 'destination_key', lambda path: path)
+    return BackupDaemon(_Toolkit(str(tmp_path / 'backup_config.json')))
+
+def _serve(daemon, scenario):
+    """Run the daemon on this thread's event loop while scenario(client) talks to it"""
+    async def main():
+        server = asyncio.create_task(daemon.serve())
+        while daemon._server is None:
+            await asyncio.sleep(0.01)
+        try:
+            await asyncio.to_thread(scenario, DaemonClient(daemon.socket_path))
+        finally:
+            daemon._stopping.set()
+            await asyncio.wait_for(server, timeout=10)
+
+    asyncio.run(main())
+
+def test_socket_is_private_and_removed_on_stop(daemon):
+    def scenario(client):
+        assert stat.S_IMODE(os.stat(daemon.socket_path).st_mode) == 0o600
+        assert client.request('ping')['pid'] == os.getpid()
+        assert daemon_running(daemon.toolkit.config_file)
+
+    assert daemon.socket_path == socket_path_for(daemon.toolkit.config_file)
+    _serve(daemon, scenario)
+    assert not os.path.exists(daemon.socket_path)
+    assert not daemon_running(daemon.toolkit.config_file)
+
+def test_trigger_pause_resume_and_cancel(daemon):
+    toolkit = daemon.toolkit
+
+    def scenario(client):
+        assert client.request('pause') == {'paused': True, 'ok': True}
+        reply = client.request('trigger', job='docs')
+        assert reply['queued'] and reply['paused']
+        # A job already queued is not queued twice
+        assert not client.request('trigger', job='docs')['queued']
+        status = client.request('status')
+        assert status['paused']
+        assert [job['name'] for job in status['queue']['queued']] == ['docs']
+        assert [job['name'] for job in status['jobs']] == ['docs', 'photos']
+        assert not toolkit.started['docs'].is_set()
+
+        client.request('resume')
+        assert toolkit.started['docs'].wait(5)
+        client.request('trigger', job='photos')
+        assert client.request('cancel', job='photos')['cancelled'] == ['photos']
+        assert client.request('cancel')['cancelled'] == ['docs']
+        deadline = time.monotonic() + 5
+        while client.request('status')['queue']['running'] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert client.request('cancel', job='docs')['cancelled'] == []
+        outcomes = [run['outcome'] for run in client.request('status')['queue']['recent']]
+        assert outcomes == ['cancelled', 'cancelled']
+
+    _serve(daemon, scenario)
+
+def test_errors_are_reported_to_the_client(daemon):
+    def scenario(client):
+        with pytest.raises(DaemonError, match='No job named'):
+            client.request('trigger', job='music')
+        with pytest.raises(DaemonError, match='Unknown command'):
+            client.request('format_disk')
+        # The connection handler survives bad requests
+        assert client.request('reload') == {'jobs': ['docs', 'photos'], 'ok': True}
+
+    _serve(daemon, scenario)
+    assert daemon.toolkit.reloads == 1
+
+def test_stop_command_shuts_the_daemon_down(daemon):
+    async def main():
+        server = asyncio.create_task(daemon.serve())
+        while daemon._server is None:
+            await asyncio.sleep(0.01)
+        client = DaemonClient(daemon.socket_path)
+        assert await asyncio.to_thread(client.request, 'stop') == {'ok': True}
+        await asyncio.wait_for(server, timeout=10)
+
+    asyncio.run(main())
+    assert not daemon.toolkit.scheduler.running
+
+def test_second_daemon_refuses_to_start(daemon):
+    def scenario(client):
+        with pytest.raises(RuntimeError, match='already running'):
+            BackupDaemon(daemon.toolkit)._claim_socket()
+
+    _serve(daemon, scenario)
+
+def test_stale_socket_is_replaced(daemon):
+    with open(daemon.socket_path, 'w'):
+        pass
+    _serve(daemon, lambda client: client.request('ping'))
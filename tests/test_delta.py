@@ -0,0 +1,108 @@
+"""Block-level delta copies of large files"""
+
+import hashlib
+import random
+import shutil
+
+import pytest
+
+from backup_delta import BLOCK_DIGEST_SIZE, DeltaCopier, block_digest
+
+BLOCK = 4096
+
+@pytest.fixture
+def copier(monkeypatch):
+    """A DeltaCopier whose reflink clone is a plain copy, so deltas work on any filesystem"""
+    def clone(self, prev_path, dst_path):
+        shutil.copyfile(prev_path, dst_path)
+        return True
+
+    monkeypatch.setattr(DeltaCopier, '_clone', clone)
+    return DeltaCopier(block_size=BLOCK, min_size=0)
+
+def _data(blocks, seed=1, extra=0):
+    return random.Random(seed).randbytes(blocks * BLOCK + extra)
+
+def _backup(copier, tmp_path, data, name, prev=None):
+    """Copy data as a new version of the file; returns (path, method, blocks, written)"""
+    src = tmp_path / f'{name}.src'
+    src.write_bytes(data)
+    dst = tmp_path / name
+    prev_path, old_blocks = (str(prev[0]), prev[2]) if prev else (None, None)
+    method, blocks, written = copier.copy(str(src), str(dst), prev_path, old_blocks)
+    return dst, method, blocks, written
+
+def test_first_copy_writes_every_block(copier, tmp_path):
+    data = _data(8, extra=100)
+    dst, method, (block_size, hashes), written = _backup(copier, tmp_path, data, 'v1')
+    assert method == 'blocks'
+    assert written == len(data)
+    assert dst.read_bytes() == data
+    assert block_size == BLOCK
+    assert len(hashes) == 9 * BLOCK_DIGEST_SIZE
+    assert hashes[:BLOCK_DIGEST_SIZE] == block_digest(data[:BLOCK])
+
+def test_changed_block_is_the_only_one_rewritten(copier, tmp_path):
+    data = _data(8)
+    first = _backup(copier, tmp_path, data, 'v1')
+    changed = bytearray(data)
+    changed[3 * BLOCK + 10:3 * BLOCK + 20] = b'0123456789'
+    dst, method, _, written = _backup(copier, tmp_path, bytes(changed), 'v2', first)
+    assert method == 'delta'
+    assert written == BLOCK
+    assert dst.read_bytes() == bytes(changed)
+    # The previous version is untouched
+    assert first[0].read_bytes() == data
+
+def test_unchanged_file_writes_nothing(copier, tmp_path):
+    data = _data(4)
+    first = _backup(copier, tmp_path, data, 'v1')
+    dst, method, blocks, written = _backup(copier, tmp_path, data, 'v2', first)
+    assert (method, written) == ('delta', 0)
+    assert blocks == first[2]
+
+def test_shrunk_file_is_truncated(copier, tmp_path):
+    data = _data(8)
+    first = _backup(copier, tmp_path, data, 'v1')
+    shorter = data[:5 * BLOCK + 123]
+    dst, method, (_, hashes), written = _backup(copier, tmp_path, shorter, 'v2', first)
+    assert method == 'delta'
+    # Only the now partial last block differs
+    assert written == 123
+    assert dst.read_bytes() == shorter
+    assert len(hashes) == 6 * BLOCK_DIGEST_SIZE
+
+def test_grown_file_appends_new_blocks(copier, tmp_path):
+    data = _data(4)
+    first = _backup(copier, tmp_path, data, 'v1')
+    longer = data + _data(3, seed=2)
+    dst, method, (_, hashes), written = _backup(copier, tmp_path, longer, 'v2', first)
+    assert method == 'delta'
+    assert written == 3 * BLOCK
+    assert dst.read_bytes() == longer
+    assert len(hashes) == 7 * BLOCK_DIGEST_SIZE
+
+def test_whole_file_digest_is_fed(copier, tmp_path):
+    data = _data(3, extra=7)
+    first = _backup(copier, tmp_path, data, 'v1')
+    src = tmp_path / 'v2.src'
+    src.write_bytes(data[::-1])
+    digest = hashlib.blake2b()
+    copier.copy(str(src), str(tmp_path / 'v2'), str(first[0]), first[2], digest)
+    assert digest.hexdigest() == hashlib.blake2b(data[::-1]).hexdigest()
+
+def test_mismatched_block_size_falls_back_to_a_full_copy(copier, tmp_path):
+    data = _data(4)
+    path, _, (_, hashes), _ = _backup(copier, tmp_path, data, 'v1')
+    dst, method, _, written = _backup(copier, tmp_path, data, 'v2', (path, None, (2 * BLOCK, hashes)))
+    assert (method, written) == ('blocks', len(data))
+
+def test_without_reflink_support_the_file_is_copied_whole(tmp_path):
+    copier = DeltaCopier(block_size=BLOCK, min_size=0)
+    copier._clone = lambda prev_path, dst_path: False
+    data = _data(4)
+    first = _backup(copier, tmp_path, data, 'v1')
+    changed = data[:BLOCK] + b'x' * BLOCK + data[2 * BLOCK:]
+    dst, method, _, written = _backup(copier, tmp_path, changed, 'v2', first)
+    assert (method, written) == ('blocks', len(changed))
+    assert dst.read_bytes() == changed
@@ -0,0 +1,75 @@
+"""Parallel tree copies of the CopyEngine"""
+
+import os
+import shutil
+
+import pytest
+
+from backup_engine import CopyEngine
+
+def _make_source(root, count=50):
+    source = root / 'src'
+    for i in range(count):
+        folder = source / f'd{i % 5}' / f'e{i % 3}'
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / f'f{i:02d}.txt').write_bytes(os.urandom(i * 1000))
+    (source / 'empty').mkdir()
+    return source
+
+def _tree(folder):
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(folder):
+        for name in dirnames:
+            files[os.path.relpath(os.path.join(dirpath, name), folder)] = None
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, folder)] = f.read()
+    return files
+
+def test_copy_matches_the_source(tmp_path):
+    source = _make_source(tmp_path)
+    stats = CopyEngine(workers=8).copy_tree(str(source), str(tmp_path / 'dst'))
+    assert _tree(tmp_path / 'dst') == _tree(source)
+    assert stats.files == 50
+    assert stats.bytes == sum(i * 1000 for i in range(50))
+    # The top folder, d0-d4, their e0-e2 and empty
+    assert stats.dirs == 1 + 5 + 15 + 1
+
+def test_file_and_folder_times_are_kept(tmp_path):
+    source = _make_source(tmp_path, count=3)
+    os.utime(source / 'd1' / 'e1' / 'f01.txt', ns=(10**18, 10**18))
+    os.utime(source / 'd1', ns=(2 * 10**18, 2 * 10**18))
+    CopyEngine(workers=2).copy_tree(str(source), str(tmp_path / 'dst'))
+    assert os.stat(tmp_path / 'dst' / 'd1' / 'e1' / 'f01.txt').st_mtime_ns == 10**18
+    assert os.stat(tmp_path / 'dst' / 'd1').st_mtime_ns == 2 * 10**18
+
+def test_unchanged_files_are_hard_linked_to_the_previous_snapshot(tmp_path):
+    source = _make_source(tmp_path, count=10)
+    engine = CopyEngine(workers=4)
+    engine.copy_tree(str(source), str(tmp_path / 'one'))
+    changed = source / 'd1' / 'e1' / 'f01.txt'
+    changed.write_bytes(b'changed')
+
+    stats = engine.copy_tree(str(source), str(tmp_path / 'two'), link_dest=str(tmp_path / 'one'))
+    assert _tree(tmp_path / 'two') == _tree(source)
+    assert stats.linked == 9
+    assert os.stat(tmp_path / 'two' / 'd1' / 'e1' / 'f01.txt').st_nlink == 1
+    assert os.path.samefile(tmp_path / 'one' / 'd2' / 'e2' / 'f02.txt',
+                            tmp_path / 'two' / 'd2' / 'e2' / 'f02.txt')
+    assert (tmp_path / 'one' / 'd1' / 'e1' / 'f01.txt').read_bytes() != b'changed'
+
+def test_existing_destination_is_refused(tmp_path):
+    source = _make_source(tmp_path, count=1)
+    (tmp_path / 'dst').mkdir()
+    with pytest.raises(FileExistsError):
+        CopyEngine().copy_tree(str(source), str(tmp_path / 'dst'))
+
+def test_unreadable_entries_are_reported_after_the_rest_is_copied(tmp_path):
+    source = _make_source(tmp_path, count=5)
+    os.symlink('/nonexistent', source / 'dangling')
+    with pytest.raises(shutil.Error) as raised:
+        CopyEngine(workers=4).copy_tree(str(source), str(tmp_path / 'dst'))
+    assert [error[0] for error in raised.value.args[0]] == [str(source / 'dangling')]
+    os.remove(source / 'dangling')
+    assert _tree(tmp_path / 'dst') == _tree(source)
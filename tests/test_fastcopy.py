@@ -0,0 +1,36 @@
+"""Copy method selection of the FastCopier"""
+
+import hashlib
+import os
+
+import pytest
+
+from backup_fastcopy import FastCopier
+
+def _source(tmp_path, size=3 * 1024 * 1024 + 17):
+    src = tmp_path / 'src.bin'
+    src.write_bytes(os.urandom(size))
+    return src
+
+@pytest.mark.skipif(not hasattr(os, 'copy_file_range'), reason="needs copy_file_range")
+def test_hashing_keeps_the_kernel_copy_path(tmp_path):
+    src = _source(tmp_path)
+    copier = FastCopier(methods=('copy_file_range', 'userspace'))
+    digest = hashlib.blake2b()
+    assert copier.copy(str(src), str(tmp_path / 'dst.bin'), digest) == 'copy_file_range'
+    assert (tmp_path / 'dst.bin').read_bytes() == src.read_bytes()
+    assert digest.hexdigest() == hashlib.blake2b(src.read_bytes()).hexdigest()
+
+def test_userspace_fallback_hashes_while_copying(tmp_path):
+    src = _source(tmp_path)
+    digest = hashlib.blake2b()
+    method = FastCopier(methods=('userspace',)).copy(str(src), str(tmp_path / 'dst.bin'), digest)
+    assert method == 'hashed'
+    assert (tmp_path / 'dst.bin').read_bytes() == src.read_bytes()
+    assert digest.hexdigest() == hashlib.blake2b(src.read_bytes()).hexdigest()
+
+def test_metadata_is_copied(tmp_path):
+    src = _source(tmp_path, size=10)
+    os.utime(src, ns=(10**18, 10**18))
+    FastCopier().copy(str(src), str(tmp_path / 'dst.bin'))
+    assert os.stat(tmp_path / 'dst.bin').st_mtime_ns == 10**18
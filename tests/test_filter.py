@@ -0,0 +1,61 @@
+"""Rule matching and precedence of the exclude/include filter"""
+
+from backup_filter import PathFilter, filter_from_options
+
+def test_last_matching_rule_wins():
+    path_filter = PathFilter(['*.log', '!keep.log'])
+    assert path_filter.excluded('debug.log')
+    assert not path_filter.excluded('keep.log')
+    assert not path_filter.excluded('logs/keep.log')
+
+    path_filter = PathFilter(['!keep.log', '*.log'])
+    assert path_filter.excluded('keep.log')
+
+def test_later_exclude_overrides_earlier_negation():
+    path_filter = PathFilter(['*.tmp', '!important.tmp', 'cache/important.tmp'])
+    assert not path_filter.excluded('important.tmp')
+    assert path_filter.excluded('cache/important.tmp')
+    assert path_filter.excluded('other.tmp')
+
+def test_include_patterns_take_precedence_over_excludes():
+    path_filter = PathFilter(exclude=['*.iso', 'big/'], include=['keep.iso'])
+    assert path_filter.excluded('disk.iso')
+    assert not path_filter.excluded('keep.iso')
+    assert not path_filter.excluded('images/keep.iso')
+    assert path_filter.excluded('big', is_dir=True)
+
+def test_dir_only_rule_skips_files_of_that_name():
+    path_filter = PathFilter(['node_modules/'])
+    assert path_filter.excluded('node_modules', is_dir=True)
+    assert path_filter.excluded('web/node_modules', is_dir=True)
+    assert not path_filter.excluded('node_modules')
+
+def test_anchored_rule_only_matches_at_the_top():
+    path_filter = PathFilter(['/build'])
+    assert path_filter.excluded('build', is_dir=True)
+    assert not path_filter.excluded('src/build', is_dir=True)
+
+def test_double_star_matches_any_depth():
+    path_filter = PathFilter(['docs/**/*.pdf'])
+    assert path_filter.excluded('docs/a.pdf')
+    assert path_filter.excluded('docs/x/y/a.pdf')
+    assert not path_filter.excluded('other/docs/a.pdf')
+    assert not path_filter.excluded('docs/x/a.txt')
+
+def test_wildcards_do_not_cross_folders():
+    path_filter = PathFilter(['a*/b', 'x?y'])
+    assert path_filter.excluded('abc/b')
+    assert not path_filter.excluded('a/c/b')
+    assert path_filter.excluded('x1y')
+    assert not path_filter.excluded('x/y')
+
+def test_comments_blanks_and_escapes():
+    path_filter = PathFilter(['# comment', '', '\\#hash', '\\!bang'])
+    assert path_filter.excluded('#hash')
+    assert path_filter.excluded('!bang')
+    assert not path_filter.excluded('comment')
+
+def test_filter_from_options_needs_an_exclude():
+    assert filter_from_options({'exclude': [], 'include': ['*.txt']}) is None
+    assert filter_from_options({}) is None
+    assert filter_from_options({'exclude': ['*.tmp']}).excluded('a.tmp')
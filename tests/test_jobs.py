@@ -0,0 +1,23 @@
+"""Destination keys and queue status helpers for concurrent jobs"""
+
+import json
+
+from backup_jobs import destination_key, load_status
+
+def test_locations_on_one_disk_share_a_key(tmp_path):
+    (tmp_path / 'a').mkdir()
+    (tmp_path / 'b').mkdir()
+    assert destination_key(str(tmp_path / 'a')) == destination_key(str(tmp_path / 'b'))
+    assert isinstance(destination_key(str(tmp_path / 'a')), int)
+
+def test_missing_location_falls_back_to_its_path(tmp_path):
+    missing = tmp_path / 'not-mounted' / '..' / 'not-mounted'
+    assert destination_key(str(missing)) == str(tmp_path / 'not-mounted')
+
+def test_load_status(tmp_path):
+    status_file = tmp_path / 'queue.json'
+    assert load_status(str(status_file)) is None
+    status_file.write_text('{"running": [')
+    assert load_status(str(status_file)) is None
+    status_file.write_text(json.dumps({'running': [], 'queued': [{'name': 'docs'}]}))
+    assert load_status(str(status_file))['queued'] == [{'name': 'docs'}]
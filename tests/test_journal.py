@@ -0,0 +1,146 @@
+"""Resuming an interrupted folder backup from its checkpoint journal"""
+
+import os
+import threading
+from datetime import datetime
+
+import pytest
+
+import backup_engine
+from backup_engine import BackupRun, CopyEngine, load_engine_options, new_snapshot_name
+from backup_journal import TEMP_SUFFIX, CheckpointJournal, is_incomplete, journal_path_for
+from backup_progress import BackupCancelled
+
+class _CancelAfter:
+    """Progress stand-in that cancels the copy after a number of files"""
+    def __init__(self, cancel, files):
+        self.cancel = cancel
+        self.files = files
+
+    def add_total(self, size):
+        pass
+
+    def advance(self, size):
+        self.files -= 1
+        if self.files <= 0:
+            self.cancel.set()
+
+class _FixedClock:
+    """Stands in for datetime in backup_engine with now() stopped at one moment"""
+    def __init__(self, when):
+        self.when = when
+
+    def now(self):
+        return self.when
+
+def _make_source(root, count=20):
+    source = root / 'src'
+    (source / 'sub').mkdir(parents=True)
+    for i in range(count):
+        folder = source / 'sub' if i % 2 else source
+        (folder / f'f{i:02d}.txt').write_text(f'file {i}\n' * (i + 1))
+    return source
+
+def _interrupt(source, snapshot, files=5):
+    """Copy source into snapshot, stopping after a few files as if the backup died"""
+    cancel = threading.Event()
+    with pytest.raises(BackupCancelled):
+        CopyEngine(workers=1).copy_tree(str(source), str(snapshot), cancel=cancel,
+                                        progress=_CancelAfter(cancel, files),
+                                        journal=CheckpointJournal(str(snapshot)))
+    return CheckpointJournal(str(snapshot))._load()
+
+def _tree(folder):
+    files = {}
+    for dirpath, _, filenames in os.walk(folder):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, folder)] = f.read()
+    return files
+
+def test_interrupted_copy_keeps_its_journal(tmp_path):
+    source = _make_source(tmp_path)
+    snapshot = tmp_path / 'snapshot'
+    completed = _interrupt(source, snapshot)
+    assert 0 < len(completed) < 20
+    assert is_incomplete(str(snapshot))
+    for rel_path in completed:
+        assert (snapshot / rel_path).read_bytes() == (source / rel_path).read_bytes()
+
+def test_resume_skips_completed_files_and_finishes(tmp_path):
+    source = _make_source(tmp_path)
+    snapshot = tmp_path / 'snapshot'
+    completed = _interrupt(source, snapshot)
+    # A half-written file from the interrupted attempt
+    (snapshot / f'.f00.txt{TEMP_SUFFIX}').write_text('partial')
+
+    stats = CopyEngine(workers=2).copy_tree(str(source), str(snapshot),
+                                            journal=CheckpointJournal(str(snapshot)), resume=True)
+    assert stats.methods['resumed'] == len(completed)
+    assert stats.files == 20
+    assert _tree(snapshot) == _tree(source)
+    assert not os.path.exists(journal_path_for(str(snapshot)))
+
+def test_resume_recopies_changed_files_and_drops_deleted_ones(tmp_path):
+    source = _make_source(tmp_path)
+    snapshot = tmp_path / 'snapshot'
+    completed = sorted(_interrupt(source, snapshot, files=6))
+    changed, deleted = completed[0], completed[1]
+    (source / changed).write_text('changed since the interrupted attempt, and longer\n')
+    os.remove(source / deleted)
+
+    stats = CopyEngine(workers=2).copy_tree(str(source), str(snapshot),
+                                            journal=CheckpointJournal(str(snapshot)), resume=True)
+    assert stats.methods['resumed'] == len(completed) - 2
+    assert _tree(snapshot) == _tree(source)
+    assert not (snapshot / deleted).exists()
+
+def test_torn_last_line_is_ignored(tmp_path):
+    with open(journal_path_for(str(tmp_path)), 'w') as f:
+        f.write('["a.txt", 3, 100, "aa"]\n["b.txt", 4, 2')
+    assert CheckpointJournal(str(tmp_path))._load() == {'a.txt': (3, 100, 'aa')}
+
+def test_backup_run_resumes_the_interrupted_snapshot(tmp_path):
+    source = _make_source(tmp_path)
+    backup_location = tmp_path / 'dst'
+    backup_location.mkdir()
+    snapshot = backup_location / new_snapshot_name(str(source))
+    _interrupt(source, snapshot)
+
+    backup_run = BackupRun(str(source), str(backup_location),
+                           load_engine_options({'checksums': False}))
+    assert backup_run.resuming
+    assert backup_run.backup_path == str(snapshot)
+    backup_run.run()
+    assert not is_incomplete(str(snapshot))
+    assert _tree(snapshot) == _tree(source)
+
+def test_existing_destination_is_not_resumed_without_asking(tmp_path):
+    source = _make_source(tmp_path)
+    snapshot = tmp_path / 'snapshot'
+    _interrupt(source, snapshot)
+    with pytest.raises(FileExistsError):
+        CopyEngine(workers=2).copy_tree(str(source), str(snapshot),
+                                        journal=CheckpointJournal(str(snapshot)))
+
+def test_backups_in_the_same_second_get_their_own_snapshots(tmp_path, monkeypatch):
+    source = _make_source(tmp_path)
+    backup_location = tmp_path / 'dst'
+    backup_location.mkdir()
+    options = load_engine_options({'checksums': False})
+    first = BackupRun(str(source), str(backup_location), options)
+    first.run()
+    before = _tree(first.backup_path)
+
+    (source / 'f00.txt').write_text('changed within the same second\n')
+    # Pin the clock to the second the first snapshot is named after
+    when = datetime.strptime(first.snapshot_name.rsplit('_backup_', 1)[1], '%Y%m%d_%H%M%S')
+    monkeypatch.setattr(backup_engine, 'datetime', _FixedClock(when))
+    second = BackupRun(str(source), str(backup_location), options)
+    assert not second.resuming
+    assert second.backup_path != first.backup_path
+    assert second.snapshot_name > first.snapshot_name
+    second.run()
+    assert _tree(first.backup_path) == before
+    assert _tree(second.backup_path) == _tree(source)
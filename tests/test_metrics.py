@@ -0,0 +1,66 @@
+"""Run log rotation and Prometheus textfile output"""
+
+import json
+
+from backup_metrics import (RunMetrics, SlowestFiles, append_run, last_runs_by_job, metrics_paths,
+                            read_runs)
+
+def _run(job, ok=True, **fields):
+    metrics = RunMetrics(job, f'/data/{job}', '/mnt/backup', 'folder')
+    with metrics.phase('copy'):
+        pass
+    metrics.record.update(fields)
+    metrics.finish(ok, None if ok else 'disk full')
+    return metrics
+
+def test_run_log_rotates_and_keeps_a_few_old_logs(tmp_path):
+    log_path = str(tmp_path / 'runs.jsonl')
+    record = {'job': 'docs', 'padding': 'x' * 100}
+    for i in range(20):
+        append_run(log_path, dict(record, n=i), max_bytes=300, backups=2)
+    # Each log holds at most a few lines, the oldest logs are dropped
+    assert not (tmp_path / 'runs.jsonl.3').exists()
+    rotated = [json.loads(line)['n'] for name in ('runs.jsonl.2', 'runs.jsonl.1', 'runs.jsonl')
+               for line in (tmp_path / name).read_text().splitlines()]
+    assert rotated == list(range(20 - len(rotated), 20))
+    assert read_runs(log_path, limit=1)[0]['n'] == 19
+
+def test_torn_lines_are_skipped(tmp_path):
+    log_path = tmp_path / 'runs.jsonl'
+    log_path.write_text('{"job": "a", "ok": true}\n{"job": "b", "o\n')
+    assert read_runs(str(log_path)) == [{'job': 'a', 'ok': True}]
+
+def test_prometheus_file_reports_the_last_run_of_each_job(tmp_path):
+    config_file = str(tmp_path / 'backup_config.json')
+    prom_path = str(tmp_path / 'textfile' / 'backup.prom')
+    (tmp_path / 'textfile').mkdir()
+    options = {'metrics_textfile': prom_path}
+    _run('docs', files=10, bytes=1000).write(config_file, options)
+    _run('docs', ok=False, files=3).write(config_file, options)
+    _run('photos "raw"', files=5).write(config_file, options)
+
+    log_path, _ = metrics_paths(config_file, options)
+    jobs = last_runs_by_job(log_path)
+    assert jobs['docs'][0]['ok'] is False and jobs['docs'][1]['files'] == 10
+
+    lines = (tmp_path / 'textfile' / 'backup.prom').read_text().splitlines()
+    samples = dict(line.rsplit(' ', 1) for line in lines if not line.startswith('#'))
+    docs = 'job="docs",source="/data/docs"'
+    assert samples[f'backup_last_run_success{{{docs}}}'] == '0'
+    assert samples[f'backup_last_run_files{{{docs}}}'] == '3'
+    assert samples[f'backup_last_run_errors{{{docs}}}'] == '1'
+    assert float(samples[f'backup_last_success_timestamp_seconds{{{docs}}}']) > 0
+    assert f'backup_last_run_phase_seconds{{{docs},phase="copy"}}' in samples
+    assert samples['backup_last_run_success{job="photos \\"raw\\"",source="/data/photos \\"raw\\""}'] == '1'
+    assert '# TYPE backup_last_run_bytes gauge' in lines
+
+def test_metrics_default_next_to_the_config(tmp_path):
+    config_file = str(tmp_path / 'backup_config.json')
+    assert metrics_paths(config_file) == (str(tmp_path / 'backup_runs.jsonl'),
+                                          str(tmp_path / 'backup_metrics.prom'))
+
+def test_slowest_files_keeps_the_top_entries():
+    slowest = SlowestFiles(limit=2)
+    for seconds, path in ((0.1, 'a'), (0.5, 'b'), (0.3, 'c'), (0.05, 'd')):
+        slowest.add(seconds, path, 1)
+    assert [item['path'] for item in slowest.items()] == ['b', 'c']
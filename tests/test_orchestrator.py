@@ -0,0 +1,192 @@
+"""Job queue, de-duplication, caps and shutdown of the asyncio BackupOrchestrator"""
+
+import json
+import threading
+
+import pytest
+
+import backup_orchestrator
+from backup_orchestrator import BackupOrchestrator
+
+TIMEOUT = 5
+
+class _Job:
+    """Backup stand-in that runs until released"""
+    def __init__(self, result=True):
+        self.result = result
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self, cancel):
+        self.started.set()
+        while not self.release.wait(timeout=0.01):
+            if cancel.is_set():
+                return False
+        return self.result
+
+@pytest.fixture
+def make_orchestrator(monkeypatch):
+    """Build orchestrators whose destinations are their own disk keys"""
+    monkeypatch.setattr(backup_orchestrator, 'destination_key', lambda path: path)
+    orchestrators = []
+
+    def make(**kwargs):
+        orchestrator = BackupOrchestrator(**kwargs)
+        orchestrators.append(orchestrator)
+        return orchestrator
+
+    yield make
+    for orchestrator in orchestrators:
+        orchestrator.shutdown(wait=False, cancel=True)
+
+def _names(status, state):
+    return [job['name'] for job in status[state]]
+
+def test_duplicate_submit_is_refused_while_active(make_orchestrator):
+    orchestrator = make_orchestrator(max_workers=1)
+    first, second = _Job('done'), _Job()
+    future = orchestrator.submit('docs', first, '/dst/a')
+    assert first.started.wait(TIMEOUT)
+    assert orchestrator.submit('docs', _Job(), '/dst/a') is None
+
+    # Queued behind another job counts as active too
+    orchestrator.submit('photos', second, '/dst/b')
+    assert orchestrator.submit('photos', _Job(), '/dst/b') is None
+    assert orchestrator.is_active('photos')
+
+    first.release.set()
+    assert future.result(TIMEOUT) == 'done'
+    assert second.started.wait(TIMEOUT)
+    second.release.set()
+
+def test_job_can_be_resubmitted_after_it_finishes(make_orchestrator):
+    orchestrator = make_orchestrator()
+    job = _Job()
+    job.release.set()
+    assert orchestrator.submit('docs', job, '/dst/a').result(TIMEOUT) is True
+    assert not orchestrator.is_active('docs')
+    assert orchestrator.submit('docs', job, '/dst/a').result(TIMEOUT) is True
+    assert [entry['outcome'] for entry in orchestrator.status()['recent']] == ['ok', 'ok']
+
+def test_failing_job_resolves_to_false(make_orchestrator):
+    orchestrator = make_orchestrator()
+
+    def fail(cancel):
+        raise OSError('disk full')
+
+    assert orchestrator.submit('docs', fail, '/dst/a').result(TIMEOUT) is False
+    assert orchestrator.status()['recent'][-1]['outcome'] == 'failed'
+
+def test_second_job_on_a_destination_waits(make_orchestrator):
+    orchestrator = make_orchestrator(max_workers=4, per_destination=1)
+    first, same_disk, other_disk = _Job(), _Job(), _Job()
+    orchestrator.submit('docs', first, '/dst/a')
+    orchestrator.submit('photos', same_disk, '/dst/a')
+    orchestrator.submit('music', other_disk, '/dst/b')
+    assert first.started.wait(TIMEOUT)
+    assert other_disk.started.wait(TIMEOUT)
+
+    status = orchestrator.status()
+    assert sorted(_names(status, 'running')) == ['docs', 'music']
+    assert status['queued'] == [{'name': 'photos', 'destination': '/dst/a',
+                                 'queued': status['queued'][0]['queued'],
+                                 'waiting_for_destination': True}]
+    assert not same_disk.started.is_set()
+
+    first.release.set()
+    assert same_disk.started.wait(TIMEOUT)
+    same_disk.release.set()
+    other_disk.release.set()
+
+def test_global_cap_limits_running_jobs(make_orchestrator):
+    orchestrator = make_orchestrator(max_workers=2, per_destination=4)
+    jobs = [_Job() for _ in range(3)]
+    for i, job in enumerate(jobs):
+        orchestrator.submit(f'job{i}', job, f'/dst/{i}')
+    assert jobs[0].started.wait(TIMEOUT) and jobs[1].started.wait(TIMEOUT)
+    status = orchestrator.status()
+    assert _names(status, 'queued') == ['job2']
+    assert not status['queued'][0]['waiting_for_destination']
+
+    jobs[0].release.set()
+    assert jobs[2].started.wait(TIMEOUT)
+    for job in jobs:
+        job.release.set()
+
+def test_cancelling_a_queued_job_resolves_its_future(make_orchestrator):
+    orchestrator = make_orchestrator(max_workers=1)
+    running, queued = _Job(), _Job()
+    running_future = orchestrator.submit('docs', running, '/dst/a')
+    future = orchestrator.submit('photos', queued, '/dst/b')
+    assert orchestrator.cancel('photos') == 'queued'
+    assert future.result(TIMEOUT) is False
+    assert orchestrator.cancel('photos') is None
+
+    assert running.started.wait(TIMEOUT)
+    assert orchestrator.cancel('docs') == 'running'
+    assert running_future.result(TIMEOUT) is False
+    assert [entry['outcome'] for entry in orchestrator.status()['recent']] == ['cancelled', 'cancelled']
+    assert not queued.started.is_set()
+
+def test_paused_orchestrator_queues_without_starting(make_orchestrator):
+    orchestrator = make_orchestrator()
+    orchestrator.pause()
+    job = _Job()
+    job.release.set()
+    future = orchestrator.submit('docs', job, '/dst/a')
+    assert _names(orchestrator.status(), 'queued') == ['docs']
+    assert not job.started.is_set()
+    orchestrator.resume()
+    assert future.result(TIMEOUT) is True
+
+def test_status_file_mirrors_the_queue(make_orchestrator, tmp_path):
+    status_file = tmp_path / 'queue.json'
+    orchestrator = make_orchestrator(max_workers=1, status_file=str(status_file))
+    job = _Job()
+    orchestrator.submit('docs', job, '/dst/a')
+    orchestrator.submit('photos', _Job(), '/dst/a')
+    assert _names(json.loads(status_file.read_text()), 'queued') == ['photos']
+    job.release.set()
+
+def test_cancel_all_stops_running_and_queued_jobs(make_orchestrator):
+    orchestrator = make_orchestrator(max_workers=1)
+    running, queued = _Job(), _Job()
+    running_future = orchestrator.submit('docs', running, '/dst/a')
+    queued_future = orchestrator.submit('photos', queued, '/dst/b')
+    assert running.started.wait(TIMEOUT)
+    assert sorted(orchestrator.cancel_all()) == ['docs', 'photos']
+    assert running_future.result(TIMEOUT) is False
+    assert queued_future.result(TIMEOUT) is False
+    assert not queued.started.is_set()
+
+def test_raised_limits_start_waiting_jobs(make_orchestrator):
+    orchestrator = make_orchestrator(max_workers=1, per_destination=1)
+    jobs = [_Job() for _ in range(3)]
+    for i, job in enumerate(jobs):
+        orchestrator.submit(f'job{i}', job, '/dst/a')
+    assert jobs[0].started.wait(TIMEOUT)
+    orchestrator.set_limits(max_workers=3, per_destination=3)
+    assert jobs[1].started.wait(TIMEOUT) and jobs[2].started.wait(TIMEOUT)
+    for job in jobs:
+        job.release.set()
+
+def test_shutdown_runs_queued_jobs_first(monkeypatch):
+    monkeypatch.setattr(backup_orchestrator, 'destination_key', lambda path: path)
+    orchestrator = BackupOrchestrator(max_workers=1)
+    done = []
+    futures = [orchestrator.submit(name, lambda cancel, name=name: done.append(name), '/dst/a')
+               for name in ('docs', 'photos', 'music')]
+    orchestrator.shutdown(wait=True)
+    assert done == ['docs', 'photos', 'music']
+    assert all(future.done() for future in futures)
+
+def test_shutdown_without_waiting_drops_queued_jobs(monkeypatch):
+    monkeypatch.setattr(backup_orchestrator, 'destination_key', lambda path: path)
+    orchestrator = BackupOrchestrator(max_workers=1)
+    running = _Job()
+    orchestrator.submit('docs', running, '/dst/a')
+    queued = orchestrator.submit('photos', _Job(), '/dst/a')
+    assert running.started.wait(TIMEOUT)
+    orchestrator.shutdown(wait=False, cancel=True)
+    assert queued.result(0) is False
+    assert [entry['outcome'] for entry in orchestrator._recent] == ['cancelled', 'cancelled']
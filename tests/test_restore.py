@@ -0,0 +1,134 @@
+"""Restoring files out of every backup format"""
+
+import gzip
+import io
+import json
+import os
+import tarfile
+from datetime import datetime
+
+import pytest
+
+from backup_archive import ArchiveWriter, member_index_path
+from backup_engine import BackupRun, load_engine_options
+from backup_retention import Backup
+from backup_restore import Restorer, find_backup, normalize_pattern
+
+def _make_source(tmp_path):
+    source = tmp_path / 'src'
+    (source / 'docs' / 'old').mkdir(parents=True)
+    (source / 'docs' / 'a.txt').write_text('a\n' * 100)
+    (source / 'docs' / 'b.md').write_text('b\n' * 100)
+    (source / 'docs' / 'old' / 'c.txt').write_text('c\n' * 100)
+    (source / 'top.txt').write_text('top')
+    # Big enough to span several archive blocks
+    (source / 'big1.bin').write_bytes(os.urandom(5 * 1024 * 1024))
+    (source / 'big2.bin').write_bytes(os.urandom(5 * 1024 * 1024))
+    os.utime(source / 'top.txt', (10**9, 10**9))
+    return source
+
+def _tree(folder):
+    files = {}
+    for dirpath, _, filenames in os.walk(folder):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, folder)] = f.read()
+    return files
+
+@pytest.fixture(params=['folder', 'chunks', 'tar.gz'])
+def backup(request, tmp_path):
+    """A backup of a fresh source in each format; returns (source, Backup)"""
+    source = _make_source(tmp_path)
+    backup_location = tmp_path / 'dst'
+    backup_location.mkdir()
+    options = load_engine_options({'backup_format': request.param})
+    BackupRun(str(source), str(backup_location), options).run()
+    return source, find_backup(str(backup_location), str(source))
+
+def test_full_restore_round_trips(backup, tmp_path):
+    source, found = backup
+    result = Restorer().restore(found, [], str(tmp_path / 'out'))
+    assert _tree(tmp_path / 'out') == _tree(source)
+    assert result.files == 6
+    assert os.stat(tmp_path / 'out' / 'top.txt').st_mtime == 10**9
+
+def test_subtree_and_glob_restore(backup, tmp_path):
+    source, found = backup
+    Restorer().restore(found, ['docs/old', '*.md', 'docs/*.txt'], str(tmp_path / 'out'))
+    assert sorted(_tree(tmp_path / 'out')) == ['docs/a.txt', 'docs/b.md', 'docs/old/c.txt']
+
+def test_existing_files_are_kept_unless_overwriting(backup, tmp_path):
+    source, found = backup
+    out = tmp_path / 'out'
+    out.mkdir()
+    (out / 'top.txt').write_text('mine')
+    result = Restorer().restore(found, ['top.txt'], str(out))
+    assert result.skipped == ['top.txt']
+    assert (out / 'top.txt').read_text() == 'mine'
+    Restorer(overwrite=True).restore(found, ['top.txt'], str(out))
+    assert (out / 'top.txt').read_text() == 'top'
+
+def test_single_member_restore_seeks_to_its_block(tmp_path, monkeypatch):
+    source = _make_source(tmp_path)
+    archive_path = str(tmp_path / 'src_backup_20260101_000000.tar.gz')
+    ArchiveWriter('tar.gz', workers=2).write_tree(str(source), archive_path)
+    starts = []
+    decompressed = Restorer._decompressed
+
+    def record(self, raw, archive_format):
+        starts.append(raw.tell())
+        return decompressed(self, raw, archive_format)
+
+    monkeypatch.setattr(Restorer, '_decompressed', record)
+    backup = Backup(archive_path, datetime(2026, 1, 1), 'tar.gz')
+    # The member whose data starts furthest into the archive
+    with open(member_index_path(archive_path)) as f:
+        index = json.load(f)
+    name, _, offset, *_ = max(index['members'], key=lambda member: member[2])
+    assert offset >= index['block_size']
+
+    Restorer().restore(backup, [name], str(tmp_path / 'out'))
+    assert (tmp_path / 'out' / name).read_bytes() == (source / name).read_bytes()
+    assert starts == [index['blocks'][offset // index['block_size']]]
+    assert starts[0] > 0
+
+def test_patterns_leading_out_of_the_backup_are_rejected():
+    for pattern in ('../etc/passwd', '..', 'docs/../../x'):
+        with pytest.raises(ValueError):
+            normalize_pattern(pattern)
+    assert normalize_pattern('/docs/a.txt') == 'docs/a.txt'
+    assert normalize_pattern('docs/./old/') == 'docs/old'
+
+def _evil_archive(path):
+    """A tar.gz without a member index holding a '../' member"""
+    with gzip.open(path, 'wb') as raw, tarfile.open(fileobj=raw, mode='w') as archive:
+        for name, data in (('ok.txt', b'fine'), ('../escaped.txt', b'evil')):
+            tarinfo = tarfile.TarInfo(name)
+            tarinfo.size = len(data)
+            archive.addfile(tarinfo, io.BytesIO(data))
+
+def test_archive_member_outside_the_target_is_refused(tmp_path):
+    archive_path = str(tmp_path / 'src_backup_20260101_000000.tar.gz')
+    _evil_archive(archive_path)
+    target = tmp_path / 'out' / 'target'
+    result = Restorer().restore(Backup(archive_path, datetime(2026, 1, 1), 'tar.gz'), [],
+                                str(target))
+    assert result.outside == ['../escaped.txt']
+    assert (target / 'ok.txt').read_bytes() == b'fine'
+    assert not (tmp_path / 'out' / 'escaped.txt').exists()
+
+def test_symlink_in_the_target_is_not_followed_out(tmp_path):
+    source = _make_source(tmp_path)
+    backup_location = tmp_path / 'dst'
+    backup_location.mkdir()
+    BackupRun(str(source), str(backup_location), load_engine_options({})).run()
+    target = tmp_path / 'out'
+    target.mkdir()
+    elsewhere = tmp_path / 'elsewhere'
+    elsewhere.mkdir()
+    os.symlink(elsewhere, target / 'docs')
+    result = Restorer(overwrite=True).restore(find_backup(str(backup_location), str(source)),
+                                              ['docs'], str(target))
+    assert sorted(result.outside) == ['docs/a.txt', 'docs/b.md', 'docs/old/c.txt']
+    assert os.listdir(elsewhere) == []
@@ -0,0 +1,143 @@
+"""Retention plans, pruning and chunk collection"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from backup_retention import CHUNK_GRACE_SECONDS, Backup, Pruner, list_backups, plan
+from backup_store import ChunkStore
+
+# A Saturday
+NOW = datetime(2026, 10, 17, 12, 0)
+
+def _backups(*ages):
+    """Folder backups taken the given numbers of hours before NOW"""
+    return [Backup(f'/dst/src_backup_{(NOW - timedelta(hours=hours)):%Y%m%d_%H%M%S}',
+                   NOW - timedelta(hours=hours), 'folder')
+            for hours in sorted(ages, reverse=True)]
+
+def _kept(backups, **options):
+    keep, prune = plan(backups, options)
+    assert len(keep) + len(prune) == len(backups)
+    return sorted(int((NOW - backup.time) / timedelta(hours=1)) for backup in keep)
+
+def test_no_limits_keep_everything():
+    backups = _backups(1, 2, 3)
+    assert plan(backups, {}) == (backups, [])
+
+def test_keep_last():
+    assert _kept(_backups(1, 2, 3, 4, 5), keep_last=2) == [1, 2]
+
+def test_keep_daily_keeps_the_newest_of_each_day():
+    # Two backups on each of the last three days (12:00 and 10:00)
+    backups = _backups(0, 2, 24, 26, 48, 50)
+    assert _kept(backups, keep_daily=2) == [0, 24]
+
+def test_keep_weekly_and_monthly():
+    days = [0, 3, 7, 8, 14, 40, 70]
+    backups = _backups(*(day * 24 for day in days))
+    # ISO weeks: Oct 12-18, Oct 5-11, Sep 28-Oct 4, ...
+    assert _kept(backups, keep_weekly=2) == [0, 7 * 24]
+    assert _kept(backups, keep_monthly=3) == [0, 40 * 24, 70 * 24]
+
+def test_rules_add_up_and_the_newest_is_always_kept():
+    backups = _backups(0, 1, 2, 30, 60)
+    assert _kept(backups, keep_last=2, keep_daily=3) == [0, 1, 30, 60]
+    assert _kept(_backups(5, 6), keep_monthly=1) == [5]
+
+def _snapshot(backup_location, when, files=3):
+    snapshot = backup_location / f'src_backup_{when:%Y%m%d_%H%M%S}'
+    (snapshot / 'sub').mkdir(parents=True)
+    for i in range(files):
+        (snapshot / 'sub' / f'f{i}.txt').write_text(str(i))
+    return snapshot
+
+def test_prune_removes_old_snapshot_folders(tmp_path):
+    source = tmp_path / 'src'
+    source.mkdir()
+    snapshots = [_snapshot(tmp_path, NOW - timedelta(days=days)) for days in (3, 2, 1, 0)]
+    result = Pruner(workers=4).prune(str(tmp_path), str(source), {'keep_last': 2})
+    assert sorted(backup.path for backup in result.pruned) == [str(path) for path in snapshots[:2]]
+    assert not result.errors
+    assert sorted(os.listdir(tmp_path)) == sorted(['src'] + [path.name for path in snapshots[2:]])
+
+def test_dry_run_deletes_nothing(tmp_path):
+    source = tmp_path / 'src'
+    source.mkdir()
+    snapshots = [_snapshot(tmp_path, NOW - timedelta(days=days)) for days in (1, 0)]
+    result = Pruner().prune(str(tmp_path), str(source), {'keep_last': 1}, dry_run=True)
+    assert [backup.path for backup in result.pruned] == [str(snapshots[0])]
+    assert all(path.exists() for path in snapshots)
+
+def test_interrupted_prune_is_finished_by_the_next_one(tmp_path, monkeypatch):
+    source = tmp_path / 'src'
+    source.mkdir()
+    old = _snapshot(tmp_path, NOW - timedelta(days=1))
+    new = _snapshot(tmp_path, NOW)
+
+    def crash(self, paths, result):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(Pruner, '_remove_files', crash)
+    with pytest.raises(KeyboardInterrupt):
+        Pruner().prune(str(tmp_path), str(source), {'keep_last': 1})
+    doomed = tmp_path / f'{old.name}.deleting'
+    # Renamed before anything was deleted, so it no longer counts as a backup
+    assert doomed.is_dir() and not old.exists()
+    assert [backup.path for backup in list_backups(str(tmp_path), str(source))] == [str(new)]
+
+    monkeypatch.undo()
+    assert Pruner().prune(str(tmp_path), str(source), {'keep_last': 1},
+                          dry_run=True).leftovers == [str(doomed)]
+    result = Pruner().prune(str(tmp_path), str(source), {'keep_last': 1})
+    assert result.leftovers == [str(doomed)]
+    assert not result.pruned and not result.errors
+    assert not doomed.exists()
+    assert new.is_dir()
+
+def _chunk_backup(store, source, when, contents):
+    for name, data in contents.items():
+        (source / name).write_bytes(data)
+    manifest_path, _ = store.backup_tree(str(source), f'src_backup_{when:%Y%m%d_%H%M%S}')
+    for name in contents:
+        (source / name).unlink()
+    return {entry['path']: entry['chunks'] for entry in store.load_manifest(manifest_path)['entries']
+            if entry['type'] == 'file'}
+
+def _age_chunks(store, seconds):
+    old = time.time() - seconds
+    for dirpath, _, filenames in os.walk(store.chunks_dir):
+        for name in filenames:
+            os.utime(os.path.join(dirpath, name), (old, old))
+
+def _chunk_exists(store, digest):
+    return os.path.exists(store.chunk_path(digest))
+
+def test_chunks_of_surviving_manifests_are_kept(tmp_path):
+    source = tmp_path / 'src'
+    source.mkdir()
+    store = ChunkStore(str(tmp_path / 'dst'))
+    shared, only_old, only_new = os.urandom(5000), os.urandom(5000), os.urandom(5000)
+    old = _chunk_backup(store, source, NOW - timedelta(days=1), {'shared': shared, 'old': only_old})
+    new = _chunk_backup(store, source, NOW, {'shared': shared, 'new': only_new})
+    _age_chunks(store, CHUNK_GRACE_SECONDS + 60)
+
+    result = Pruner().prune(str(tmp_path / 'dst'), str(source), {'keep_last': 1})
+    assert [backup.kind for backup in result.pruned] == ['chunks']
+    assert result.chunks_removed == len(old['old'])
+    assert not any(_chunk_exists(store, digest) for digest in old['old'])
+    assert all(_chunk_exists(store, digest) for digest in new['shared'] + new['new'])
+
+def test_fresh_unreferenced_chunks_get_a_grace_period(tmp_path):
+    source = tmp_path / 'src'
+    source.mkdir()
+    store = ChunkStore(str(tmp_path / 'dst'))
+    old = _chunk_backup(store, source, NOW - timedelta(days=1), {'old': os.urandom(5000)})
+    _chunk_backup(store, source, NOW, {'new': os.urandom(5000)})
+    # Written moments ago: a running backup may be about to reference them
+    result = Pruner().prune(str(tmp_path / 'dst'), str(source), {'keep_last': 1})
+    assert len(result.pruned) == 1
+    assert result.chunks_removed == 0
+    assert all(_chunk_exists(store, digest) for digest in old['old'])
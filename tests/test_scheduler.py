@@ -0,0 +1,86 @@
+"""Next-run computation of the weekly BackupScheduler"""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from backup_scheduler import DAY_CODES, BackupScheduler, next_fire_time
+
+# A Wednesday
+WEDNESDAY = datetime(2026, 10, 14, 9, 30)
+
+def test_later_the_same_day():
+    assert next_fire_time(['wed'], '18:00', WEDNESDAY) == datetime(2026, 10, 14, 18, 0)
+
+def test_time_already_passed_moves_to_the_next_listed_day():
+    assert next_fire_time(['mon', 'wed', 'fri'], '08:00', WEDNESDAY) == datetime(2026, 10, 16, 8, 0)
+    assert next_fire_time(['mon'], '18:00', WEDNESDAY) == datetime(2026, 10, 19, 18, 0)
+
+def test_fire_time_is_strictly_after():
+    assert next_fire_time(['wed'], '09:30', WEDNESDAY) == datetime(2026, 10, 21, 9, 30)
+
+def test_every_day_fires_within_a_day():
+    fire_at = next_fire_time(DAY_CODES, '09:00', WEDNESDAY)
+    assert fire_at == datetime(2026, 10, 15, 9, 0)
+
+def test_no_days_never_fires():
+    assert next_fire_time([], '09:00', WEDNESDAY) is None
+
+def test_malformed_time_is_rejected():
+    with pytest.raises(ValueError):
+        next_fire_time(['mon'], 'nine', WEDNESDAY)
+    with pytest.raises(ValueError):
+        BackupScheduler().add_job(['mon'], '9', lambda: None)
+
+def test_next_run_is_the_earliest_job():
+    scheduler = BackupScheduler()
+    assert scheduler.next_run() is None
+    now = datetime.now()
+    soon = (now + timedelta(hours=2)).strftime('%H:%M')
+    later = (now + timedelta(hours=5)).strftime('%H:%M')
+    scheduler.add_job(DAY_CODES, later, lambda: None)
+    scheduler.add_job(DAY_CODES, soon, lambda: None)
+    assert scheduler.next_run() == next_fire_time(DAY_CODES, soon, now)
+    assert len(scheduler.jobs) == 2
+
+def test_job_without_days_is_not_added():
+    scheduler = BackupScheduler()
+    scheduler.add_job([], '09:00', lambda: None)
+    assert scheduler.jobs == []
+    assert scheduler.next_run() is None
+
+def test_clear_removes_every_job():
+    scheduler = BackupScheduler()
+    scheduler.add_job(DAY_CODES, '09:00', lambda: None)
+    scheduler.clear()
+    assert scheduler.jobs == []
+    assert scheduler.next_run() is None
+
+def test_missed_runs_collapse_into_one_and_reschedule():
+    scheduler = BackupScheduler()
+    runs = []
+    scheduler.add_job(DAY_CODES, '09:00', lambda: runs.append(1))
+    # As if the machine slept through several fire times
+    fire_at, order, job = scheduler._heap[0]
+    scheduler._heap[0] = (datetime.now() - timedelta(days=3), order, job)
+    scheduler.run_pending()
+    assert runs == [1]
+    assert scheduler.next_run() == next_fire_time(DAY_CODES, '09:00', datetime.now())
+    scheduler.run_pending()
+    assert runs == [1]
+
+def test_running_scheduler_wakes_for_a_new_due_job():
+    scheduler = BackupScheduler()
+    scheduler.start()
+    try:
+        ran = threading.Event()
+        scheduler.add_job(DAY_CODES, '09:00', ran.set)
+        with scheduler._condition:
+            fire_at, order, job = scheduler._heap[0]
+            scheduler._heap[0] = (datetime.now(), order, job)
+            scheduler._condition.notify()
+        assert ran.wait(timeout=5)
+    finally:
+        scheduler.stop()
+    assert not scheduler.running
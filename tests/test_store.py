@@ -0,0 +1,89 @@
+"""Content-defined chunking and the chunk store"""
+
+import os
+import json
+import base64
+import random
+import shutil
+
+import pytest
+
+from backup_store import CHUNK_MAX, CHUNK_MIN, ChunkStore, find_cut, iter_chunks
+
+def _data(size, seed=1):
+    return random.Random(seed).randbytes(size)
+
+def _chunks(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return list(iter_chunks(str(path)))
+
+def test_chunks_rebuild_the_file_within_size_limits(tmp_path):
+    data = _data(12 * 1024 * 1024)
+    chunks = _chunks(tmp_path, 'a', data)
+    assert b''.join(chunks) == data
+    assert len(chunks) > 3
+    for chunk in chunks[:-1]:
+        assert CHUNK_MIN < len(chunk) <= CHUNK_MAX
+
+def test_small_and_empty_files(tmp_path):
+    assert _chunks(tmp_path, 'empty', b'') == []
+    assert _chunks(tmp_path, 'small', b'x' * 100) == [b'x' * 100]
+
+def test_find_cut_without_variation_cuts_at_max():
+    assert find_cut(b'\0' * (CHUNK_MAX + 10)) == CHUNK_MAX
+
+def test_boundaries_are_stable_after_an_insertion(tmp_path):
+    data = _data(16 * 1024 * 1024)
+    before = _chunks(tmp_path, 'before', data)
+    # Insert a few bytes near the start: only the chunks around it may change
+    offset = 100 * 1024
+    after = _chunks(tmp_path, 'after', data[:offset] + b'inserted bytes' + data[offset:])
+    assert b''.join(after[1:]) in data
+    shared = set(before) & set(after)
+    assert len(shared) >= len(before) - 2
+    assert before[-1] == after[-1]
+
+def test_newline_free_data_is_chunked_by_content(tmp_path):
+    # Base64 without line breaks: a single long line of text
+    data = base64.b64encode(_data(12 * 1024 * 1024, seed=4))
+    assert b'\n' not in data
+    before = _chunks(tmp_path, 'before', data)
+    assert all(len(chunk) < CHUNK_MAX for chunk in before[:-1])
+    offset = 3 * 1024 * 1024
+    after = _chunks(tmp_path, 'after', data[:offset] + b'inserted' + data[offset:])
+    assert len(before) > 4
+    assert len(set(before) & set(after)) >= len(before) - 2
+
+def test_boundaries_are_stable_after_a_deletion(tmp_path):
+    data = _data(16 * 1024 * 1024, seed=2)
+    before = _chunks(tmp_path, 'before', data)
+    offset = 5 * 1024 * 1024
+    after = _chunks(tmp_path, 'after', data[:offset] + data[offset + 4096:])
+    assert len(set(before) & set(after)) >= len(before) - 2
+
+def test_unchanged_chunks_are_stored_once(tmp_path):
+    source = tmp_path / 'src'
+    source.mkdir()
+    data = _data(4 * 1024 * 1024, seed=3)
+    (source / 'a.bin').write_bytes(data)
+    (source / 'b.bin').write_bytes(data)
+    store = ChunkStore(str(tmp_path / 'dst'))
+    manifest_path, stats = store.backup_tree(str(source), 'src_backup_20260101_000000')
+    entries = {entry['path']: entry for entry in store.load_manifest(manifest_path)['entries']}
+    assert entries['a.bin']['chunks'] == entries['b.bin']['chunks']
+    assert stats.files == 2
+    assert b''.join(store.read_chunk(digest) for digest in entries['b.bin']['chunks']) == data
+
+def test_unreadable_file_is_reported_after_the_manifest_is_written(tmp_path):
+    source = tmp_path / 'src'
+    (source / 'real').mkdir(parents=True)
+    (source / 'real' / 'a.txt').write_text('a')
+    os.symlink('/nonexistent', source / 'dangling')
+    store = ChunkStore(str(tmp_path / 'dst'))
+    with pytest.raises(shutil.Error) as raised:
+        store.backup_tree(str(source), 'src_backup_20260101_000000')
+    assert [error[1] for error in raised.value.args[0]] == ['dangling']
+    with open(store.manifest_path('src_backup_20260101_000000')) as f:
+        paths = [entry['path'] for entry in json.load(f)['entries']]
+    assert 'real/a.txt' in paths
@@ -0,0 +1,104 @@
+"""Token bucket rate limits and live throttle changes"""
+
+import json
+import os
+import threading
+
+import pytest
+
+import backup_throttle
+from backup_throttle import WATCH_INTERVAL, Throttle, TokenBucket, parse_io_nice
+
+class _Clock:
+    """Stands in for the time module: sleeping moves the monotonic clock forward"""
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = 0.0
+        self._lock = threading.Lock()
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        with self._lock:
+            self.slept += seconds
+            self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(backup_throttle, 'time', clock)
+    return clock
+
+def test_bucket_allows_one_second_burst_then_holds_the_rate(clock):
+    bucket = TokenBucket(100)
+    bucket.consume(100)
+    assert clock.slept == 0
+    bucket.consume(50)
+    assert clock.slept == pytest.approx(0.5)
+    for _ in range(10):
+        bucket.consume(100)
+    # 1100 tokens more than the burst, at 100 per second
+    assert clock.slept == pytest.approx(10.5)
+
+def test_idle_time_refills_up_to_one_second(clock):
+    bucket = TokenBucket(100)
+    bucket.consume(100)
+    clock.now += 60
+    bucket.consume(150)
+    assert clock.slept == pytest.approx(0.5)
+
+def test_unlimited_bucket_never_waits(clock):
+    bucket = TokenBucket(0)
+    bucket.consume(10**12)
+    assert clock.slept == 0
+
+def test_lowered_rate_applies_immediately(clock):
+    bucket = TokenBucket(1000)
+    bucket.set_rate(10)
+    bucket.consume(20)
+    assert clock.slept == pytest.approx(1.0)
+
+def test_throttle_limits_bytes_and_files(clock):
+    throttle = Throttle(mb_per_s=1, files_per_s=10)
+    assert throttle.active
+    # The buckets start empty, so there is no initial burst
+    throttle.consume_bytes(3 * 1024 * 1024)
+    assert clock.slept == pytest.approx(3.0)
+    # The file bucket filled up to one second's worth meanwhile
+    for _ in range(20):
+        throttle.consume_file()
+    assert clock.slept == pytest.approx(4.0)
+    assert not Throttle.from_options({}).active
+
+def _write_config(path, mtime_ns, **limits):
+    path.write_text(json.dumps(limits))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def test_throttle_picks_up_config_changes(clock, tmp_path):
+    config_file = tmp_path / 'backup_config.json'
+    _write_config(config_file, 10**18, max_mb_per_s=1)
+    throttle = Throttle.from_options(json.loads(config_file.read_text()), str(config_file))
+    assert throttle.mb_per_s == 1
+
+    _write_config(config_file, 2 * 10**18, max_mb_per_s=0, max_files_per_s=5)
+    # Not re-read before the watch interval is up
+    throttle.consume_file()
+    assert throttle.mb_per_s == 1
+    clock.now += WATCH_INTERVAL
+    throttle.consume_bytes(10 * 1024 * 1024)
+    assert (throttle.mb_per_s, throttle.files_per_s) == (0, 5)
+
+    # A broken file keeps the current limits
+    config_file.write_text('{"max_mb')
+    os.utime(config_file, ns=(3 * 10**18, 3 * 10**18))
+    clock.now += WATCH_INTERVAL
+    throttle.consume_file()
+    assert throttle.files_per_s == 5
+
+def test_parse_io_nice():
+    assert parse_io_nice('') is None
+    assert parse_io_nice('idle') == (3, 0)
+    assert parse_io_nice(7) == (2, 7)
+    with pytest.raises(ValueError):
+        parse_io_nice(9)
@@ -0,0 +1,144 @@
+"""Folders recorded by the inotify change journal"""
+
+import os
+import time
+
+import pytest
+
+from backup_filter import PathFilter
+from backup_watch import ChangeWatcher, inotify_available
+
+pytestmark = pytest.mark.skipif(not inotify_available(), reason="needs inotify (Linux)")
+
+TIMEOUT = 5
+
+# Written last by each test step; events from one inotify fd arrive in order,
+# so once the marker is seen every earlier change has been recorded
+MARKER_DIR = 'zz-marker'
+
+def _wait(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "watcher did not catch up"
+        time.sleep(0.01)
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / 'src'
+    for folder in ('a', 'b/sub', 'c/sub', MARKER_DIR):
+        (source / folder).mkdir(parents=True)
+    (source / 'a' / 'one.txt').write_text('one')
+    (source / 'b' / 'sub' / 'two.txt').write_text('two')
+    return source
+
+@pytest.fixture
+def watch(source):
+    """Start a watcher on source and return it once a first backup has finished"""
+    watchers = []
+
+    def start(**kwargs):
+        watcher = ChangeWatcher(str(source), **kwargs)
+        watcher.start()
+        watchers.append(watcher)
+        _wait(lambda: watcher.ready)
+        assert watcher.take() is None
+        watcher.finish(True, 'snapshot-1')
+        return watcher
+
+    yield start
+    for watcher in watchers:
+        watcher.stop()
+
+def _changes(watcher, source):
+    """Let the watcher catch up, then take its changes (without the marker folder)"""
+    marker = source / MARKER_DIR / 'marker'
+    marker.write_text(str(time.monotonic()))
+    _wait(lambda: MARKER_DIR in watcher._dirty)
+    changes = watcher.take()
+    assert changes is not None
+    changes.dirs.discard(MARKER_DIR)
+    return changes
+
+def test_first_backup_scans_everything(source):
+    watcher = ChangeWatcher(str(source))
+    watcher.start()
+    try:
+        _wait(lambda: watcher.ready)
+        assert watcher.take() is None
+    finally:
+        watcher.stop()
+
+def test_backup_taken_before_the_watches_are_ready_is_not_a_base(source):
+    watcher = ChangeWatcher(str(source))
+    # take() while the watches are still being added, as a backup racing start() would
+    assert watcher.take() is None
+    watcher.start()
+    try:
+        watcher.finish(True, 'snapshot-1')
+        _wait(lambda: watcher.ready)
+        assert watcher.take() is None
+        watcher.finish(True, 'snapshot-2')
+        changes = _changes(watcher, source)
+        assert changes.snapshot == 'snapshot-2'
+    finally:
+        watcher.stop()
+
+def test_no_changes_means_nothing_to_scan(watch, source):
+    watcher = watch()
+    changes = _changes(watcher, source)
+    assert changes.dirs == set()
+    assert changes.snapshot == 'snapshot-1'
+    assert not changes.listing_changed('')
+
+def test_file_write_and_delete_mark_their_folder(watch, source):
+    watcher = watch()
+    (source / 'a' / 'one.txt').write_text('changed')
+    os.remove(source / 'b' / 'sub' / 'two.txt')
+    assert _changes(watcher, source).dirs == {'a', 'b/sub'}
+
+def test_file_rename_marks_both_folders(watch, source):
+    watcher = watch()
+    os.rename(source / 'a' / 'one.txt', source / 'c' / 'sub' / 'one.txt')
+    assert _changes(watcher, source).dirs == {'a', 'c/sub'}
+
+def test_folder_rename_follows_the_new_path(watch, source):
+    watcher = watch()
+    os.rename(source / 'c', source / 'c2')
+    assert _changes(watcher, source).dirs == {'', 'c2', 'c2/sub'}
+    watcher.finish(True, 'snapshot-2')
+
+    # The existing watch now reports under the new name
+    (source / 'c2' / 'sub' / 'new.txt').write_text('new')
+    changes = _changes(watcher, source)
+    assert changes.dirs == {'c2/sub'}
+    assert changes.snapshot == 'snapshot-2'
+
+def test_folder_delete_marks_its_parent(watch, source):
+    watcher = watch()
+    os.remove(source / 'b' / 'sub' / 'two.txt')
+    os.rmdir(source / 'b' / 'sub')
+    assert _changes(watcher, source).dirs == {'b', 'b/sub'}
+
+def test_new_folder_is_watched(watch, source):
+    watcher = watch()
+    (source / 'new' / 'deep').mkdir(parents=True)
+    _changes(watcher, source)
+    watcher.finish(True, 'snapshot-2')
+    (source / 'new' / 'deep' / 'f.txt').write_text('f')
+    assert _changes(watcher, source).dirs == {'new/deep'}
+
+def test_failed_backup_puts_its_changes_back(watch, source):
+    watcher = watch()
+    (source / 'a' / 'one.txt').write_text('changed')
+    assert _changes(watcher, source).dirs == {'a'}
+    watcher.finish(False)
+    (source / 'b' / 'sub' / 'three.txt').write_text('three')
+    changes = _changes(watcher, source)
+    assert changes.dirs == {'a', 'b/sub'}
+    assert changes.snapshot == 'snapshot-1'
+
+def test_excluded_paths_are_ignored(watch, source):
+    watcher = watch(path_filter=PathFilter(['*.tmp', 'b/']))
+    (source / 'a' / 'scratch.tmp').write_text('tmp')
+    (source / 'b' / 'sub' / 'three.txt').write_text('three')
+    assert _changes(watcher, source).dirs == set()